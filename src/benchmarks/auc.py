@@ -0,0 +1,105 @@
+"""Compare the former per-column `autodl_auc` with the vectorised one.
+
+Random solutions and predictions are scored by both implementations, with
+continuous predictions (few ties) and quantized ones (many ties). Reports the
+time of each and whether the scores are identical.
+
+Usage:
+  python -m src.benchmarks.auc --shapes 10000x1000 --output_file auc.json
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+from src.competition.scoring_program.libscores import mvmean, tiedrank
+from src.competition.scoring_program.score import autodl_auc
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# Number of distinct prediction values, None for continuous predictions
+TIE_LEVELS = {"continuous": None, "quantized": 100}
+
+
+def per_column_auc(solution, prediction):
+    """The former `autodl_auc` (with valid_columns_only=False): one tiedrank per column."""
+    label_num = solution.shape[1]
+    auc = np.empty(label_num)
+    for k in range(label_num):
+        r_ = tiedrank(prediction[:, k])
+        s_ = solution[:, k]
+        npos = sum(s_ == 1)
+        nneg = sum(s_ < 1)
+        auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
+    return 2 * mvmean(auc) - 1
+
+
+def _parse_shape(shape):
+    num_examples, num_classes = shape.split("x")
+    return int(num_examples), int(num_classes)
+
+
+def _best_time(function, solution, prediction, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.time()
+        score = function(solution, prediction)
+        times.append(time.time() - start)
+    return min(times), score
+
+
+def run_benchmark(shapes, repeats, seed=0):
+    rng = np.random.RandomState(seed)
+    results = []
+    for num_examples, num_classes in shapes:
+        solution = (rng.rand(num_examples, num_classes) < 0.1).astype(np.float64)
+        # Every column has both classes, as after filtering the valid columns
+        solution[0], solution[1] = 1, 0
+        for ties, levels in sorted(TIE_LEVELS.items()):
+            prediction = rng.rand(num_examples, num_classes)
+            if levels is not None:
+                prediction = np.floor(prediction * levels) / levels
+            reference_seconds, reference_score = _best_time(
+                per_column_auc, solution, prediction, repeats
+            )
+            seconds, score = _best_time(
+                lambda s, p: autodl_auc(s, p, valid_columns_only=False), solution, prediction,
+                repeats
+            )
+            result = {
+                "num_examples": num_examples,
+                "num_classes": num_classes,
+                "predictions": ties,
+                "per_column_seconds": reference_seconds,
+                "vectorised_seconds": seconds,
+                "speedup": reference_seconds / seconds if seconds > 0 else float("inf"),
+                "identical": bool(score == reference_score),
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=["1000x10", "10000x100", "10000x1000"],
+        help="Shapes as <num_examples>x<num_classes>"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="The best time is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark([_parse_shape(s) for s in args.shapes], args.repeats)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,253 @@
+"""Parity and speed of the batched augmentations of the AutoCV winner.
+
+Parity: each operation of `skeleton.data.batch_augmentations` is applied to a
+batch of random 8 bit images (RGB and grayscale, full and reduced ranges and a
+constant image) and compared with the PIL operation of
+`skeleton.data.augmentations` applied to each image. The random draws of the
+batched operation (mirroring, cutout position, paired image) are replayed to
+the PIL operation. Reports, for each operation, value and mode, the largest
+difference in levels and the fraction of differing pixels, and the exit code is
+1 if any pixel differs. `quantize` compares the conversion of float images with
+`ToPILImage` and `ToTensor`.
+
+Speed: images per second of a Fast AutoAugment policy applied to batches, as
+in the policy search of the winner model, per image (`ToPILImage`,
+`Augmentation`, `ToTensor`) and with `BatchAugmentation` on `--device`.
+
+Usage:
+  python -m src.benchmarks.batch_augmentations --sizes 32 64 128 \\
+    --output_file batch_augmentations.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import PIL.Image
+import torch
+import torchvision as tv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(SRC_DIR, "winner_cv"))
+from skeleton.data import augmentations, batch_augmentations  # noqa: E402 isort:skip
+
+# Operations drawing a sign for each image, always or with `random_mirror`
+SIGNED_OPERATIONS = ["TranslateXAbs", "TranslateYAbs"]
+MIRRORED_OPERATIONS = ["ShearX", "ShearY", "TranslateX", "TranslateY", "Rotate"]
+CUTOUT_OPERATIONS = ["Cutout", "CutoutAbs"]
+OPERATIONS = sorted(batch_augmentations.augment_dict)
+LEVELS = [0.0, 0.1, 0.35, 0.5, 0.8, 1.0]
+
+
+def make_images(num_images, size, channels, seed=0):
+    """Random images of shape (N, C, H, W): full range, reduced ranges and constant."""
+    rng = np.random.RandomState(seed)
+    images = rng.randint(256, size=(num_images, channels, size, size))
+    for i in range(num_images // 2, num_images - 1):
+        low = rng.randint(200)
+        images[i] = low + images[i] % rng.randint(1, 256 - low)
+    images[-1] = rng.randint(256)
+    return images.astype(np.uint8)
+
+
+def to_pil(image):
+    if image.shape[0] == 1:
+        return PIL.Image.fromarray(image[0], mode="L")
+    return PIL.Image.fromarray(image.transpose(1, 2, 0), mode="RGB")
+
+
+def from_pil(image):
+    array = np.asarray(image, dtype=np.uint8)
+    return array[np.newaxis] if array.ndim == 2 else array.transpose(2, 0, 1)
+
+
+class _Replay(object):
+    """Stands for the `random` and `np` modules of `augmentations` and returns the
+  draws of the batched operation."""
+
+    def __init__(self, signs, uniforms, choices):
+        self.signs, self.uniforms, self.choices = list(signs), list(uniforms), list(choices)
+        self.random = self
+
+    def uniform(self, low=0.0, high=1.0):
+        return low + (high - low) * self.uniforms.pop(0)
+
+    def choice(self, _):
+        return self.choices.pop(0)
+
+    def __call__(self):
+        return self.signs.pop(0)
+
+
+def _draws(name, num_images, seed):
+    """The random draws of the batched operation `name` seeded with `seed`."""
+    torch.manual_seed(seed)
+    if name in SIGNED_OPERATIONS or (name in MIRRORED_OPERATIONS and augmentations.random_mirror):
+        return torch.rand(num_images).tolist(), [], []
+    if name in CUTOUT_OPERATIONS:
+        xs = torch.rand(num_images, dtype=torch.float64).tolist()
+        ys = torch.rand(num_images, dtype=torch.float64).tolist()
+        return [], [u for pair in zip(xs, ys) for u in pair], []
+    if name == "SamplePairing":
+        return [], [], torch.randint(num_images, (num_images, )).tolist()
+    return [], [], []
+
+
+def apply_pil(images, name, level, draws):
+    """Apply the PIL operation `name` to each image, with the given random draws."""
+    replay = _Replay(*draws)
+    original_random, original_np = augmentations.random, augmentations.np
+    augmentations.random = replay
+    augmentations.np = replay
+    try:
+        if name == "SamplePairing":
+            operation = augmentations.SamplePairing(
+                [np.asarray(to_pil(image)) for image in images]
+            )
+        else:
+            operation = augmentations.augment_dict[name][0]
+        _, low, high = batch_augmentations.augment_dict[name]
+        value = level * (high - low) + low
+        return np.stack([from_pil(operation(to_pil(image), value)) for image in images])
+    finally:
+        augmentations.random, augmentations.np = original_random, original_np
+
+
+def check_operation(images, name, level, device, seed=0):
+    levels = torch.tensor(images, dtype=torch.float32, device=device)
+    torch.manual_seed(seed)
+    batched = batch_augmentations.apply_augment(levels, name, level).cpu().numpy()
+    expected = apply_pil(images, name, level, _draws(name, len(images), seed))
+    difference = np.abs(batched - expected.astype(np.float32))
+    return float(difference.max()), float(np.mean(difference > 0))
+
+
+def check_quantize(images, seed=0):
+    """Compare `to_levels` and `to_tensor` with `ToPILImage` and `ToTensor`."""
+    rng = np.random.RandomState(seed)
+    tensors = torch.tensor(images / 255.0 + rng.rand(*images.shape) / 255.0, dtype=torch.float32)
+    batched = batch_augmentations.to_tensor(batch_augmentations.to_levels(tensors))
+    expected = torch.stack(
+        [tv.transforms.ToTensor()(tv.transforms.ToPILImage()(t)) for t in tensors]
+    )
+    difference = (batched - expected).abs() * 255
+    return float(difference.max()), float((difference > 0).float().mean())
+
+
+def run_parity(num_images, size, device):
+    results = []
+    augmentations.random_mirror = True
+    for mode, channels in [("RGB", 3), ("L", 1)]:
+        images = make_images(num_images, size, channels)
+        max_difference, mismatch = check_quantize(images)
+        results.append(
+            {
+                "check": "parity",
+                "operation": "quantize",
+                "mode": mode,
+                "max_difference": max_difference,
+                "mismatch_fraction": mismatch
+            }
+        )
+        for name in OPERATIONS:
+            for level in LEVELS:
+                result = {"check": "parity", "operation": name, "mode": mode, "level": level}
+                try:
+                    max_difference, mismatch = check_operation(images, name, level, device)
+                except TypeError as e:
+                    # Recent Pillow versions cannot draw the RGB cutout color on L images
+                    result["skipped"] = str(e)
+                    logging.info(json.dumps(result))
+                    results.append(result)
+                    continue
+                result.update({"max_difference": max_difference, "mismatch_fraction": mismatch})
+                results.append(result)
+    for result in results:
+        if "skipped" not in result:
+            log = logging.info if result["max_difference"] == 0 else logging.warning
+            log(json.dumps(result))
+    return results
+
+
+def run_speed(sizes, batch_size, num_batches, device, repeats):
+    policy = augmentations.autoaug_policy()
+    per_image = tv.transforms.Compose(
+        [
+            lambda t: t.cpu().float(),
+            tv.transforms.ToPILImage(),
+            augmentations.Augmentation(policy),
+            tv.transforms.ToTensor(),
+            lambda t: t.to(device=device),
+        ]
+    )
+    batched = batch_augmentations.BatchAugmentation(policy)
+    implementations = {
+        "per_image": lambda batch: torch.stack([per_image(t) for t in batch]),
+        "batched": batched,
+    }
+    results = []
+    for size in sizes:
+        batches = [
+            torch.rand(batch_size, 3, size, size, device=device) for _ in range(num_batches)
+        ]
+        for implementation, function in sorted(implementations.items()):
+            times = []
+            for _ in range(repeats):
+                start = time.time()
+                for batch in batches:
+                    function(batch)
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                times.append(time.time() - start)
+            result = {
+                "check": "speed",
+                "implementation": implementation,
+                "device": str(device),
+                "size": size,
+                "batch_size": batch_size,
+                "images_per_second": batch_size * num_batches / min(times),
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num_images", type=int, default=16, help="Images of the parity checks")
+    parser.add_argument("--parity_size", type=int, default=32, help=" ")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[32, 64, 128],
+        help="Heights and widths of the speed benchmark"
+    )
+    parser.add_argument("--batch_size", type=int, default=128, help=" ")
+    parser.add_argument("--num_batches", type=int, default=4, help="Batches per measurement")
+    parser.add_argument("--repeats", type=int, default=3, help="The best run is reported")
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu", help=" "
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    results = run_parity(args.num_images, args.parity_size, device)
+    mismatches = [r for r in results if r.get("max_difference", 0) > 0]
+    results += run_speed(args.sizes, args.batch_size, args.num_batches, device, args.repeats)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,124 @@
+"""Check and time `batch_score` on experiment trees written like `run_baseline`.
+
+Each of the `--num_runs` experiment directories holds the ingestion output
+directory `predictions` and its copy by ingestion in `score`, which is stale:
+it holds the predictions of a former run, as `run_baseline` does not clean the
+score directory. `batch_score` must score each experiment once, from
+`predictions`. Checks that one prediction directory is found per experiment,
+that the stored ALC of each one is the ALC of `score_fn` on `predictions` and
+that scoring again skips all of them. Reports the time of both passes, and the
+exit code is 1 if a check fails.
+
+Usage:
+  python -m src.benchmarks.batch_score --num_runs 8 --output_file batch_score.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from src.benchmarks.scoring import make_predictions, make_solution, write_run
+from src.competition import batch_score
+from src.competition.scoring_program import score
+from src.competition.scoring_program.learning_curve_store import LearningCurveStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def write_experiments(work_dir, num_runs, num_examples, num_classes, num_predictions, rng):
+    """Write the solution and the experiment directories, return the solution
+  directory and the expected ALC of each experiment directory.
+  """
+    solution = make_solution(num_examples, num_classes, "multiclass", None, rng)
+    expected_alcs = {}
+    for run in range(num_runs):
+        experiment_dir = os.path.join(work_dir, "experiments", "run{}".format(run))
+        # A former run, copied to the score directory by ingestion
+        _, former_dir = write_run(
+            experiment_dir, solution, make_predictions(solution, num_predictions, rng)[::-1]
+        )
+        shutil.copytree(former_dir, os.path.join(experiment_dir, batch_score.SCORE_DIR_NAME))
+        solution_dir, prediction_dir = write_run(
+            experiment_dir, solution, make_predictions(solution, num_predictions, rng)
+        )
+        expected_alcs[os.path.abspath(experiment_dir)] = score.score_fn(
+            solution_dir, prediction_dir, os.path.join(work_dir, "score_fn{}".format(run))
+        )
+    return solution_dir, expected_alcs
+
+
+def run_check(work_dir, num_runs, num_examples, num_classes, num_predictions, num_workers):
+    rng = np.random.RandomState(0)
+    solution_dir, expected_alcs = write_experiments(
+        work_dir, num_runs, num_examples, num_classes, num_predictions, rng
+    )
+    experiments_dirs = [os.path.join(work_dir, "experiments")]
+    store_path = os.path.join(work_dir, "learning_curves.sqlite")
+    num_found = len(batch_score.find_prediction_dirs(experiments_dirs))
+
+    passes = []
+    for _ in range(2):
+        start = time.time()
+        counts = batch_score.batch_score(
+            experiments_dirs, [solution_dir], store_path, num_workers=num_workers
+        )
+        passes.append(dict(counts, seconds=time.time() - start))
+
+    with LearningCurveStore(store_path) as store:
+        runs = store.find_runs()
+    alc_errors = [
+        abs(run["alc"] - expected_alcs[run["experiment_dir"]])
+        for run in runs
+        if run["experiment_dir"] in expected_alcs
+    ]
+    experiment_dirs = sorted(run["experiment_dir"] for run in runs)
+    checks = {
+        "one_directory_per_experiment": num_found == num_runs,
+        "one_run_per_experiment": experiment_dirs == sorted(expected_alcs),
+        "alc_of_predictions": len(alc_errors) == num_runs and bool(max(alc_errors) < 1e-12),
+        "unchanged_runs_skipped": passes[1]["skipped"] == num_runs,
+    }
+    return {
+        "num_runs": num_runs,
+        "num_examples": num_examples,
+        "num_classes": num_classes,
+        "num_predictions": num_predictions,
+        "first_pass": passes[0],
+        "second_pass": passes[1],
+        "checks": checks,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num_runs", type=int, default=8, help="Experiment directories")
+    parser.add_argument("--num_examples", type=int, default=1000, help=" ")
+    parser.add_argument("--num_classes", type=int, default=10, help=" ")
+    parser.add_argument("--num_predictions", type=int, default=10, help="Predictions of a run")
+    parser.add_argument("--num_workers", type=int, default=None, help="All CPUs if unset")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="batch_score_")
+    try:
+        result = run_check(
+            work_dir, args.num_runs, args.num_examples, args.num_classes, args.num_predictions,
+            args.num_workers
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if all(result["checks"].values()) else 1)
@@ -0,0 +1,180 @@
+"""Snapshot latency and memory of the checkpoints of the AutoCV winner.
+
+A ResNet-18 is trained on random batches and its weights are snapshotted
+after each step, as `LogicModel` does after each epoch, with:
+
+  shallow      `state_dict().copy()`, the former checkpoints: the tensors are
+               the live parameters, the snapshot changes with the model
+  clone        a clone of each tensor on the device
+  host         a blocking copy of each tensor to host memory
+  pool         `skeleton.utils.CheckpointPool`, asynchronous copies to pinned
+               host memory (or to memory-mapped files with `--directory`),
+               deduplicated, the worst snapshots beyond `--keep` released
+
+The layers up to `--frozen_fraction` of the parameters are frozen, like a
+pretrained backbone, and deduplicated by the pool. Reports the mean latency of
+a snapshot (and of waiting for it, for the pool), the host and device memory of
+the kept snapshots and whether the first snapshot still holds the initial
+weights after training.
+
+Usage:
+  python -m src.benchmarks.checkpoint_pool --frozen_fraction 0 0.5 \\
+    --output_file checkpoint_pool.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+import torchvision as tv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(SRC_DIR, "winner_cv"))
+import skeleton  # noqa: E402 isort:skip
+
+METHODS = ["shallow", "clone", "host", "pool"]
+
+
+def build_model(device, frozen_fraction):
+    model = tv.models.resnet18(num_classes=10).to(device=device)
+    parameters = list(model.parameters())
+    total = sum(p.numel() for p in parameters)
+    frozen = 0
+    for parameter in parameters:
+        if frozen + parameter.numel() > frozen_fraction * total:
+            break
+        parameter.requires_grad = False
+        frozen += parameter.numel()
+    return model
+
+
+def _nbytes(state_dict):
+    return sum(t.numel() * t.element_size() for t in state_dict.values())
+
+
+def run(method, device, frozen_fraction, num_snapshots, keep, batch_size, directory):
+    torch.manual_seed(0)
+    model = build_model(device, frozen_fraction)
+    optimizer = torch.optim.SGD([p for p in model.parameters() if p.requires_grad], lr=0.1)
+    examples = torch.rand(batch_size, 3, 64, 64, device=device)
+    labels = torch.randint(10, (batch_size, ), device=device)
+    initial = {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}
+    pool = skeleton.utils.CheckpointPool(directory=directory)
+
+    rng = np.random.RandomState(0)
+    first, checkpoints = None, []
+    snapshot_seconds = []
+    for step in range(num_snapshots):
+        if step > 0:
+            optimizer.zero_grad()
+            torch.nn.functional.cross_entropy(model(examples), labels).backward()
+            optimizer.step()
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        start = time.time()
+        if method == "shallow":
+            snapshot = model.state_dict().copy()
+        elif method == "clone":
+            snapshot = {k: v.clone() for k, v in model.state_dict().items()}
+        elif method == "host":
+            snapshot = {k: v.cpu().clone() for k, v in model.state_dict().items()}
+        else:
+            snapshot = pool.snapshot(model.state_dict())
+        snapshot_seconds.append(time.time() - start)
+        # The first snapshot is kept to check it, the others are ranked by random
+        # scores, as in LogicModel.update_condition
+        if first is None:
+            first = snapshot
+            continue
+        checkpoints.append((rng.rand(), snapshot))
+        checkpoints.sort(key=lambda c: c[0], reverse=True)
+        if len(checkpoints) > keep:
+            _, worst = checkpoints.pop()
+            if method == "pool":
+                pool.release(worst)
+
+    if method == "pool":
+        first_state = pool.state_dict(first)
+        summary = pool.summary()
+        host_megabytes = summary["megabytes"] + summary["free_megabytes"]
+        device_megabytes = 0.0
+    else:
+        first_state = first
+        snapshots = [first] + [s for _, s in checkpoints]
+        megabytes = sum(_nbytes(s) for s in snapshots) / 2.0**20
+        if method == "shallow":
+            # The snapshots are the model
+            megabytes = _nbytes(model.state_dict()) / 2.0**20
+        host_megabytes = megabytes if method == "host" else 0.0
+        device_megabytes = megabytes if method != "host" else 0.0
+        if device.type != "cuda":
+            host_megabytes, device_megabytes = host_megabytes + device_megabytes, 0.0
+    holds_initial = all(torch.equal(first_state[k].cpu(), v) for k, v in initial.items())
+    result = {
+        "method": method,
+        "device": str(device),
+        "frozen_fraction": frozen_fraction,
+        "snapshot_ms": 1000.0 * float(np.mean(snapshot_seconds)),
+        "host_megabytes": host_megabytes,
+        "device_megabytes": device_megabytes,
+        "first_snapshot_holds_initial_weights": holds_initial,
+    }
+    if method == "pool":
+        result.update(
+            {
+                "wait_ms": summary["wait_ms"],
+                "deduplicated": summary["deduplicated"]
+            }
+        )
+    return result
+
+
+def run_benchmark(methods, device, frozen_fractions, num_snapshots, keep, batch_size, directory):
+    results = []
+    for frozen_fraction in frozen_fractions:
+        for method in methods:
+            result = run(
+                method, device, frozen_fraction, num_snapshots, keep, batch_size, directory
+            )
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS, help=" ")
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu", help=" "
+    )
+    parser.add_argument(
+        "--frozen_fraction", type=float, nargs="+", default=[0.0, 0.5], help=" "
+    )
+    parser.add_argument("--num_snapshots", type=int, default=30, help=" ")
+    parser.add_argument("--keep", type=int, default=10, help="Snapshots kept, by score")
+    parser.add_argument("--batch_size", type=int, default=32, help=" ")
+    parser.add_argument(
+        "--directory", default=None, help="Memory-mapped files of the pool, host memory if unset"
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.methods, torch.device(args.device), args.frozen_fraction, args.num_snapshots,
+        args.keep, args.batch_size, args.directory
+    )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,163 @@
+"""Images per second of the training data loaders of the AutoCV winner, on CPU.
+
+`tf` is the streaming loader: a `TFDataset` with one session.run per image, in
+the training thread, as used for training sets above `enough_count` (and for
+all of them when the hyper parameter `dataset.num_workers` is 0). `shared`
+decodes the images once with `share_dataset` and reads them with
+`--num_workers` worker processes, each flipping (and with `--augment`,
+applying a Fast AutoAugment policy to) its images. With 0 workers, `shared`
+runs in the training thread.
+
+The images are random, already resized, as after `get_tf_resize`. Reports the
+time to the first batch (which includes decoding and starting the workers) and
+the images per second of the following `--steps` batches.
+
+Usage:
+  python -m src.benchmarks.cv_dataloader --num_workers 0 1 2 4 --augment \\
+    --output_file cv_dataloader.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+import torchvision as tv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(SRC_DIR, "winner_cv"))
+import skeleton  # noqa: E402 isort:skip
+from skeleton.projects.others import get_tf_to_tensor  # noqa: E402 isort:skip
+
+
+def make_tf_dataset(num_images, size, num_classes, seed=0):
+    rng = np.random.RandomState(seed)
+    images = rng.rand(num_images, size, size, 3).astype(np.float32)
+    labels = np.eye(num_classes, dtype=np.float32)[rng.randint(num_classes, size=num_images)]
+    return tf.data.Dataset.from_tensor_slices((images, labels))
+
+
+def build_tf_loader(session, dataset, num_images, batch_size, steps):
+    """The streaming training loader of `LogicModel.build_or_get_dataloader`."""
+    preprocessor = get_tf_to_tensor(is_random_flip=True)
+    dataset = dataset.cache().repeat().map(
+        lambda *x: (preprocessor(x[0]), x[1]), num_parallel_calls=tf.data.experimental.AUTOTUNE
+    ).prefetch(buffer_size=batch_size * 8)
+    dataset = skeleton.data.TFDataset(session, dataset, num_images)
+    dataset = skeleton.data.TransformDataset(dataset, tv.transforms.Compose([]), index=0)
+    return skeleton.data.FixedSizeDataLoader(
+        dataset, steps=steps, batch_size=batch_size, drop_last=True, num_workers=0
+    )
+
+
+def build_shared_loader(session, dataset, num_images, batch_size, steps, num_workers, augment):
+    """The multi-process training loader of `LogicModel.build_or_get_dataloader`."""
+    preprocessor = get_tf_to_tensor(is_random_flip=False)
+    tf_dataset = dataset.apply(
+        tf.data.experimental.map_and_batch(
+            map_func=lambda *x: (preprocessor(x[0]), x[1]),
+            batch_size=256,
+            num_parallel_calls=tf.data.experimental.AUTOTUNE
+        )
+    )
+    dataset, _ = skeleton.data.share_dataset(
+        skeleton.data.TFDataset(session, tf_dataset, num_images)
+    )
+    transforms = [skeleton.data.RandomFlip(p=0.5, dims=[-1])]
+    if augment:
+        # As appended by the Fast AutoAugment search of the winner model
+        transforms += [
+            lambda t: t.cpu().float(),
+            tv.transforms.ToPILImage(),
+            skeleton.data.augmentations.Augmentation(
+                skeleton.data.augmentations.autoaug_policy()
+            ),
+            tv.transforms.ToTensor(),
+        ]
+    dataset = skeleton.data.TransformDataset(dataset, tv.transforms.Compose(transforms), index=0)
+    return skeleton.data.FixedSizeDataLoader(
+        dataset, steps=steps, batch_size=batch_size, drop_last=True, num_workers=num_workers
+    )
+
+
+def measure(build_loader, batch_size, steps):
+    start = time.time()
+    dataloader = build_loader()
+    iterator = iter(dataloader)
+    next(iterator)
+    first_batch_seconds = time.time() - start
+    start = time.time()
+    for _ in iterator:
+        pass
+    seconds = time.time() - start
+    return first_batch_seconds, (steps - 1) * batch_size / seconds
+
+
+def run_benchmark(num_images, size, num_classes, batch_size, steps, num_workers_list, augment):
+    results = []
+    cases = [("tf", 0)] + [("shared", num_workers) for num_workers in num_workers_list]
+    for loader, num_workers in cases:
+        with tf.Graph().as_default(), tf.Session() as session:
+            dataset = make_tf_dataset(num_images, size, num_classes)
+
+            def build_loader():
+                if loader == "tf":
+                    return build_tf_loader(session, dataset, num_images, batch_size, steps)
+                return build_shared_loader(
+                    session, dataset, num_images, batch_size, steps, num_workers, augment
+                )
+
+            first_batch_seconds, images_per_second = measure(build_loader, batch_size, steps)
+        result = {
+            "loader": loader,
+            "num_workers": num_workers,
+            "augment": augment and loader == "shared",
+            "num_images": num_images,
+            "size": size,
+            "batch_size": batch_size,
+            "first_batch_seconds": first_batch_seconds,
+            "images_per_second": images_per_second,
+        }
+        logging.info(json.dumps(result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num_images", type=int, default=5000, help=" ")
+    parser.add_argument("--size", type=int, default=64, help="Height and width of the images")
+    parser.add_argument("--num_classes", type=int, default=10, help=" ")
+    parser.add_argument("--batch_size", type=int, default=32, help=" ")
+    parser.add_argument("--steps", type=int, default=100, help="Batches read per measurement")
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        nargs="+",
+        default=[0, 1, 2, 4],
+        help="Worker counts of the shared loader"
+    )
+    parser.add_argument(
+        "--augment", action="store_true", help="Also apply a Fast AutoAugment policy"
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.num_images, args.size, args.num_classes, args.batch_size, args.steps,
+        args.num_workers, args.augment
+    )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,143 @@
+"""End-to-end throughput of `run_baseline` on synthetic datasets, on CPU.
+
+For each domain, a synthetic dataset (see synthetic_data.py) is written and
+`run_baseline` runs ingestion and scoring on it in a fresh interpreter, with
+no visible GPU. Reports the seconds spent in each ingestion phase (read from
+the `*_duration` entries of end.txt), in scoring, and overall, along with the
+number of predictions and the ALC, so that regressions in ingestion, models
+and scoring can be measured offline.
+
+Usage:
+  python -m src.benchmarks.end_to_end --domains tabular text --time_budget 300 \\
+    --output_file end_to_end.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+# Hide the GPUs before TensorFlow is imported
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+from src.benchmarks import synthetic_data  # noqa: E402 isort:skip
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SRC_DIR)
+
+
+def run_domain(dataset_dir, experiment_dir, time_budget, model_config_name):
+    """Run `run_baseline` in this process and return the measurements."""
+    from src.competition.run_local_test import run_baseline
+
+    start = time.time()
+    alc = run_baseline(
+        dataset_dir,
+        SRC_DIR,
+        experiment_dir,
+        time_budget,
+        time_budget,
+        overwrite=True,
+        model_config_name=model_config_name
+    )
+    end = time.time()
+    prediction_dir = os.path.join(experiment_dir, "predictions")
+    with open(os.path.join(prediction_dir, "end.txt")) as f:
+        end_info = yaml.safe_load(f)
+    result = {
+        "alc": float(alc) if alc is not None else None,
+        "ingestion_success": bool(end_info["ingestion_success"]),
+        "num_predictions": len(glob.glob(os.path.join(prediction_dir, "*.predict_*"))),
+        "total_seconds": end - start,
+        "scoring_seconds": end - end_info["end_time"],
+    }
+    for key, value in end_info.items():
+        if key.endswith("_duration"):
+            result[key[:-len("duration")] + "seconds"] = value
+    return result
+
+
+def run_benchmark(work_dir, domains, num_train, num_test, output_dim, time_budget, config):
+    results = []
+    for domain in domains:
+        dataset_dir = synthetic_data.write_domain_dataset(
+            os.path.join(work_dir, "data", domain), domain, num_train, num_test, output_dim
+        )
+        experiment_dir = os.path.join(work_dir, "experiments", domain)
+        command = [
+            sys.executable, "-m", "src.benchmarks.end_to_end", "--worker", "--dataset_dir",
+            dataset_dir, "--experiment_dir", experiment_dir, "--time_budget",
+            str(time_budget), "--model_config_name", config
+        ]
+        result = {"domain": domain}
+        try:
+            output = subprocess.check_output(command, cwd=REPO_DIR)
+            result.update(json.loads(output.decode().strip().splitlines()[-1]))
+        except subprocess.CalledProcessError as e:
+            result["error"] = "run_baseline exited with code {}".format(e.returncode)
+        logging.info(json.dumps(result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--domains",
+        nargs="+",
+        default=sorted(synthetic_data.DOMAIN_PRESETS),
+        choices=sorted(synthetic_data.DOMAIN_PRESETS),
+        help=" "
+    )
+    parser.add_argument("--num_train", type=int, default=1000, help=" ")
+    parser.add_argument("--num_test", type=int, default=200, help=" ")
+    parser.add_argument("--output_dim", type=int, default=10, help="Number of classes")
+    parser.add_argument("--time_budget", type=int, default=300, help=" ")
+    parser.add_argument(
+        "--model_config_name", default="default.yaml", help="The config in src/configs to use"
+    )
+    parser.add_argument(
+        "--work_dir",
+        default=None,
+        help="Where to write datasets and runs, a temporary dir if unset"
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    # Internal: run a single domain in this process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset_dir", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--experiment_dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_domain(
+            args.dataset_dir, args.experiment_dir, args.time_budget, args.model_config_name
+        )
+        print(json.dumps(result))
+        sys.exit(0)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="end_to_end_")
+    try:
+        results = run_benchmark(
+            work_dir, args.domains, args.num_train, args.num_test, args.output_dim,
+            args.time_budget, args.model_config_name
+        )
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
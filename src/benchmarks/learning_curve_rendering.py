@@ -0,0 +1,154 @@
+"""Cost of rendering learning curves in the scoring program, SVG vs matplotlib.
+
+Startup: a fresh interpreter imports the scoring program (`score.py`, which
+renders SVG and no longer imports matplotlib), and, for the `matplotlib` row,
+also `matplotlib.pyplot` as the scoring program formerly did. Reports the wall
+time and the peak resident set size.
+
+Per update: the time to render the learning curve of a given number of
+predictions and embed it in the detailed results page, either as SVG (see
+scoring_program/svg_rendering.py) or as a base64 PNG drawn with matplotlib
+(like the former commented out `plot_learning_curve` and `write_scores_html`).
+
+Usage:
+  python -m src.benchmarks.learning_curve_rendering --num_points 10 100 1000 \\
+    --output_file rendering.json
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from src.competition.scoring_program.svg_rendering import (
+    render_learning_curve_svg, transform_time
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TIME_BUDGET = 1200
+
+_MEASURE_CODE = """
+import json, resource, sys, time
+start = time.time()
+import src.competition.scoring_program.score
+if sys.argv[1] == "matplotlib":
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot
+seconds = time.time() - start
+# ru_maxrss is in kilobytes on Linux
+peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_rss_mb}))
+"""
+
+
+def measure_startup(renderer):
+    """Return the import seconds and peak RSS of a fresh interpreter."""
+    output = subprocess.check_output([sys.executable, "-c", _MEASURE_CODE, renderer], cwd=REPO_DIR)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def render_svg_page(timestamps, scores):
+    svg = render_learning_curve_svg(timestamps, scores, TIME_BUDGET, task_name="benchmark")
+    return "<html><body><pre>" + svg + "<br></pre></body></html>"
+
+
+def render_png_page(timestamps, scores):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    X = [0] + [transform_time(t, TIME_BUDGET) for t in timestamps] + [1]
+    Y = [0] + list(scores) + [scores[-1]]
+    fig = plt.figure(figsize=(7, 7.07))
+    ax = fig.add_subplot(111)
+    ax.set_xlim(left=0, right=1)
+    ax.set_ylim(bottom=-0.01, top=1)
+    ax.grid(True, zorder=5)
+    ax.plot(X[:-1], Y[:-1], drawstyle="steps-post", marker="o", markersize=3)
+    ax.fill_between(X, Y, color="cyan", step="post")
+    ax.plot(X[-2:], Y[-2:], linestyle="--", linewidth=1)
+    ax.text(X[-1], Y[-1], "{:.4f}".format(Y[-1]))
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    encoded_string = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    image = '<img src="data:image/png;charset=utf-8;base64,{}"/>'.format(encoded_string)
+    return "<html><body><pre>" + image + "<br></pre></body></html>"
+
+
+RENDERERS = {"svg": render_svg_page, "matplotlib": render_png_page}
+
+
+def measure_update(renderer, num_points, repeats, seed=0):
+    """Return the best seconds to render a page of a curve of `num_points` points."""
+    rng = np.random.RandomState(seed)
+    timestamps = list(np.sort(rng.rand(num_points) * TIME_BUDGET))
+    scores = list(np.maximum.accumulate(rng.rand(num_points)))
+    times = []
+    for _ in range(repeats):
+        start = time.time()
+        page = RENDERERS[renderer](timestamps, scores)
+        times.append(time.time() - start)
+    return min(times), len(page)
+
+
+def run_benchmark(renderers, num_points_list, repeats):
+    results = []
+    for renderer in renderers:
+        measurements = [measure_startup(renderer) for _ in range(repeats)]
+        result = {
+            "renderer": renderer,
+            "measure": "startup",
+            "seconds": min(m["seconds"] for m in measurements),
+            "peak_rss_mb": min(m["peak_rss_mb"] for m in measurements),
+        }
+        logging.info(json.dumps(result))
+        results.append(result)
+        for num_points in num_points_list:
+            seconds, page_bytes = measure_update(renderer, num_points, repeats)
+            result = {
+                "renderer": renderer,
+                "measure": "update",
+                "num_points": num_points,
+                "seconds": seconds,
+                "page_bytes": page_bytes,
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--renderers", nargs="+", default=sorted(RENDERERS), choices=sorted(RENDERERS), help=" "
+    )
+    parser.add_argument(
+        "--num_points",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Numbers of predictions of the rendered curves"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="The best run is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.renderers, args.num_points, args.repeats)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,322 @@
+"""Compare the former per-row/per-element `libscores` metrics with the vectorised ones.
+
+The former kernels (`sanitize_array`, `normalize_array`, `binarize_predictions`,
+`acc_stat`, `mvmean`, the per-column AUC and the per-row normalization of
+`log_loss`) are kept below as references, along with the metrics built on them.
+Random solutions and predictions of each shape are scored by both for every
+metric of `compute_all_scores`, for binary, multilabel and multiclass solutions.
+Reports the time of each and whether the scores are identical.
+
+The only reference change is `mvmean` wrapping `map` in a `list`: with Python 3
+`np.array(map(...))` is an object array, so the 2-D means (log loss, regression
+scores) failed and `compute_all_scores` reported them as missing.
+
+Usage:
+  python -m src.benchmarks.libscores_metrics --shapes 10000x10 10000x100 \\
+    --output_file libscores_metrics.json
+"""
+import argparse
+import json
+import logging
+import time
+from functools import reduce
+
+import numpy as np
+from src.competition.scoring_program import libscores
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+EPS = 1e-15
+
+# ======= Former kernels ========
+
+
+def former_sanitize_array(array):
+    a = np.ravel(array)
+    maxi = np.nanmax((list(map(lambda x: x != float("inf"), a))))
+    mini = np.nanmin((list(map(lambda x: x != float("-inf"), a))))
+    array[array == float("inf")] = maxi
+    array[array == float("-inf")] = mini
+    mid = (maxi + mini) / 2
+    array[np.isnan(array)] = mid
+    return array
+
+
+def former_normalize_array(solution, prediction):
+    sol = np.ravel(solution)
+    maxi = np.nanmax((list(map(lambda x: x != float("inf"), sol))))
+    mini = np.nanmin((list(map(lambda x: x != float("-inf"), sol))))
+    if maxi == mini:
+        return [solution, prediction]
+    diff = maxi - mini
+    mid = (maxi + mini) / 2.0
+    new_solution = np.copy(solution)
+    new_solution[solution >= mid] = 1
+    new_solution[solution < mid] = 0
+    new_prediction = (np.copy(prediction) - float(mini)) / float(diff)
+    new_prediction[new_prediction > 1] = 1
+    new_prediction[new_prediction < 0] = 0
+    return [new_solution, new_prediction]
+
+
+def former_binarize_predictions(array, task="binary.classification"):
+    bin_array = np.zeros(array.shape)
+    if (task != "multiclass.classification") or (array.shape[1] == 1):
+        bin_array[array >= 0.5] = 1
+    else:
+        sample_num = array.shape[0]
+        for i in range(sample_num):
+            j = np.argmax(array[i, :])
+            bin_array[i, j] = 1
+    return bin_array
+
+
+def former_acc_stat(solution, prediction):
+    TN = sum(np.multiply((1 - solution), (1 - prediction)))
+    FN = sum(np.multiply(solution, (1 - prediction)))
+    TP = sum(np.multiply(solution, prediction))
+    FP = sum(np.multiply((1 - solution), prediction))
+    return (TN, FP, TP, FN)
+
+
+def former_mvmean(R, axis=0):
+    if len(R.shape) == 0:
+        return R
+
+    def average(x):
+        return reduce(
+            lambda i, j: (0, (j[0] / (j[0] + 1.0)) * i[1] + (1.0 / (j[0] + 1)) * j[1]),
+            enumerate(x)
+        )[1]
+
+    R = np.array(R)
+    if len(R.shape) == 1:
+        return average(R)
+    if axis == 1:
+        return np.array(list(map(average, R)))
+    else:
+        return np.array(list(map(average, R.transpose())))
+
+
+# ======= Former metrics ========
+
+
+def former_bac_metric(solution, prediction, task="binary.classification"):
+    label_num = solution.shape[1]
+    bin_prediction = former_binarize_predictions(prediction, task)
+    [tn, fp, tp, fn] = former_acc_stat(solution, bin_prediction)
+    tp = np.maximum(EPS, tp)
+    pos_num = np.maximum(EPS, tp + fn)
+    tpr = tp / pos_num
+    if (task != "multiclass.classification") or (label_num == 1):
+        tn = np.maximum(EPS, tn)
+        neg_num = np.maximum(EPS, tn + fp)
+        tnr = tn / neg_num
+        bac = 0.5 * (tpr + tnr)
+        base_bac = 0.5
+    else:
+        bac = tpr
+        base_bac = 1.0 / label_num
+    bac = former_mvmean(bac)
+    return (bac - base_bac) / np.maximum(EPS, (1 - base_bac))
+
+
+def former_f1_metric(solution, prediction, task="binary.classification"):
+    label_num = solution.shape[1]
+    bin_prediction = former_binarize_predictions(prediction, task)
+    [tn, fp, tp, fn] = former_acc_stat(solution, bin_prediction)
+    true_pos_num = np.maximum(EPS, tp + fn)
+    found_pos_num = np.maximum(EPS, tp + fp)
+    tp = np.maximum(EPS, tp)
+    tpr = tp / true_pos_num
+    ppv = tp / found_pos_num
+    arithmetic_mean = 0.5 * np.maximum(EPS, tpr + ppv)
+    f1 = former_mvmean(tpr * ppv / arithmetic_mean)
+    if (task != "multiclass.classification") or (label_num == 1):
+        base_f1 = 0.5
+    else:
+        base_f1 = 1.0 / label_num
+    return (f1 - base_f1) / np.maximum(EPS, (1 - base_f1))
+
+
+def former_log_loss(solution, prediction, task="binary.classification"):
+    [sample_num, label_num] = solution.shape
+    pred = np.copy(prediction)
+    sol = np.copy(solution)
+    if (task == "multiclass.classification") and (label_num > 1):
+        norma = np.sum(prediction, axis=1)
+        for k in range(sample_num):
+            pred[k, :] /= np.maximum(norma[k], EPS)
+        sol = former_binarize_predictions(solution, task="multiclass.classification")
+    pred = np.minimum(1 - EPS, np.maximum(EPS, pred))
+    pos_class_log_loss = -former_mvmean(sol * np.log(pred), axis=0)
+    if (task != "multiclass.classification") or (label_num == 1):
+        neg_class_log_loss = -former_mvmean((1 - sol) * np.log(1 - pred), axis=0)
+        return pos_class_log_loss + neg_class_log_loss
+    return np.sum(pos_class_log_loss)
+
+
+def former_pac_metric(solution, prediction, task="binary.classification"):
+    [sample_num, label_num] = solution.shape
+    if label_num == 1:
+        task = "binary.classification"
+    the_log_loss = former_log_loss(solution, prediction, task)
+    frac_pos = 1.0 * sum(solution) / sample_num
+    the_base_log_loss = libscores.prior_log_loss(frac_pos, task)
+    pac = former_mvmean(np.exp(-the_log_loss))
+    base_pac = former_mvmean(np.exp(-the_base_log_loss))
+    return (pac - base_pac) / np.maximum(EPS, (1 - base_pac))
+
+
+def former_auc_metric(solution, prediction, task="binary.classification"):
+    label_num = solution.shape[1]
+    auc = np.empty(label_num)
+    for k in range(label_num):
+        r_ = libscores.tiedrank(prediction[:, k])
+        s_ = solution[:, k]
+        npos = sum(s_ == 1)
+        nneg = sum(s_ < 1)
+        auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
+    return 2 * former_mvmean(auc) - 1
+
+
+def former_r2_metric(solution, prediction, task="regression"):
+    mse = former_mvmean((solution - prediction)**2)
+    var = former_mvmean((solution - former_mvmean(solution))**2)
+    return former_mvmean(1 - mse / var)
+
+
+def former_a_metric(solution, prediction, task="regression"):
+    mae = former_mvmean(np.abs(solution - prediction))
+    mad = former_mvmean(np.abs(solution - former_mvmean(solution)))
+    return former_mvmean(1 - mae / mad)
+
+
+# Metric name: (former, vectorised, task, uses raw inputs), as in `compute_all_scores`
+METRICS = {
+    "bac_binary": (former_bac_metric, libscores.bac_metric, "binary.classification", False),
+    "bac_multiclass":
+        (former_bac_metric, libscores.bac_metric, "multiclass.classification", False),
+    "f1_binary": (former_f1_metric, libscores.f1_metric, "binary.classification", False),
+    "f1_multiclass": (former_f1_metric, libscores.f1_metric, "multiclass.classification", False),
+    "pac_binary": (former_pac_metric, libscores.pac_metric, "binary.classification", False),
+    "pac_multiclass":
+        (former_pac_metric, libscores.pac_metric, "multiclass.classification", False),
+    "auc": (former_auc_metric, libscores.auc_metric, "binary.classification", False),
+    "r2": (former_r2_metric, libscores.r2_metric, "regression", True),
+    "abs": (former_a_metric, libscores.a_metric, "regression", True),
+}
+
+
+def _parse_shape(shape):
+    num_examples, num_classes = shape.split("x")
+    return int(num_examples), int(num_classes)
+
+
+def _best_time(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.time()
+        output = function()
+        times.append(time.time() - start)
+    return min(times), output
+
+
+def _identical(a, b):
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_identical(x, y) for x, y in zip(a, b))
+    a, b = np.asarray(a), np.asarray(b)
+    return a.shape == b.shape and bool(np.array_equal(a, b, equal_nan=True))
+
+
+def make_solution(rng, num_examples, num_classes, labels):
+    """Random 0/1 solution, every column having both classes."""
+    if labels == "multiclass":
+        solution = np.zeros((num_examples, num_classes))
+        solution[np.arange(num_examples), rng.randint(num_classes, size=num_examples)] = 1
+        solution[:num_classes] = np.eye(num_classes)
+    else:
+        frac_pos = 0.5 if labels == "binary" else 0.1
+        solution = (rng.rand(num_examples, num_classes) < frac_pos).astype(np.float64)
+        solution[0], solution[1] = 1, 0
+    return solution
+
+
+def make_prediction(rng, num_examples, num_classes):
+    """Random predictions in [0, 1] with some NaN and infinite values to sanitize."""
+    prediction = rng.rand(num_examples, num_classes)
+    special = rng.choice([np.nan, np.inf, -np.inf], size=3 * num_classes)
+    prediction.ravel()[rng.choice(prediction.size, size=special.size, replace=False)] = special
+    return prediction
+
+
+def run_benchmark(shapes, repeats, seed=0):
+    rng = np.random.RandomState(seed)
+    results = []
+    for num_examples, num_classes in shapes:
+        for labels in ["binary", "multilabel", "multiclass"]:
+            solution = make_solution(rng, num_examples, num_classes, labels)
+            raw_prediction = make_prediction(rng, num_examples, num_classes)
+            kernels = {
+                "sanitize_array":
+                    (
+                        lambda: former_sanitize_array(raw_prediction.copy()),
+                        lambda: libscores.sanitize_array(raw_prediction.copy())
+                    ),
+                "normalize_array":
+                    (
+                        lambda: former_normalize_array(solution, raw_prediction),
+                        lambda: libscores.normalize_array(solution, raw_prediction)
+                    ),
+            }
+            prediction = libscores.sanitize_array(raw_prediction.copy())
+            csolution, cprediction = libscores.normalize_array(solution, prediction)
+            for name, (former, vectorised, task, raw) in sorted(METRICS.items()):
+                s, p = (solution, prediction) if raw else (csolution, cprediction)
+                kernels[name] = (
+                    lambda f=former, t=task, s=s, p=p: f(s, p, task=t),
+                    lambda f=vectorised, t=task, s=s, p=p: f(s, p, task=t),
+                )
+            for name, (former, vectorised) in sorted(kernels.items()):
+                former_seconds, former_output = _best_time(former, repeats)
+                seconds, output = _best_time(vectorised, repeats)
+                result = {
+                    "num_examples": num_examples,
+                    "num_classes": num_classes,
+                    "labels": labels,
+                    "metric": name,
+                    "former_seconds": former_seconds,
+                    "vectorised_seconds": seconds,
+                    "speedup": former_seconds / seconds if seconds > 0 else float("inf"),
+                    "identical": _identical(former_output, output),
+                }
+                logging.info(json.dumps(result))
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=["100x2", "1000x10", "10000x10", "10000x100"],
+        help="Shapes as <num_examples>x<num_classes>"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="The best time is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark([_parse_shape(s) for s in args.shapes], args.repeats)
+    num_different = sum(not result["identical"] for result in results)
+    if num_different:
+        logging.warning("{} results differ from the former implementation".format(num_different))
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
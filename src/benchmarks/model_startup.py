@@ -0,0 +1,83 @@
+"""Startup cost of `src/model.py` per domain.
+
+Each measurement runs in a fresh interpreter, as the ingestion program does:
+it imports `model` and looks up `DOMAIN_TO_MODEL[domain]`, which imports only
+that domain's winner. The `all` row looks up every domain, i.e. the cost of
+the former eager imports, and `none` only imports `model`. Reports the wall
+time and the peak resident set size of the process.
+
+Usage:
+  python -m src.benchmarks.model_startup --repeats 3 --output_file startup.json
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+DOMAINS = ["image", "video", "text", "speech", "tabular"]
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEASURE_CODE = """
+import json, resource, sys, time
+start = time.time()
+import model
+for domain in sys.argv[1:]:
+    model.DOMAIN_TO_MODEL[domain]
+seconds = time.time() - start
+# ru_maxrss is in kilobytes on Linux
+peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_rss_mb}))
+"""
+
+
+def measure(domains):
+    """Return the startup seconds and peak RSS of a fresh interpreter loading `domains`."""
+    output = subprocess.check_output(
+        [sys.executable, "-c", _MEASURE_CODE] + list(domains), cwd=SRC_DIR
+    )
+    # The winners may print while being imported, the measurement is the last line
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run_benchmark(cases, repeats):
+    results = []
+    for case in cases:
+        domains = {"none": [], "all": DOMAINS}.get(case, [case])
+        measurements = [measure(domains) for _ in range(repeats)]
+        result = {
+            "domain": case,
+            "seconds": min(m["seconds"] for m in measurements),
+            "peak_rss_mb": min(m["peak_rss_mb"] for m in measurements),
+        }
+        logging.info(json.dumps(result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--domains",
+        nargs="+",
+        default=["none"] + DOMAINS + ["all"],
+        choices=["none"] + DOMAINS + ["all"],
+        help=" "
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="The best run is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.domains, args.repeats)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,154 @@
+"""Compare the former per-example `Model.to_numpy` loop with `NumpyConverter`.
+
+Synthetic datasets are written for a fixed-shape domain (image) and a domain
+with a variable sequence size (text). Each conversion runs in a fresh
+interpreter to measure its peak resident set size. Reports examples/sec, peak
+RSS, and whether both conversions yield the same values.
+
+Usage:
+  python -m src.benchmarks.numpy_conversion --num_examples 5000 --output_file to_numpy.json
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+from src.benchmarks import synthetic_data
+from src.competition.ingestion_program.dataset import AutoDLDataset
+from src.numpy_converter import NumpyConverter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+MODES = ["per_example", "batched"]
+# Keyword arguments of `synthetic_data.write_dataset` per domain
+DOMAIN_TO_DATASET = {
+    "image": dict(tensor_shape=(1, 32, 32, 3), output_dim=10, fmt="dense"),
+    "text": dict(tensor_shape=(200, 1, 1, 1), output_dim=2, fmt="sparse", vocabulary_size=1000),
+}
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def per_example_to_numpy(dataset):
+    """The former `Model.to_numpy`: one `sess.run` per example into lists."""
+    iterator = dataset.make_one_shot_iterator()
+    next_element = iterator.get_next()
+    X = []
+    Y = []
+    with tf.Session(config=tf.ConfigProto(log_device_placement=False)) as sess:
+        while True:
+            try:
+                example, labels = sess.run(next_element)
+                X.append(example)
+                Y.append(labels)
+            except tf.errors.OutOfRangeError:
+                break
+    return X, Y
+
+
+def convert(mode, train_dir, batch_size):
+    """Convert the dataset in this process and return the measurements."""
+    dataset = AutoDLDataset(train_dir).get_dataset()
+    start = time.time()
+    if mode == "per_example":
+        X, Y = per_example_to_numpy(dataset)
+    else:
+        X, Y = NumpyConverter(batch_size=batch_size).convert(dataset)
+    seconds = time.time() - start
+    return {
+        "seconds": seconds,
+        "num_examples": len(X),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "checksum": float(sum(np.sum(x, dtype=np.float64) for x in X) + np.sum(Y)),
+    }
+
+
+def run_benchmark(work_dir, domains, num_examples, batch_size):
+    results = []
+    for domain in domains:
+        data_dir, _ = synthetic_data.write_dataset(
+            work_dir,
+            "synthetic_" + domain,
+            num_train=num_examples,
+            num_test=1,
+            **DOMAIN_TO_DATASET[domain]
+        )
+        train_dir = os.path.join(data_dir, "train")
+        reference_checksum = None
+        for mode in MODES:
+            output = subprocess.check_output(
+                [
+                    sys.executable, "-m", "src.benchmarks.numpy_conversion", "--worker", mode,
+                    "--train_dir", train_dir, "--batch_size",
+                    str(batch_size)
+                ],
+                cwd=REPO_DIR
+            )
+            measurement = json.loads(output.decode().strip().splitlines()[-1])
+            if reference_checksum is None:
+                reference_checksum = measurement["checksum"]
+            seconds = measurement["seconds"]
+            result = {
+                "domain": domain,
+                "mode": mode,
+                "num_examples": measurement["num_examples"],
+                "seconds": seconds,
+                "examples_per_sec": measurement["num_examples"] / seconds
+                if seconds > 0 else float("inf"),
+                "peak_rss_mb": measurement["peak_rss_mb"],
+                "same_as_per_example": bool(
+                    np.isclose(measurement["checksum"], reference_checksum)
+                ),
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--domains",
+        nargs="+",
+        default=sorted(DOMAIN_TO_DATASET),
+        choices=sorted(DOMAIN_TO_DATASET),
+        help=" "
+    )
+    parser.add_argument("--num_examples", type=int, default=5000, help=" ")
+    parser.add_argument("--batch_size", type=int, default=128, help="Of NumpyConverter")
+    parser.add_argument(
+        "--work_dir", default=None, help="Where to write the TFRecords, a temporary dir if unset"
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    # Internal: convert a single dataset in this process
+    parser.add_argument("--worker", default=None, choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--train_dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(convert(args.worker, args.train_dir, args.batch_size)))
+        sys.exit(0)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="numpy_conversion_")
+    try:
+        results = run_benchmark(work_dir, args.domains, args.num_examples, args.batch_size)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,139 @@
+"""Compare the per-record and batched parsing modes of `AutoDLDataset`.
+
+Synthetic TFRecords are written for each format (dense, compressed, sparse),
+then every parsing mode reads the whole dataset and reports its throughput.
+Both modes are also checked to yield the same examples.
+
+Usage:
+  python -m src.benchmarks.parse_throughput --num_examples 2000 --output_file parse.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+from src.benchmarks import synthetic_data
+from src.competition.ingestion_program.dataset import AutoDLDataset
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# [sequence_size, row_count, col_count, num_channels] of the synthetic examples
+FORMAT_TO_SHAPE = {
+    "dense": (1, 32, 32, 3),
+    "compressed": (1, 32, 32, 3),
+    "sparse": (1, 1, 2000, 1),
+}
+
+
+def _read_all(dataset_dir, batch_parse_size, consume_batch_size, num_check):
+    """Read every example once and return (seconds, num_examples, first examples)."""
+    with tf.Graph().as_default():
+        dataset = AutoDLDataset(dataset_dir, batch_parse_size=batch_parse_size).get_dataset()
+        check_next = dataset.make_one_shot_iterator().get_next()
+        # Padded batches keep the number of sess.run calls (and their overhead) low
+        timed_dataset = dataset.padded_batch(consume_batch_size, dataset.output_shapes)
+        timed_next = timed_dataset.make_one_shot_iterator().get_next()
+        num_read = tf.shape(timed_next[-1])[0]
+        with tf.Session() as sess:
+            first_examples = [sess.run(check_next) for _ in range(num_check)]
+            num_examples = 0
+            start = time.time()
+            while True:
+                try:
+                    num_examples += sess.run(num_read)
+                except tf.errors.OutOfRangeError:
+                    break
+            seconds = time.time() - start
+    return seconds, num_examples, first_examples
+
+
+def _same_examples(examples_a, examples_b):
+    for sample_a, sample_b in zip(examples_a, examples_b):
+        for tensor_a, tensor_b in zip(sample_a, sample_b):
+            if tensor_a.shape != tensor_b.shape or not np.allclose(tensor_a, tensor_b):
+                return False
+    return True
+
+
+def run_benchmark(
+    work_dir, formats, num_examples, batch_parse_sizes, consume_batch_size, num_check
+):
+    results = []
+    for fmt in formats:
+        data_dir, _ = synthetic_data.write_dataset(
+            work_dir,
+            "synthetic_" + fmt,
+            num_train=num_examples,
+            num_test=1,
+            tensor_shape=FORMAT_TO_SHAPE[fmt],
+            output_dim=10,
+            fmt=fmt
+        )
+        train_dir = os.path.join(data_dir, "train")
+        reference_examples = None
+        for batch_parse_size in [None] + list(batch_parse_sizes):
+            seconds, num_read, examples = _read_all(
+                train_dir, batch_parse_size, consume_batch_size, num_check
+            )
+            if reference_examples is None:
+                reference_examples = examples
+            result = {
+                "format": fmt,
+                "mode": "per_record" if batch_parse_size is None else "batched",
+                "batch_parse_size": batch_parse_size,
+                "num_examples": int(num_read),
+                "seconds": seconds,
+                "examples_per_sec": int(num_read) / seconds if seconds > 0 else float("inf"),
+                "same_as_per_record": _same_examples(reference_examples, examples),
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        default=synthetic_data.FORMATS,
+        choices=synthetic_data.FORMATS,
+        help=" "
+    )
+    parser.add_argument("--num_examples", type=int, default=2000, help=" ")
+    parser.add_argument("--batch_parse_sizes", type=int, nargs="+", default=[32, 128], help=" ")
+    parser.add_argument(
+        "--consume_batch_size", type=int, default=64, help="Batch size used to read the results"
+    )
+    parser.add_argument(
+        "--num_check", type=int, default=16, help="Number of examples compared between modes"
+    )
+    parser.add_argument(
+        "--work_dir", default=None, help="Where to write the TFRecords, a temporary dir if unset"
+    )
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="parse_throughput_")
+    try:
+        results = run_benchmark(
+            work_dir, args.formats, args.num_examples, args.batch_parse_sizes,
+            args.consume_batch_size, args.num_check
+        )
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,102 @@
+"""Cost and quality of the successive halving search of Fast AutoAugment policies.
+
+Simulates the policy search of the AutoCV winner (`Model.adapt`): each of
+`--num_policies` policies has a true quality and its score on a valid batch is
+the quality plus noise. Like `epoch_valid(reduction='max')`, a policy is scored
+by its best batch. The exhaustive search (budget = policies * passes) evaluates
+every policy on all the passes; `SuccessiveHalving` spends `--budgets` valid
+passes. Reports the valid passes spent, the rungs and the mean fraction of the
+true `--num_select` best policies found, over `--trials` random searches.
+
+Usage:
+  python -m src.benchmarks.policy_search --budgets 600 400 200 100 \\
+    --output_file policy_search.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(SRC_DIR, "winner_cv"))
+from skeleton.data import SuccessiveHalving  # noqa: E402 isort:skip
+
+
+def simulate(num_policies, num_passes, num_valid_steps, num_select, eta, budget, noise, rng):
+    """Return the valid passes spent and the fraction of the best policies found."""
+    qualities = rng.rand(num_policies)
+    search = SuccessiveHalving(
+        num_policies,
+        max_steps=num_passes * num_valid_steps,
+        eta=eta,
+        num_select=num_select,
+        budget=budget * num_valid_steps
+    )
+    best_scores = {}
+
+    def evaluate(index, steps):
+        scores = qualities[index] + noise * rng.randn(steps)
+        best_scores[index] = max(best_scores.get(index, -np.inf), scores.max())
+        return {"score": best_scores[index], "loss": -best_scores[index]}
+
+    selected = [index for index, _ in search.run(evaluate)[:num_select]]
+    best = np.argsort(qualities)[::-1][:num_select]
+    return search, len(set(selected) & set(best)) / float(num_select)
+
+
+def run_benchmark(
+    num_policies, num_passes, num_valid_steps, num_select, eta, budgets, noise, trials, seed=0
+):
+    results = []
+    for budget in budgets:
+        rng = np.random.RandomState(seed)
+        recalls = []
+        for _ in range(trials):
+            search, recall = simulate(
+                num_policies, num_passes, num_valid_steps, num_select, eta, budget, noise, rng
+            )
+            recalls.append(recall)
+        result = {
+            "budget": budget,
+            "valid_passes": search.cost / float(num_valid_steps),
+            "rungs": search.rungs,
+            "recall": float(np.mean(recalls)),
+        }
+        logging.info(json.dumps(result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num_policies", type=int, default=100, help=" ")
+    parser.add_argument("--num_passes", type=int, default=6, help="Valid passes of a policy")
+    parser.add_argument("--num_valid_steps", type=int, default=10, help="Batches of a pass")
+    parser.add_argument("--num_select", type=int, default=5, help=" ")
+    parser.add_argument("--eta", type=int, default=3, help=" ")
+    parser.add_argument(
+        "--budgets", type=int, nargs="+", default=[600, 400, 200, 100], help="Valid passes"
+    )
+    parser.add_argument("--noise", type=float, default=0.1, help="Deviation of a batch score")
+    parser.add_argument("--trials", type=int, default=200, help=" ")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.num_policies, args.num_passes, args.num_valid_steps, args.num_select, args.eta,
+        args.budgets, args.noise, args.trials
+    )
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
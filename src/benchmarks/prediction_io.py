@@ -0,0 +1,86 @@
+"""Round-trip benchmark of the text and binary prediction file formats.
+
+For each shape, random predictions are written with `data_io.write` (text and
+binary) and read back with `libscores.read_array`, which is what ingestion and
+scoring do for every `predict_N` file. Reports write/read times, file sizes and
+the largest difference to the original predictions.
+
+Usage:
+  python -m src.benchmarks.prediction_io --shapes 10000x100 100000x1000 --output_file io.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from src.competition.ingestion_program import data_io
+from src.competition.scoring_program.libscores import read_array
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def _parse_shape(shape):
+    num_examples, num_classes = shape.split("x")
+    return int(num_examples), int(num_classes)
+
+
+def run_benchmark(work_dir, shapes, repeats, seed=0):
+    rng = np.random.RandomState(seed)
+    results = []
+    for num_examples, num_classes in shapes:
+        predictions = rng.rand(num_examples, num_classes)
+        filename = os.path.join(work_dir, "bench.predict_0")
+        for binary in [False, True]:
+            write_times, read_times = [], []
+            for _ in range(repeats):
+                start = time.time()
+                data_io.write(filename, predictions, binary=binary)
+                write_times.append(time.time() - start)
+                start = time.time()
+                # Touch every value, a memory-mapped read is otherwise lazy
+                max_error = float(np.max(np.abs(read_array(filename) - predictions)))
+                read_times.append(time.time() - start)
+            result = {
+                "format": "binary" if binary else "text",
+                "num_examples": num_examples,
+                "num_classes": num_classes,
+                "write_seconds": min(write_times),
+                "read_seconds": min(read_times),
+                "file_bytes": os.path.getsize(filename),
+                "max_abs_error": max_error,
+            }
+            logging.info(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=["1000x10", "10000x100", "100000x1000"],
+        help="Prediction shapes as <num_examples>x<num_classes>"
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="The best time is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="prediction_io_")
+    try:
+        results = run_benchmark(work_dir, [_parse_shape(s) for s in args.shapes], args.repeats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,286 @@
+"""Microbenchmarks of the evaluation path (`score.py` and `libscores.py`).
+
+Synthetic solutions and predictions are written for each combination of size
+(number of examples and classes), label type (one-hot multiclass labels or
+multilabel labels with a given density) and number of prediction files. Then
+the best time of `--repeats` runs is measured for:
+
+  read_array   reading the solution and the prediction files
+  tiedrank     ranking the first column of each prediction
+  autodl_auc   the NAUC of each prediction
+  accuracy     the accuracy of each prediction
+  bootstrap    `get_scores_bootstrap` of `autodl_auc` on 10 samples, one process
+  score_fn     a full pass of the scoring program on the prediction directory,
+               with error bars and the detailed results page
+
+The results are written as JSON with the environment (versions, git commit) so
+that runs can be compared over time. With `--baseline_file`, the results of a
+former run, every benchmark slower than the baseline by more than
+`--max_slowdown` is reported and the exit code is 1:
+
+  python -m src.benchmarks.scoring --output_file scoring.json
+  python -m src.benchmarks.scoring --baseline_file scoring.json --output_file new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from src.competition.ingestion_program import data_io
+from src.competition.scoring_program import libscores, score
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LABEL_TYPES = ["multiclass", "multilabel"]
+BENCHMARKS = ["read_array", "tiedrank", "autodl_auc", "accuracy", "bootstrap", "score_fn"]
+TASK_NAME = "bench"
+TIME_BUDGET = 1200
+
+# A result is identified by these keys, e.g. to compare it with a baseline
+RESULT_KEYS = ["benchmark", "num_examples", "num_classes", "label_type", "num_predictions"]
+
+
+def _parse_size(size):
+    num_examples, num_classes = size.split("x")
+    return int(num_examples), int(num_classes)
+
+
+def make_solution(num_examples, num_classes, label_type, label_density, rng):
+    if label_type == "multiclass":
+        return np.eye(num_classes)[rng.randint(num_classes, size=num_examples)]
+    return (rng.rand(num_examples, num_classes) < label_density).astype(float)
+
+
+def make_predictions(solution, num_predictions, rng):
+    """Return predictions getting closer to the solution, like those of a training run."""
+    predictions = []
+    for i in range(num_predictions):
+        signal = (i + 1.0) / num_predictions
+        predictions.append(signal * solution + rng.rand(*solution.shape))
+    return predictions
+
+
+def write_run(work_dir, solution, predictions):
+    """Write the solution and an ingestion output directory, as for the scoring
+  program, and return the solution and prediction directories.
+  """
+    solution_dir = os.path.join(work_dir, "solution")
+    prediction_dir = os.path.join(work_dir, "predictions")
+    for directory in [solution_dir, prediction_dir]:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+    np.savetxt(os.path.join(solution_dir, TASK_NAME + ".solution"), solution, fmt="%d")
+    start_time = time.time() - 10 * len(predictions)
+    with open(os.path.join(prediction_dir, "start.txt"), "w") as f:
+        f.write(
+            "ingestion_pid: 1\nstart_time: {}\ntime_budget: {}\n".format(start_time, TIME_BUDGET)
+        )
+        for i, prediction in enumerate(predictions):
+            filename = "{}.predict_{}".format(TASK_NAME, i)
+            data_io.write(os.path.join(prediction_dir, filename), prediction)
+            f.write("{}: {}\n".format(i, start_time + 10 * (i + 1)))
+    with open(os.path.join(prediction_dir, "end.txt"), "w") as f:
+        f.write(
+            "ingestion_duration: {}\ningestion_success: 1\nend_time: {}\n".format(
+                10 * len(predictions), time.time()
+            )
+        )
+    return solution_dir, prediction_dir
+
+
+def _best_time(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def measure(benchmark, solution, predictions, solution_dir, prediction_dir, score_dir, repeats):
+    """Return the best seconds of `benchmark` over `repeats` runs."""
+    if benchmark == "read_array":
+        files = [os.path.join(solution_dir, TASK_NAME + ".solution")] + [
+            os.path.join(prediction_dir, "{}.predict_{}".format(TASK_NAME, i))
+            for i in range(len(predictions))
+        ]
+
+        def function():
+            # Touch every value, a memory-mapped read is otherwise lazy
+            return [float(np.sum(libscores.read_array(f))) for f in files]
+
+    elif benchmark == "tiedrank":
+        columns = [np.ascontiguousarray(prediction[:, 0]) for prediction in predictions]
+
+        def function():
+            return [libscores.tiedrank(column) for column in columns]
+
+    elif benchmark == "autodl_auc":
+
+        def function():
+            return [score.autodl_auc(solution, prediction) for prediction in predictions]
+
+    elif benchmark == "accuracy":
+
+        def function():
+            return [score.accuracy(solution, prediction) for prediction in predictions]
+
+    elif benchmark == "bootstrap":
+
+        def function():
+            return score.get_scores_bootstrap(
+                score.autodl_auc, solution, predictions, n=10, num_workers=1
+            )
+
+    elif benchmark == "score_fn":
+
+        def function():
+            shutil.rmtree(score_dir, ignore_errors=True)
+            score.score_fn(solution_dir, prediction_dir, score_dir)
+
+    else:
+        raise ValueError("Unknown benchmark {}.".format(benchmark))
+    return _best_time(function, repeats)
+
+
+def get_environment():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmark(
+    work_dir, sizes, label_types, num_predictions_list, benchmarks, repeats, label_density, seed=0
+):
+    # The scoring program logs every prediction
+    score.logger.setLevel(logging.WARNING)
+    rng = np.random.RandomState(seed)
+    results = []
+    for num_examples, num_classes in sizes:
+        for label_type in label_types:
+            solution = make_solution(num_examples, num_classes, label_type, label_density, rng)
+            for num_predictions in num_predictions_list:
+                predictions = make_predictions(solution, num_predictions, rng)
+                solution_dir, prediction_dir = write_run(work_dir, solution, predictions)
+                score_dir = os.path.join(work_dir, "scores")
+                for benchmark in benchmarks:
+                    if benchmark == "accuracy" and label_type != "multiclass":
+                        continue  # Only computed for multiclass tasks
+                    result = {
+                        "benchmark": benchmark,
+                        "num_examples": num_examples,
+                        "num_classes": num_classes,
+                        "label_type": label_type,
+                        "num_predictions": num_predictions,
+                        "seconds": measure(
+                            benchmark, solution, predictions, solution_dir, prediction_dir,
+                            score_dir, repeats
+                        ),
+                    }
+                    logging.info(json.dumps(result))
+                    results.append(result)
+    return results
+
+
+def compare_to_baseline(results, baseline_results, max_slowdown):
+    """Return the results slower than their baseline by more than `max_slowdown`
+  times, with the keys 'baseline_seconds' and 'slowdown' added.
+  """
+    baseline = {tuple(r[k] for k in RESULT_KEYS): r["seconds"] for r in baseline_results}
+    regressions = []
+    for result in results:
+        baseline_seconds = baseline.get(tuple(result[k] for k in RESULT_KEYS))
+        if not baseline_seconds:
+            continue
+        slowdown = result["seconds"] / baseline_seconds
+        if slowdown > max_slowdown:
+            regression = dict(result, baseline_seconds=baseline_seconds, slowdown=slowdown)
+            logging.warning("Regression: {}".format(json.dumps(regression)))
+            regressions.append(regression)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["1000x10", "10000x10", "10000x100"],
+        help="Solution sizes as <num_examples>x<num_classes>"
+    )
+    parser.add_argument(
+        "--label_types", nargs="+", default=LABEL_TYPES, choices=LABEL_TYPES, help=" "
+    )
+    parser.add_argument(
+        "--label_density",
+        type=float,
+        default=0.1,
+        help="Fraction of positive labels of the multilabel solutions"
+    )
+    parser.add_argument(
+        "--num_predictions",
+        type=int,
+        nargs="+",
+        default=[1, 10],
+        help="Numbers of prediction files"
+    )
+    parser.add_argument("--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS, help=" ")
+    parser.add_argument("--repeats", type=int, default=3, help="The best time is reported")
+    parser.add_argument("--output_file", default=None, help="Write the results as JSON here")
+    parser.add_argument(
+        "--baseline_file", default=None, help="The output file of a former run to compare with"
+    )
+    parser.add_argument(
+        "--max_slowdown",
+        type=float,
+        default=1.5,
+        help="Times slower than the baseline considered a regression"
+    )
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="scoring_")
+    try:
+        results = run_benchmark(
+            work_dir, [_parse_size(s) for s in args.sizes], args.label_types, args.num_predictions,
+            args.benchmarks, args.repeats, args.label_density
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    output = {"environment": get_environment(), "results": results}
+
+    regressions = []
+    if args.baseline_file is not None:
+        with open(args.baseline_file) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline["results"], args.max_slowdown)
+        output["baseline_environment"] = baseline["environment"]
+        output["regressions"] = regressions
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(output, f, indent=2)
+    print(json.dumps(output, indent=2))
+    sys.exit(1 if regressions else 0)
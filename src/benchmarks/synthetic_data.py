@@ -0,0 +1,366 @@
+"""Write synthetic datasets in the AutoDL TFRecord format.
+
+The datasets have the same layout as the ones read by the ingestion program:
+
+  <dataset_dir>/<name>.data/train/metadata.textproto
+  <dataset_dir>/<name>.data/train/sample-<name>-train.tfrecord
+  <dataset_dir>/<name>.data/test/...
+
+They are meant for benchmarks, where the content of the examples does not
+matter but their format (dense, compressed or sparse) and size do.
+`write_domain_dataset` writes a complete dataset for one of `DOMAIN_PRESETS`,
+with its solution file, that can be given to `run_baseline` as dataset_dir:
+
+  python -m src.benchmarks.synthetic_data --domain speech --dataset_dir synthetic/speech
+"""
+import argparse
+import os
+
+import numpy as np
+import tensorflow as tf
+from google.protobuf import text_format
+from src.competition.ingestion_program.data_pb2 import DataSpecification, MatrixSpec
+
+FORMATS = ["dense", "compressed", "sparse"]
+
+# Keyword arguments of `write_dataset` mimicking the datasets of each domain.
+# With `min_sequence_size`, the sequence size of each example is drawn between
+# `min_sequence_size` and the first dimension of `tensor_shape`.
+DOMAIN_PRESETS = {
+    "image": dict(tensor_shape=(1, 64, 64, 3), fmt="compressed"),
+    "video": dict(tensor_shape=(10, 64, 64, 3), fmt="compressed"),
+    "text": dict(
+        tensor_shape=(300, 1, 1, 1), fmt="sparse", vocabulary_size=5000, min_sequence_size=20
+    ),
+    "speech": dict(tensor_shape=(16000, 1, 1, 1), fmt="dense", min_sequence_size=4000),
+    "tabular": dict(tensor_shape=(1, 1, 50, 1), fmt="dense"),
+    "sparse": dict(tensor_shape=(1, 1, 5000, 1), fmt="sparse", density=0.01),
+}
+
+
+def _int64_feature(values):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=values))
+
+
+def _float_feature(values):
+    return tf.train.Feature(float_list=tf.train.FloatList(value=values))
+
+
+def _bytes_feature(values):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=values))
+
+
+class JpegEncoder(object):
+    """Encode uint8 arrays of shape [H, W, C] as JPEG with a single TF graph."""
+
+    def __init__(self):
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            self.image = tf.placeholder(tf.uint8, shape=[None, None, None])
+            self.encoded = tf.image.encode_jpeg(self.image)
+        self.session = tf.Session(graph=self.graph)
+
+    def encode(self, image):
+        return self.session.run(self.encoded, feed_dict={self.image: image})
+
+    def close(self):
+        self.session.close()
+
+
+def make_sequence_example(
+    example, label_indices, fmt="dense", jpeg_encoder=None, sparse_kind="tabular"
+):
+    """Build a SequenceExample in the format parsed by `AutoDLDataset`.
+
+  Args:
+    example: array of shape [sequence_size, row_count, col_count, num_channels].
+      For the sparse format, the non-zero entries are stored, either as
+      `(col, value)` pairs (`sparse_kind='tabular'`) or as one channel index per
+      time step (`sparse_kind='text'`, as in AutoNLP datasets).
+    label_indices: list of the indices of the positive labels.
+    fmt: one of `FORMATS`.
+    jpeg_encoder: a `JpegEncoder`, needed for the compressed format.
+  """
+    context = tf.train.Features(
+        feature={
+            "label_index": _int64_feature(label_indices),
+            "label_score": _float_feature([1.0] * len(label_indices)),
+        }
+    )
+    feature_list = {}
+    if fmt == "dense":
+        feature_list["0_dense_input"] = tf.train.FeatureList(
+            feature=[_float_feature(frame.ravel().tolist()) for frame in example]
+        )
+    elif fmt == "compressed":
+        frames = np.clip(example * 255, 0, 255).astype(np.uint8)
+        feature_list["0_compressed"] = tf.train.FeatureList(
+            feature=[_bytes_feature([jpeg_encoder.encode(frame)]) for frame in frames]
+        )
+    elif fmt == "sparse":
+        cols, rows, channels, values = [], [], [], []
+        if sparse_kind == "text":
+            # One token (channel index) per time step
+            for frame in example:
+                channels.append(_int64_feature([int(frame.ravel()[0])]))
+                rows.append(_int64_feature([0]))
+                cols.append(_int64_feature([0]))
+                values.append(_float_feature([1.0]))
+        else:
+            for frame in example:
+                row, col, channel = np.nonzero(frame)
+                rows.append(_int64_feature(row.tolist()))
+                cols.append(_int64_feature(col.tolist()))
+                channels.append(_int64_feature(channel.tolist()))
+                values.append(_float_feature(frame[row, col, channel].tolist()))
+        feature_list["0_sparse_col_index"] = tf.train.FeatureList(feature=cols)
+        feature_list["0_sparse_row_index"] = tf.train.FeatureList(feature=rows)
+        feature_list["0_sparse_channel_index"] = tf.train.FeatureList(feature=channels)
+        feature_list["0_sparse_value"] = tf.train.FeatureList(feature=values)
+    else:
+        raise ValueError("Unknown format {}, expected one of {}".format(fmt, FORMATS))
+    return tf.train.SequenceExample(
+        context=context, feature_lists=tf.train.FeatureLists(feature_list=feature_list)
+    )
+
+
+def random_example(rng, tensor_shape, fmt="dense", density=0.05, vocabulary_size=None):
+    """Draw a random example of shape [sequence_size, row_count, col_count, num_channels].
+
+  For the sparse format, only a fraction `density` of the entries is non-zero,
+  or, if `vocabulary_size` is given, each time step holds a random token index.
+  """
+    if fmt == "sparse" and vocabulary_size is not None:
+        return rng.randint(0, vocabulary_size, size=tensor_shape).astype(np.float32)
+    example = rng.rand(*tensor_shape).astype(np.float32)
+    if fmt == "sparse":
+        example[rng.rand(*tensor_shape) > density] = 0
+    return example
+
+
+def write_metadata(
+    subset_dir,
+    num_examples,
+    tensor_shape,
+    output_dim,
+    fmt="dense",
+    channel_to_index_map=None,
+):
+    """Write `metadata.textproto` for a synthetic subset. A sequence size of -1
+  marks examples of variable sequence size.
+  """
+    sequence_size, row_count, col_count, num_channels = tensor_shape
+    spec = DataSpecification()
+    spec.is_sequence = sequence_size != 1
+    spec.sample_count = num_examples
+    spec.sequence_size = sequence_size
+    spec.output_dim = output_dim
+    matrix_spec = spec.matrix_spec.add()
+    matrix_spec.row_count = row_count
+    matrix_spec.col_count = col_count
+    matrix_spec.num_channels = num_channels
+    matrix_spec.format = {
+        "dense": MatrixSpec.DENSE,
+        "compressed": MatrixSpec.COMPRESSED,
+        "sparse": MatrixSpec.SPARSE,
+    }[fmt]
+    for index in range(output_dim):
+        spec.label_to_index_map["class_{}".format(index)] = index
+    for token, index in (channel_to_index_map or {}).items():
+        spec.channel_to_index_map[token] = index
+    with open(os.path.join(subset_dir, "metadata.textproto"), "w") as f:
+        f.write(text_format.MessageToString(spec))
+
+
+def write_subset(
+    subset_dir,
+    name,
+    subset,
+    num_examples,
+    tensor_shape,
+    output_dim,
+    fmt="dense",
+    density=0.05,
+    vocabulary_size=None,
+    min_sequence_size=None,
+    labels_per_example=1,
+    seed=0,
+):
+    """Write one subset (train or test) of a synthetic AutoDL dataset.
+
+  Each example has `labels_per_example` distinct positive labels. If
+  `min_sequence_size` is given, the sequence size of each example is drawn
+  between it and `tensor_shape[0]`.
+
+  Returns:
+    The labels of the examples, an array of shape [num_examples, output_dim].
+  """
+    os.makedirs(subset_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    channel_to_index_map = None
+    sparse_kind = "tabular"
+    if vocabulary_size is not None:
+        channel_to_index_map = {"token_{}".format(i): i for i in range(vocabulary_size)}
+        sparse_kind = "text"
+    if min_sequence_size is not None:
+        metadata_shape = (-1, ) + tuple(tensor_shape[1:])
+    else:
+        metadata_shape = tensor_shape
+    write_metadata(
+        subset_dir,
+        num_examples,
+        metadata_shape,
+        output_dim,
+        fmt=fmt,
+        channel_to_index_map=channel_to_index_map
+    )
+
+    jpeg_encoder = JpegEncoder() if fmt == "compressed" else None
+    labels = np.zeros((num_examples, output_dim), dtype=np.float32)
+    record_path = os.path.join(subset_dir, "sample-{}-{}.tfrecord".format(name, subset))
+    with tf.python_io.TFRecordWriter(record_path) as writer:
+        for i in range(num_examples):
+            example_shape = tensor_shape
+            if min_sequence_size is not None:
+                sequence_size = rng.randint(min_sequence_size, tensor_shape[0] + 1)
+                example_shape = (sequence_size, ) + tuple(tensor_shape[1:])
+            example = random_example(
+                rng, example_shape, fmt=fmt, density=density, vocabulary_size=vocabulary_size
+            )
+            label_indices = rng.choice(output_dim, size=labels_per_example, replace=False)
+            labels[i, label_indices] = 1
+            sequence_example = make_sequence_example(
+                example, sorted(label_indices.tolist()),
+                fmt=fmt,
+                jpeg_encoder=jpeg_encoder,
+                sparse_kind=sparse_kind
+            )
+            writer.write(sequence_example.SerializeToString())
+    if jpeg_encoder is not None:
+        jpeg_encoder.close()
+    return labels
+
+
+def write_dataset(
+    dataset_dir,
+    name,
+    num_train,
+    num_test,
+    tensor_shape,
+    output_dim,
+    fmt="dense",
+    density=0.05,
+    vocabulary_size=None,
+    min_sequence_size=None,
+    labels_per_example=1,
+    seed=0,
+):
+    """Write the train and test subsets of a synthetic AutoDL dataset.
+
+  Returns:
+    The path to the `<name>.data` directory and the test labels.
+  """
+    data_dir = os.path.join(dataset_dir, name + ".data")
+    kwargs = dict(
+        tensor_shape=tensor_shape,
+        output_dim=output_dim,
+        fmt=fmt,
+        density=density,
+        vocabulary_size=vocabulary_size,
+        min_sequence_size=min_sequence_size,
+        labels_per_example=labels_per_example
+    )
+    write_subset(
+        os.path.join(data_dir, "train"), name, "train", num_train, seed=seed, **kwargs
+    )
+    test_labels = write_subset(
+        os.path.join(data_dir, "test"), name, "test", num_test, seed=seed + 1, **kwargs
+    )
+    return data_dir, test_labels
+
+
+def write_solution(path, labels):
+    """Write the test labels in the format of `<name>.solution` files."""
+    np.savetxt(path, labels, fmt="%d")
+
+
+def write_domain_dataset(
+    dataset_dir,
+    domain,
+    num_train,
+    num_test,
+    output_dim,
+    labels_per_example=1,
+    seed=0,
+    **preset_overrides
+):
+    """Write a synthetic dataset of `domain` and its solution file, such that
+  `dataset_dir` can be used as the dataset_dir of the ingestion and scoring
+  programs.
+
+  Args:
+    domain: one of `DOMAIN_PRESETS`.
+    preset_overrides: keyword arguments of `write_dataset` replacing the ones
+      of the preset, e.g. `tensor_shape` or `min_sequence_size`.
+  Returns:
+    `dataset_dir`.
+  """
+    if domain not in DOMAIN_PRESETS:
+        raise ValueError(
+            "Unknown domain {}, expected one of {}".format(domain, sorted(DOMAIN_PRESETS))
+        )
+    kwargs = dict(DOMAIN_PRESETS[domain])
+    kwargs.update(preset_overrides)
+    name = "synthetic_" + domain
+    _, test_labels = write_dataset(
+        dataset_dir,
+        name,
+        num_train,
+        num_test,
+        output_dim=output_dim,
+        labels_per_example=labels_per_example,
+        seed=seed,
+        **kwargs
+    )
+    write_solution(os.path.join(dataset_dir, name + ".solution"), test_labels)
+    return dataset_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--domain", required=True, choices=sorted(DOMAIN_PRESETS), help=" ")
+    parser.add_argument("--dataset_dir", required=True, help=" ")
+    parser.add_argument("--num_train", type=int, default=1000, help=" ")
+    parser.add_argument("--num_test", type=int, default=200, help=" ")
+    parser.add_argument("--output_dim", type=int, default=10, help="Number of classes")
+    parser.add_argument(
+        "--labels_per_example", type=int, default=1, help="Number of positive labels per example"
+    )
+    parser.add_argument(
+        "--sequence_size", type=int, default=None, help="Overrides the sequence size of the preset"
+    )
+    parser.add_argument(
+        "--min_sequence_size",
+        type=int,
+        default=None,
+        help="Draw the sequence size of each example between this and the sequence size"
+    )
+    parser.add_argument("--seed", type=int, default=0, help=" ")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.sequence_size is not None:
+        tensor_shape = DOMAIN_PRESETS[args.domain]["tensor_shape"]
+        overrides["tensor_shape"] = (args.sequence_size, ) + tuple(tensor_shape[1:])
+    if args.min_sequence_size is not None:
+        overrides["min_sequence_size"] = args.min_sequence_size
+    write_domain_dataset(
+        args.dataset_dir,
+        args.domain,
+        args.num_train,
+        args.num_test,
+        args.output_dim,
+        labels_per_example=args.labels_per_example,
+        seed=args.seed,
+        **overrides
+    )
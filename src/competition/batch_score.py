@@ -0,0 +1,349 @@
+"""Score (again) all the prediction directories of an experiment tree at once.
+
+Prediction directories (those with a 'start.txt' written by ingestion) are
+discovered under the experiment directories, matched to their solution by task
+name, and scored in a pool of processes. The learning curve and ALC of each
+one are written to a single `LearningCurveStore` (see
+scoring_program/learning_curve_store.py), which can then be queried instead of
+the `scores.txt` files.
+
+Each directory is fingerprinted with the hashes of its solution, its
+prediction files, its 'start.txt' and the scoring code. Directories whose
+fingerprint is already in the store are skipped, so that running the command
+again only scores new or changed runs, and everything after a metric change.
+Runs are stored with their experiment directory, the parent of the prediction
+directory, like `run_baseline` does: scoring a run again replaces its former
+scores and keeps its description, e.g. its config.
+
+Memory is bounded by the number of workers: each worker scores one directory
+at a time and reads one prediction at a time. With `--max_scoring_memory_mb`,
+workers only read blocks of the solution and predictions at a time (see
+`autodl_auc_chunked`), for datasets with very many classes.
+
+Usage:
+  python -m src.competition.batch_score --experiments_dirs experiments/my_group \\
+    --dataset_dirs /data/datasets --store experiments/my_group/learning_curves.sqlite
+"""
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import time
+from multiprocessing import Pool
+
+from src.competition.scoring_program import libscores, score
+from src.competition.scoring_program.learning_curve_store import LearningCurveStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(filename)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# Changing the scoring code changes all fingerprints
+SCORING_CODE_FILES = [libscores.__file__, score.__file__]
+
+# Directory of an experiment where ingestion copies its output, see `run_baseline`
+SCORE_DIR_NAME = "score"
+
+# Columns describing a run, kept when it is scored again
+RUN_INFO_KEYS = ["dataset", "config_name", "config", "participant_name", "algorithm_name"]
+
+# Solution of the task last scored by this worker, tasks are scored in order
+_worker_solution = {}
+
+
+def hash_file(path, hasher=None, chunk_size=1 << 20):
+    """Return `hasher` (a new SHA-1 if None) updated with the content of `path`."""
+    hasher = hasher or hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+def hash_files(paths):
+    hasher = hashlib.sha1()
+    for path in paths:
+        hasher.update(os.path.basename(path).encode())
+        hash_file(path, hasher)
+    return hasher.hexdigest()
+
+
+def find_solutions(dataset_dirs):
+    """Return {task name: solution file} of the datasets in `dataset_dirs`, each
+  being a dataset directory or a directory of dataset directories.
+  """
+    solutions = {}
+    for dataset_dir in dataset_dirs:
+        for pattern in ["*.solution", os.path.join("*", "*.solution")]:
+            for path in glob.glob(os.path.join(dataset_dir, pattern)):
+                task_name = os.path.basename(path).split(".")[0]
+                solutions.setdefault(task_name, os.path.abspath(path))
+    return solutions
+
+
+def find_prediction_dirs(experiments_dirs):
+    """Return the directories written by ingestion found under `experiments_dirs`,
+  one per experiment directory. Ingestion copies its output to the score
+  directory, which is only returned when it is the only one of its experiment.
+  """
+    prediction_dirs = {}
+    for experiments_dir in experiments_dirs:
+        for root, dirs, files in os.walk(experiments_dir):
+            dirs.sort()
+            if "start.txt" not in files:
+                continue
+            prediction_dir = os.path.abspath(root)
+            experiment_dir = get_experiment_dir(prediction_dir)
+            former = prediction_dirs.get(experiment_dir)
+            if former is None or os.path.basename(former) == SCORE_DIR_NAME:
+                prediction_dirs[experiment_dir] = prediction_dir
+            elif os.path.basename(prediction_dir) != SCORE_DIR_NAME:
+                logging.warning(
+                    "Several prediction directories in {}, only scoring {}".format(
+                        experiment_dir, former
+                    )
+                )
+    return sorted(prediction_dirs.values())
+
+
+def get_experiment_dir(prediction_dir):
+    """Return the experiment directory of `prediction_dir`, as stored by `run_baseline`."""
+    return os.path.dirname(os.path.abspath(prediction_dir))
+
+
+def get_prediction_files(prediction_dir):
+    """Return the task name and the prediction files of `prediction_dir`, in order."""
+    prediction_files = glob.glob(os.path.join(prediction_dir, "*.predict_*"))
+    if not prediction_files:
+        return None, []
+    task_name = os.path.basename(prediction_files[0]).split(".")[0]
+    prediction_files = [
+        p for p in prediction_files if os.path.basename(p).startswith(task_name + ".")
+    ]
+    return task_name, sorted(prediction_files, key=lambda p: int(p.split("_")[-1]))
+
+
+def score_prediction_dir(job):
+    """Fingerprint a prediction directory and score it unless the fingerprint is
+  already known. Runs in the worker processes.
+
+  Args:
+    job: tuple (prediction_dir, solution_path, solution_hash, code_hash,
+      known_fingerprints, max_scoring_memory)
+  Returns:
+    A dict describing the directory and its learning curve, with key
+      'skipped' True if the fingerprint is known and 'error' set if it failed.
+  """
+    (
+        prediction_dir, solution_path, solution_hash, code_hash, known_fingerprints,
+        max_scoring_memory
+    ) = job
+    task_name, prediction_files = get_prediction_files(prediction_dir)
+    start_filepath = os.path.join(prediction_dir, "start.txt")
+    fingerprint = hash_files(prediction_files + [start_filepath])
+    fingerprint = hashlib.sha1(
+        "{} {} {}".format(solution_hash, code_hash, fingerprint).encode()
+    ).hexdigest()
+    result = {
+        "prediction_dir": prediction_dir,
+        "task_name": task_name,
+        "fingerprint": fingerprint,
+        "skipped": fingerprint in known_fingerprints,
+    }
+    if result["skipped"]:
+        return result
+    try:
+        if _worker_solution.get("path") != solution_path:
+            _worker_solution.clear()
+            if max_scoring_memory is None:
+                _worker_solution["solution"] = libscores.read_array(solution_path)
+            else:
+                _worker_solution["solution"] = libscores.ArrayBlockReader(solution_path)
+            _worker_solution["path"] = solution_path
+        solution = _worker_solution["solution"]
+        is_multiclass_task = score.is_multiclass(solution, max_memory=max_scoring_memory)
+        ingestion_info = score.get_ingestion_info(prediction_dir)
+        start_time, timestamps = score.get_timestamps(prediction_dir)
+        points = []
+        for index, (prediction_file, timestamp) in enumerate(zip(prediction_files, timestamps)):
+            if max_scoring_memory is None:
+                prediction = libscores.read_array(prediction_file)
+                nauc = score.autodl_auc(solution, prediction)
+                accuracy = score.accuracy(solution, prediction) if is_multiclass_task else None
+            else:
+                prediction = libscores.ArrayBlockReader(prediction_file)
+                nauc = score.autodl_auc_chunked(solution, prediction, max_scoring_memory)
+                accuracy = None
+                if is_multiclass_task:
+                    accuracy = score.accuracy_chunked(solution, prediction, max_scoring_memory)
+            points.append((index, timestamp - start_time, nauc, accuracy))
+            del prediction
+        learning_curve = score.LearningCurve(
+            timestamps=[point[1] for point in points],
+            scores=[point[2] for point in points],
+            time_budget=ingestion_info["time_budget"],
+            task_name=task_name,
+        )
+        result.update(
+            time_budget=ingestion_info["time_budget"],
+            points=points,
+            alc=learning_curve.get_alc(),
+            duration=learning_curve.get_time_used(),
+        )
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    return result
+
+
+def batch_score(
+    experiments_dirs,
+    dataset_dirs,
+    store_path,
+    num_workers=None,
+    max_jobs_per_worker=100,
+    force=False,
+    max_scoring_memory=None
+):
+    """Score all prediction directories found under `experiments_dirs` into the
+  store at `store_path` and return the number of directories scored, skipped
+  and failed.
+
+  Args:
+    num_workers: int, number of processes, `os.cpu_count()` if None
+    max_jobs_per_worker: int, workers are replaced after scoring that many
+      directories, releasing their memory
+    force: bool, score all directories even if their fingerprint is known
+    max_scoring_memory: if not None, bytes used by each worker to score blocks of
+      the solution and predictions, the AUC is identical and the accuracy equal up
+      to rounding
+  """
+    solutions = find_solutions(dataset_dirs)
+    solution_hashes = {}
+    code_hash = hash_files(SCORING_CODE_FILES)
+    counts = {"scored": 0, "skipped": 0, "failed": 0}
+
+    with LearningCurveStore(store_path) as store:
+        jobs = []
+        for prediction_dir in find_prediction_dirs(experiments_dirs):
+            task_name, _ = get_prediction_files(prediction_dir)
+            if task_name is None:
+                logging.debug("No predictions in {}, skipping".format(prediction_dir))
+                continue
+            if task_name not in solutions:
+                logging.warning("No solution for {} in {}".format(prediction_dir, dataset_dirs))
+                counts["failed"] += 1
+                continue
+            solution_path = solutions[task_name]
+            if solution_path not in solution_hashes:
+                solution_hashes[solution_path] = hash_file(solution_path).hexdigest()
+            known_fingerprints = set()
+            if not force:
+                known_fingerprints = {
+                    run["fingerprint"]
+                    for run in store.find_runs(experiment_dir=get_experiment_dir(prediction_dir))
+                    if run["fingerprint"] is not None
+                }
+            jobs.append(
+                (
+                    prediction_dir, solution_path, solution_hashes[solution_path], code_hash,
+                    known_fingerprints, max_scoring_memory
+                )
+            )
+        # Consecutive jobs of a worker share the solution
+        jobs.sort(key=lambda job: (job[1], job[0]))
+        logging.info("Found {} prediction directories".format(len(jobs)))
+
+        start = time.time()
+        pool = Pool(num_workers, maxtasksperchild=max_jobs_per_worker)
+        try:
+            for result in pool.imap_unordered(score_prediction_dir, jobs, chunksize=1):
+                if result["skipped"]:
+                    counts["skipped"] += 1
+                    continue
+                if "error" in result:
+                    logging.warning(
+                        "Failed to score {}: {}".format(result["prediction_dir"], result["error"])
+                    )
+                    counts["failed"] += 1
+                    continue
+                # Replace the former scores of the run, keeping its description, e.g. the
+                # config stored by `run_baseline`
+                experiment_dir = get_experiment_dir(result["prediction_dir"])
+                run_info = {"dataset": result["task_name"]}
+                for run in store.find_runs(experiment_dir=experiment_dir):
+                    for key in RUN_INFO_KEYS:
+                        if run[key] is not None:
+                            run_info[key] = run[key]
+                    store.delete_run(run["run_id"])
+                run_id = store.add_run(
+                    task_name=result["task_name"],
+                    experiment_dir=experiment_dir,
+                    time_budget=result["time_budget"],
+                    fingerprint=result["fingerprint"],
+                    **run_info
+                )
+                store.add_points(run_id, result["points"])
+                store.set_final_score(run_id, result["alc"], result["duration"])
+                counts["scored"] += 1
+                logging.info(
+                    "ALC {:.4f} for {} ({} predictions)".format(
+                        result["alc"], result["prediction_dir"], len(result["points"])
+                    )
+                )
+        finally:
+            pool.close()
+            pool.join()
+    logging.info(
+        "Scored {scored}, skipped {skipped} unchanged and failed {failed} "
+        "prediction directories in {seconds:.1f} seconds".format(
+            seconds=time.time() - start, **counts
+        )
+    )
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--experiments_dirs",
+        nargs="+",
+        required=True,
+        help="Directories searched for the prediction directories written by ingestion"
+    )
+    parser.add_argument(
+        "--dataset_dirs",
+        nargs="+",
+        required=True,
+        help="Dataset directories, or directories of them, with the *.solution files"
+    )
+    parser.add_argument("--store", required=True, help="The SQLite learning curve store to write")
+    parser.add_argument("--num_workers", type=int, default=None, help="All CPUs if unset")
+    parser.add_argument(
+        "--max_jobs_per_worker",
+        type=int,
+        default=100,
+        help="Replace workers after that many directories to release memory"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Also score directories which did not change"
+    )
+    parser.add_argument(
+        "--max_scoring_memory_mb",
+        type=int,
+        default=None,
+        help="Score blocks of the solution and predictions using at most about this memory"
+    )
+    args = parser.parse_args()
+
+    batch_score(
+        args.experiments_dirs,
+        args.dataset_dirs,
+        args.store,
+        num_workers=args.num_workers,
+        max_jobs_per_worker=args.max_jobs_per_worker,
+        force=args.force,
+        max_scoring_memory=args.max_scoring_memory_mb and args.max_scoring_memory_mb * 2**20
+    )
@@ -142,16 +142,24 @@ def vprint(mode, t):
 # ================ Output prediction results and prepare code submission =================
 
 
-def write(filename, predictions):
-    """ Write prediction scores in prescribed format"""
+def write(filename, predictions, binary=False):
+    """ Write prediction scores in prescribed format.
+    If binary is True, the scores are saved as a float32 .npy array (with the shape in
+    its header) instead of text. The file name is the same in both formats: readers
+    such as libscores.read_array detect the format from the content of the file."""
     filename_temp = "temp_prediction_file_" + str(np.random.randint(10000))
     filename_temp = os.path.join(os.path.dirname(filename), filename_temp)
-    with open(filename_temp, "w") as output_file:
-        for row in predictions:
-            if type(row) is not np.ndarray and type(row) is not list:
-                row = [row]
-            output_file.write(" ".join(["{0:g}".format(float(val)) for val in row]))
-            output_file.write("\n")
+    if binary:
+        # Use a file object, np.save would otherwise append '.npy' to the name
+        with open(filename_temp, "wb") as output_file:
+            np.save(output_file, np.asarray(predictions, dtype=np.float32))
+    else:
+        with open(filename_temp, "w") as output_file:
+            for row in predictions:
+                if type(row) is not np.ndarray and type(row) is not list:
+                    row = [row]
+                output_file.write(" ".join(["{0:g}".format(float(val)) for val in row]))
+                output_file.write("\n")
     os.rename(filename_temp, filename)
 
 
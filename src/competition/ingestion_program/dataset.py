@@ -24,12 +24,16 @@ from google.protobuf import text_format
 from tensorflow import app, flags, gfile, logging
 
 try:
+    import src.competition.ingestion_program.dataset_cache as dataset_cache
     import src.competition.ingestion_program.dataset_utils as dataset_utils
+    import src.competition.ingestion_program.record_index as record_index
 
     from src.competition.ingestion_program.data_pb2 import DataSpecification
     from src.competition.ingestion_program.data_pb2 import MatrixSpec
 except ImportError:
+    import dataset_cache
     import dataset_utils
+    import record_index
 
     from data_pb2 import DataSpecification
     from data_pb2 import MatrixSpec
@@ -43,6 +47,37 @@ def dataset_file_pattern(dataset_name):
     return os.path.join("", dataset_name, "sample*")
 
 
+def pad_var_len_feature(sparse_tensor, batch_size, default_value=None):
+    """Turn a batch of variable-length features into a padded dense matrix.
+
+  Args:
+    sparse_tensor: a SparseTensor with a leading batch dimension, as returned by
+      `tf.io.parse_sequence_example` for a `tf.VarLenFeature`.
+    batch_size: int64 scalar Tensor.
+    default_value: padding value, None means zero.
+  Returns:
+    A pair `(padded, counts)` such that `padded[i, :counts[i]]` contains the
+      values of the i-th example in row-major order, i.e. what
+      `tf.parse_single_sequence_example` gives as `.values` for this example.
+  """
+    row_ids = sparse_tensor.indices[:, 0]
+    counts = tf.math.unsorted_segment_sum(tf.ones_like(row_ids), row_ids, batch_size)
+    # Position of each value inside its row (indices are sorted in row-major order)
+    starts = tf.cumsum(counts, exclusive=True)
+    positions = tf.range(tf.size(row_ids, out_type=tf.int64), dtype=tf.int64)
+    positions -= tf.gather(starts, row_ids)
+    padded = tf.sparse.to_dense(
+        tf.sparse.SparseTensor(
+            indices=tf.stack([row_ids, positions], axis=1),
+            values=sparse_tensor.values,
+            dense_shape=tf.stack([batch_size, tf.reduce_max(counts)]),
+        ),
+        default_value=default_value,
+        validate_indices=False,
+    )
+    return padded, counts
+
+
 class AutoDLMetadata(object):
     """AutoDL data specification."""
 
@@ -94,6 +129,19 @@ class AutoDLMetadata(object):
         num_channels = self.get_num_channels(bundle_index)
         return (sequence_size, row_count, col_count, num_channels)
 
+    def get_sparse_tensor_shape(self, bundle_index=0):
+        """The dense shape (sequence_size, row_count, col_count, num_channels) of the
+    SparseTensor examples of `AutoDLDataset(keep_sparse=True)`. `num_channels` is
+    at least the size of the vocabulary, the others at least 1. The sequence can
+    be longer, up to the last time step of the example.
+    """
+        row_count, col_count = self.get_matrix_size(bundle_index)
+        num_channels = max(
+            self.get_num_channels(bundle_index), len(self.get_channel_to_index_map())
+        )
+        sequence_size = max(self.get_sequence_size(), 1)
+        return sequence_size, max(row_count, 1), max(col_count, 1), num_channels
+
     def get_sequence_size(self):
         return self.metadata_.sequence_size
 
@@ -120,19 +168,51 @@ class AutoDLDataset(object):
      on the features and labels.
   """
 
-    def __init__(self, dataset_name, num_parallel_readers=3):
+    def __init__(
+        self,
+        dataset_name,
+        num_parallel_readers=3,
+        cache_dir=None,
+        batch_parse_size=None,
+        keep_sparse=False
+    ):
         """Construct an AutoDL Dataset.
 
     Args:
       dataset_name: name of the dataset under the 'dataset_dir' flag.
+      cache_dir: if not None, decoded examples are written once to a
+        memory-mapped cache in this directory (see dataset_cache.py) and read
+        from there afterwards.
+      batch_parse_size: if not None, serialized records are batched by this
+        number and parsed with one vectorised op per batch instead of one op
+        per record. The examples are the same in both modes.
+      keep_sparse: if True, sparse bundles (e.g. text or wide tabular data) are
+        yielded as `tf.SparseTensor` of dense shape
+          [sequence_size, row_count, col_count, num_channels]
+        instead of being converted to dense tensors.
     """
         self.dataset_name_ = dataset_name
         self.num_parallel_readers = num_parallel_readers
         self.metadata_ = AutoDLMetadata(dataset_name)
+        self.keep_sparse_ = keep_sparse
+        self.cache_ = None
+        self.record_index_ = None
+        self.element_parser_ = None
+        if keep_sparse and batch_parse_size is not None:
+            raise ValueError("keep_sparse is only supported with per-record parsing.")
         self._create_dataset()
-        self.dataset_ = self.dataset_.map(
-            self._parse_function, num_parallel_calls=tf.data.experimental.AUTOTUNE
-        )
+        if batch_parse_size is not None:
+            self.dataset_ = self.dataset_.batch(batch_parse_size).map(
+                self._parse_batch_function, num_parallel_calls=tf.data.experimental.AUTOTUNE
+            ).apply(tf.data.experimental.unbatch()).map(
+                self._finalize_function, num_parallel_calls=tf.data.experimental.AUTOTUNE
+            )
+        else:
+            self.dataset_ = self.dataset_.map(
+                self._parse_function, num_parallel_calls=tf.data.experimental.AUTOTUNE
+            )
+        if cache_dir is not None:
+            self._use_cache(cache_dir)
 
     def get_dataset(self):
         """Returns a tf.data.dataset object."""
@@ -145,19 +225,13 @@ class AutoDLDataset(object):
     def _feature_key(self, index, feature_name):
         return str(index) + "_" + feature_name
 
-    def _parse_function(self, sequence_example_proto):
-        """Parse a SequenceExample in the AutoDL/TensorFlow format.
+    def _context_features(self):
+        return {
+            "label_index": tf.VarLenFeature(tf.int64),
+            "label_score": tf.VarLenFeature(tf.float32),
+        }
 
-    Args:
-      sequence_example_proto: a SequenceExample with "x_dense_input" or sparse
-          input representation.
-    Returns:
-      An array of tensors. For first edition of AutoDl challenge, returns a
-          pair `(features, labels)` where `features` is a Tensor of shape
-            [sequence_size, row_count, col_count, num_channels]
-          and `labels` a Tensor of shape
-            [output_dim, ]
-    """
+    def _sequence_features(self):
         sequence_features = {}
         for i in range(self.metadata_.get_bundle_size()):
             if self.metadata_.is_sparse(i):
@@ -178,16 +252,112 @@ class AutoDLDataset(object):
                 sequence_features[self._feature_key(i, "dense_input")] = tf.FixedLenSequenceFeature(
                     self.metadata_.get_tensor_size(i), dtype=tf.float32
                 )
+        return sequence_features
+
+    def _parse_function(self, sequence_example_proto):
+        """Parse a SequenceExample in the AutoDL/TensorFlow format.
+
+    Args:
+      sequence_example_proto: a SequenceExample with "x_dense_input" or sparse
+          input representation.
+    Returns:
+      An array of tensors. For first edition of AutoDl challenge, returns a
+          pair `(features, labels)` where `features` is a Tensor of shape
+            [sequence_size, row_count, col_count, num_channels]
+          and `labels` a Tensor of shape
+            [output_dim, ]
+    """
         # read TFRecord
         contexts, features = tf.parse_single_sequence_example(
             sequence_example_proto,
-            context_features={
-                "label_index": tf.VarLenFeature(tf.int64),
-                "label_score": tf.VarLenFeature(tf.float32),
-            },
-            sequence_features=sequence_features,
+            context_features=self._context_features(),
+            sequence_features=self._sequence_features(),
+        )
+        # Variable-length features (compressed and sparse) are only used through
+        # their values, and their time steps to keep sparse data sparse
+        steps = {
+            key: value.indices[:, 0]
+            for key, value in features.items() if isinstance(value, tf.SparseTensor)
+        }
+        features = {
+            key: value.values if isinstance(value, tf.SparseTensor) else value
+            for key, value in features.items()
+        }
+
+        label_indices = (contexts["label_index"].values, )
+        label_indices = tf.reshape(label_indices, [-1, 1])
+        sparse_tensor = tf.sparse.SparseTensor(
+            indices=label_indices,
+            values=contexts["label_score"].values,
+            dense_shape=(self.metadata_.get_output_size(), ),
+        )
+        labels = tf.sparse.to_dense(sparse_tensor, validate_indices=False)
+        return self._build_sample(features, labels, steps=steps)
+
+    def _parse_batch_function(self, sequence_example_protos):
+        """Parse a batch of SequenceExamples with a single vectorised op.
+
+    Args:
+      sequence_example_protos: a 1-D string Tensor of serialized SequenceExamples.
+    Returns:
+      A triple `(features, lengths, labels)` of batched Tensors. Variable-length
+        features are padded to the longest example of the batch and
+        `lengths[key][i]` is the number of values of example i, such that
+        `_finalize_function` can recover the output of `_parse_function`.
+    """
+        contexts, features, dense_lengths = tf.io.parse_sequence_example(
+            sequence_example_protos,
+            context_features=self._context_features(),
+            sequence_features=self._sequence_features(),
+        )
+        batch_size = tf.shape(sequence_example_protos, out_type=tf.int64)[0]
+
+        padded_features = {}
+        lengths = {}
+        for key, value in features.items():
+            if isinstance(value, tf.SparseTensor):
+                default_value = "" if value.dtype == tf.string else None
+                padded_features[key], lengths[key] = pad_var_len_feature(
+                    value, batch_size, default_value=default_value
+                )
+            else:
+                padded_features[key] = value
+                lengths[key] = dense_lengths[key]
+
+        label_rows = contexts["label_index"].indices[:, 0]
+        sparse_tensor = tf.sparse.SparseTensor(
+            indices=tf.stack([label_rows, contexts["label_index"].values], axis=1),
+            values=contexts["label_score"].values,
+            dense_shape=tf.stack(
+                [batch_size,
+                 tf.constant(self.metadata_.get_output_size(), dtype=tf.int64)]
+            ),
         )
+        labels = tf.sparse.to_dense(sparse_tensor, validate_indices=False)
+        return padded_features, lengths, labels
+
+    def _finalize_function(self, padded_features, lengths, labels):
+        """Turn one unbatched output of `_parse_batch_function` into a sample."""
+        sequence_size = self.metadata_.get_sequence_size()
+        features = {}
+        for key, value in padded_features.items():
+            if key.endswith("dense_input") and sequence_size > 0:
+                # Dense sequences were padded to the longest one of the batch
+                features[key] = dataset_utils.enforce_sequence_size(value, sequence_size)
+            else:
+                features[key] = value[:lengths[key]]
+        return self._build_sample(features, labels)
+
+    def _build_sample(self, features, labels, steps=None):
+        """Build `[features, labels]` from parsed features.
 
+    Args:
+      features: dict mapping feature keys to the dense sequence Tensor for dense
+        data, or to the 1-D Tensor of values for compressed and sparse data.
+      labels: a dense Tensor of shape [output_dim, ].
+      steps: dict mapping the keys of sparse features to the time step of each
+        of their values, only needed when `keep_sparse` is set.
+    """
         sample = []  # will contain [features, labels]
         for i in range(self.metadata_.get_bundle_size()):
             key_dense = self._feature_key(i, "dense_input")
@@ -211,7 +381,7 @@ class AutoDLDataset(object):
             sequence_size = sequence_size if sequence_size > 0 else None
             key_compressed = self._feature_key(i, "compressed")
             if key_compressed in features:
-                compressed_images = features[key_compressed].values
+                compressed_images = features[key_compressed]
                 decompress_image_func = lambda x: dataset_utils.decompress_image(
                     x, num_channels=num_channels
                 )
@@ -225,16 +395,21 @@ class AutoDLDataset(object):
                 key_sparse_col = self._feature_key(i, "sparse_col_index")
                 key_sparse_row = self._feature_key(i, "sparse_row_index")
                 key_sparse_channel = self._feature_key(i, "sparse_channel_index")
-                sparse_col = features[key_sparse_col].values
-                sparse_row = features[key_sparse_row].values
+                sparse_col = features[key_sparse_col]
+                sparse_row = features[key_sparse_row]
                 try:  # For back-compatibility. Before, there was no channel dimension.
-                    sparse_channel = features[key_sparse_channel].values
+                    sparse_channel = features[key_sparse_channel]
                 except:
                     # I think this won't work, Tensor object has no 'len'
                     sparse_channel = [0] * len(sparse_col)
-                sparse_val = features[key_sparse_val].values
+                sparse_val = features[key_sparse_val]
 
-                if col_count > num_channels:
+                if self.keep_sparse_:
+                    tensor = self._sparse_example(
+                        i, steps[key_sparse_val], sparse_row, sparse_col, sparse_channel,
+                        sparse_val
+                    )
+                elif col_count > num_channels:
                     print("Sparse tabular data")
                     # TABULAR: [120, 1]
                     #          [1000, 2]
@@ -258,20 +433,37 @@ class AutoDLDataset(object):
                     tensor = tf.cast(tensor, tf.float32)
 
                 sample.append(tensor)
-                # TODO: see how we can keep sparse tensors instead of
-                # returning dense ones.
 
-        label_indices = (contexts["label_index"].values, )
-        label_indices = tf.reshape(label_indices, [-1, 1])
-        sparse_tensor = tf.sparse.SparseTensor(
-            indices=label_indices,
-            values=contexts["label_score"].values,
-            dense_shape=(self.metadata_.get_output_size(), ),
-        )
-        labels = tf.sparse.to_dense(sparse_tensor, validate_indices=False)
         sample.append(labels)
         return sample
 
+    def _sparse_example(self, bundle_index, steps, rows, cols, channels, values):
+        """Build a SparseTensor of dense shape
+      [sequence_size, row_count, col_count, num_channels]
+    from the entries of a sparse bundle. For text datasets, `num_channels` is
+    the size of the vocabulary and each time step holds one token.
+    """
+        sequence_size, row_count, col_count, num_channels = \
+            self.metadata_.get_sparse_tensor_shape(bundle_index)
+        # The sequence can be longer than `sequence_size` (e.g. for text)
+        num_steps = tf.maximum(
+            tf.reduce_max(tf.concat([steps, tf.zeros([1], dtype=tf.int64)], 0)) + 1, sequence_size
+        )
+        dense_shape = tf.stack(
+            [
+                num_steps,
+                tf.constant(row_count, dtype=tf.int64),
+                tf.constant(col_count, dtype=tf.int64),
+                tf.constant(num_channels, dtype=tf.int64),
+            ]
+        )
+        sparse_tensor = tf.sparse.SparseTensor(
+            indices=tf.stack([steps, rows, cols, channels], axis=1),
+            values=values,
+            dense_shape=dense_shape,
+        )
+        return tf.sparse.reorder(sparse_tensor)
+
     def _create_dataset(self):
         if not hasattr(self, "dataset_"):
             files = gfile.Glob(dataset_file_pattern(self.dataset_name_))
@@ -296,6 +488,28 @@ class AutoDLDataset(object):
                 )
             self.dataset_ = dataset
 
+    def _use_cache(self, cache_dir):
+        """Replace the parsed dataset by one reading the memory-mapped cache."""
+        if self.metadata_.get_bundle_size() != 1:
+            logging.warning("Dataset cache only supports datasets with a single bundle.")
+            return
+        if self.keep_sparse_ and self.metadata_.is_sparse():
+            logging.warning("Dataset cache only supports dense examples, ignoring cache_dir.")
+            return
+        with gfile.GFile(metadata_filename(self.dataset_name_), "r") as f:
+            metadata_text = f.read()
+        files = gfile.Glob(dataset_file_pattern(self.dataset_name_))
+        self.cache_ = dataset_cache.load_or_create_cache(
+            cache_dir, self.dataset_name_, files, metadata_text, self.dataset_
+        )
+        self.dataset_ = self.cache_.to_tf_dataset(
+            self.dataset_.output_types, self.dataset_.output_shapes
+        )
+
+    def get_cache(self):
+        """Returns the DatasetCache object, or None if no cache is used."""
+        return self.cache_
+
     def get_class_labels(self):
         """Get all class labels"""
         # -- IG: inefficient, but... not needed very often
@@ -307,15 +521,44 @@ class AutoDLDataset(object):
             classes_list[index] = label
         return classes_list
 
+    def get_record_index(self):
+        """Returns the RecordIndex of the TFRecord shards, built on first use."""
+        if self.record_index_ is None:
+            files = gfile.Glob(dataset_file_pattern(self.dataset_name_))
+            self.record_index_ = record_index.RecordIndex(
+                files, cycle_length=self.num_parallel_readers
+            )
+        return self.record_index_
+
+    def _get_element_parser(self):
+        """Build (once) a graph parsing a batch of serialized records fed by placeholder."""
+        if self.element_parser_ is None:
+            graph = tf.Graph()
+            with graph.as_default():
+                records = tf.placeholder(tf.string, shape=[None])
+                dataset = tf.data.Dataset.from_tensor_slices(records).map(self._parse_function)
+                iterator = dataset.make_initializable_iterator()
+                next_element = iterator.get_next()
+            session = tf.Session(graph=graph)
+            self.element_parser_ = (session, records, iterator.initializer, next_element)
+        return self.element_parser_
+
+    def get_elements(self, indices):
+        """Get the elements at positions `indices` of `get_dataset()`, without
+    iterating the dataset, using the record offset index (see record_index.py).
+
+    Returns:
+      a list of `(tensor_4d, labels)` pairs, in the order of `indices`.
+    """
+        records = self.get_record_index().read_records(indices)
+        session, records_placeholder, initializer, next_element = self._get_element_parser()
+        session.run(initializer, feed_dict={records_placeholder: records})
+        return [session.run(next_element) for _ in records]
+
     def get_nth_element(self, num):
-        """Get n-th element in `autodl_dataset` using iterator."""
+        """Get n-th element in `autodl_dataset` using the record offset index."""
         # -- IG: replaced previous 3d version
-        dataset = self.get_dataset()
-        iterator = dataset.make_one_shot_iterator()
-        next_element = iterator.get_next()
-        with tf.Session() as sess:
-            for _ in range(num + 1):
-                tensor_4d, labels = sess.run(next_element)
+        tensor_4d, labels = self.get_elements([num])[0]
         return tensor_4d, labels
 
     def show_image(self, num):
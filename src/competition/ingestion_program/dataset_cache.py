@@ -0,0 +1,215 @@
+"""On-disk columnar cache of decoded AutoDL examples.
+
+The first time a dataset is read, every example is decoded once by the usual
+`AutoDLDataset._parse_function` and appended to a flat float32 file. Later
+reads (further train/test cycles, HPO repetitions on the same dataset) simply
+memory-map that file instead of parsing the TFRecords and decompressing
+JPEGs again. A cache directory looks like
+
+  <cache_dir>/<dataset>-<fingerprint>/
+  ├── index.json    # version, number of examples, total number of values
+  ├── values.bin    # all example tensors, flattened and concatenated
+  ├── offsets.npy   # int64 [num_examples + 1], start of example i in values.bin
+  ├── shapes.npy    # int64 [num_examples, 4], shape of example i
+  └── labels.npy    # float32 [num_examples, output_dim], dense labels
+
+Variable-length examples (e.g. video, speech or text sequences) are supported
+through `offsets.npy` and `shapes.npy`. The fingerprint depends on the name,
+size and modification time of the TFRecord files and on the metadata, so a
+modified dataset gets a new cache directory.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+CACHE_VERSION = 1
+
+INDEX_FILENAME = "index.json"
+VALUES_FILENAME = "values.bin"
+OFFSETS_FILENAME = "offsets.npy"
+SHAPES_FILENAME = "shapes.npy"
+LABELS_FILENAME = "labels.npy"
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_fingerprint(files, metadata_text):
+    """Compute a hash identifying the content of a dataset.
+
+  Args:
+    files: list of paths to the TFRecord files of the dataset.
+    metadata_text: str, content of `metadata.textproto`.
+  Returns:
+    A hexadecimal string.
+  """
+    hasher = hashlib.sha1()
+    hasher.update("version:{}\n".format(CACHE_VERSION).encode("utf-8"))
+    for path in sorted(files):
+        stat = os.stat(path)
+        hasher.update(
+            "{}:{}:{}\n".format(os.path.basename(path), stat.st_size,
+                                int(stat.st_mtime)).encode("utf-8")
+        )
+    hasher.update(metadata_text.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def get_cache_path(cache_dir, dataset_name, fingerprint):
+    """Return the directory of the cache of `dataset_name` inside `cache_dir`.
+
+  `dataset_name` is usually of the form `.../adult.data/train` so the last two
+  components are kept to get a readable directory name.
+  """
+    parts = os.path.normpath(os.path.abspath(dataset_name)).split(os.sep)
+    readable_name = "-".join(parts[-2:])
+    return os.path.join(cache_dir, "{}-{}".format(readable_name, fingerprint[:16]))
+
+
+def is_cached(cache_path):
+    """A cache is only valid once its index was written (it is written last)."""
+    return os.path.isfile(os.path.join(cache_path, INDEX_FILENAME))
+
+
+def write_cache(cache_path, dataset):
+    """Decode every example of `dataset` once and store it in `cache_path`.
+
+  The cache is first written to a temporary directory next to `cache_path` and
+  then renamed, so that concurrent writers (e.g. several HPO workers on the
+  same dataset) never see a partially written cache.
+
+  Args:
+    cache_path: str, the final directory of the cache.
+    dataset: a `tf.data.Dataset` yielding `(example, labels)` pairs.
+  """
+    parent_dir = os.path.dirname(cache_path)
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp-")
+    try:
+        offsets = [0]
+        shapes = []
+        labels = []
+        iterator = dataset.make_one_shot_iterator()
+        next_element = iterator.get_next()
+        with open(os.path.join(tmp_path, VALUES_FILENAME), "wb") as values_file:
+            with tf.Session(config=tf.ConfigProto(log_device_placement=False)) as sess:
+                while True:
+                    try:
+                        example, label = sess.run(next_element)
+                    except tf.errors.OutOfRangeError:
+                        break
+                    example = np.ascontiguousarray(example, dtype=np.float32)
+                    values_file.write(example.tobytes())
+                    offsets.append(offsets[-1] + example.size)
+                    shapes.append(example.shape)
+                    labels.append(label)
+        np.save(os.path.join(tmp_path, OFFSETS_FILENAME), np.array(offsets, dtype=np.int64))
+        np.save(
+            os.path.join(tmp_path, SHAPES_FILENAME),
+            np.array(shapes, dtype=np.int64).reshape(-1, 4)
+        )
+        np.save(os.path.join(tmp_path, LABELS_FILENAME), np.array(labels, dtype=np.float32))
+        index = {
+            "version": CACHE_VERSION,
+            "num_examples": len(shapes),
+            "num_values": offsets[-1],
+        }
+        with open(os.path.join(tmp_path, INDEX_FILENAME), "w") as f:
+            json.dump(index, f)
+        try:
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            # Another process finished writing the same cache first
+            if not is_cached(cache_path):
+                raise
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    logger.info("Wrote dataset cache with {} examples to {}".format(len(shapes), cache_path))
+
+
+class DatasetCache(object):
+    """Read access to a cache written by `write_cache`.
+
+  All arrays are memory-mapped in copy-on-write mode: nothing is loaded in
+  memory before it is accessed, and in-place modifications by a model never
+  reach the file on disk.
+  """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        with open(os.path.join(cache_path, INDEX_FILENAME), "r") as f:
+            self.index = json.load(f)
+        if self.index["version"] != CACHE_VERSION:
+            raise ValueError(
+                "Dataset cache {} has version {} but version {} is expected.".format(
+                    cache_path, self.index["version"], CACHE_VERSION
+                )
+            )
+        if self.index["num_values"] > 0:
+            self.values = np.memmap(
+                os.path.join(cache_path, VALUES_FILENAME), dtype=np.float32, mode="c"
+            )
+        else:  # np.memmap refuses empty files
+            self.values = np.zeros(0, dtype=np.float32)
+        self.offsets = np.load(os.path.join(cache_path, OFFSETS_FILENAME), mmap_mode="c")
+        self.shapes = np.load(os.path.join(cache_path, SHAPES_FILENAME), mmap_mode="c")
+        self.labels = np.load(os.path.join(cache_path, LABELS_FILENAME), mmap_mode="c")
+
+    def __len__(self):
+        return self.index["num_examples"]
+
+    def get_example(self, i):
+        """Return the i-th `(example, labels)` pair as views on the cache."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        example = self.values[start:end].reshape(tuple(self.shapes[i]))
+        return example, self.labels[i]
+
+    def to_numpy(self):
+        """Return all examples and labels in the format of `Model.to_numpy`, i.e. two
+    lists of NumPy arrays, without copying the data.
+    """
+        X = [self.get_example(i)[0] for i in range(len(self))]
+        Y = list(self.labels)
+        return X, Y
+
+    def _generator(self):
+        for i in range(len(self)):
+            yield self.get_example(i)
+
+    def to_tf_dataset(self, output_types, output_shapes):
+        """Build a `tf.data.Dataset` reading the cache, with the same types and
+    shapes as the dataset it was written from.
+    """
+        dataset = tf.data.Dataset.from_generator(
+            self._generator, output_types=tuple(output_types), output_shapes=tuple(output_shapes)
+        )
+        # Consumers aware of the cache (e.g. `Model.to_numpy`) can bypass TensorFlow
+        dataset.autodl_cache = self
+        return dataset
+
+
+def load_or_create_cache(cache_dir, dataset_name, files, metadata_text, dataset):
+    """Return a `DatasetCache` for `dataset_name`, writing it first if needed.
+
+  Args:
+    cache_dir: str, directory containing the caches of all datasets.
+    dataset_name: str, directory of the dataset (e.g. `.../adult.data/train`).
+    files: list of paths to the TFRecord files of the dataset.
+    metadata_text: str, content of `metadata.textproto`.
+    dataset: the parsed `tf.data.Dataset`, only iterated if there is no cache.
+  """
+    fingerprint = dataset_fingerprint(files, metadata_text)
+    cache_path = get_cache_path(cache_dir, dataset_name, fingerprint)
+    if is_cached(cache_path):
+        logger.info("Using dataset cache {}".format(cache_path))
+    else:
+        logger.info("No dataset cache found, decoding {} once...".format(dataset_name))
+        write_cache(cache_path, dataset)
+    return DatasetCache(cache_path)
@@ -137,6 +137,11 @@ def get_logger(verbosity_level, use_error_log=False):
 
 logger = get_logger(verbosity_level)
 
+# Phases whose total duration is written to end.txt
+INGESTION_PHASES = ["read_datasets", "create_model", "train", "test", "write_predictions"]
+# Chrome trace of the ingestion phases, written to output_dir with trace_ingestion
+TRACE_FILENAME = "ingestion_trace.json"
+
 
 def _HERE(*args):
     """Helper function for getting the current directory of this script."""
@@ -236,7 +241,11 @@ def ingestion_fn(
     output_dir,
     score_dir,
     model_config_name=None,
-    model_config=None
+    model_config=None,
+    dataset_cache_dir=None,
+    keep_sparse=False,
+    binary_predictions=False,
+    trace_ingestion=False
 ):
     #### Check whether everything went well
     ingestion_success = True
@@ -270,6 +279,7 @@ def ingestion_fn(
     # IG: to allow submitting the starting kit as sample submission
     path.append(code_dir + "/sample_code_submission")
     import data_io
+    import tracing
     from dataset import AutoDLDataset  # THE class of AutoDL datasets
 
     data_io.mkdir(output_dir)
@@ -292,10 +302,26 @@ def ingestion_fn(
     logger.info("************************************************")
     logger.debug("Version: {}. Description: {}".format(VERSION, DESCRIPTION))
 
+    # Timeline of the ingestion phases. The total duration of each phase is
+    # written to end.txt, the whole timeline only with trace_ingestion.
+    tracer = tracing.Tracer()
+    tracing.activate(tracer)
+
     ##### Begin creating training set and test set #####
     logger.info("Reading training set and test set...")
-    D_train = AutoDLDataset(os.path.join(dataset_dir, basename, "train"))
-    D_test = AutoDLDataset(os.path.join(dataset_dir, basename, "test"))
+    # With a dataset_cache_dir, examples are decoded once and memory-mapped afterwards.
+    # With keep_sparse, sparse datasets (text, tabular) are given as tf.SparseTensor.
+    with tracer.span("read_datasets"):
+        D_train = AutoDLDataset(
+            os.path.join(dataset_dir, basename, "train"),
+            cache_dir=dataset_cache_dir,
+            keep_sparse=keep_sparse
+        )
+        D_test = AutoDLDataset(
+            os.path.join(dataset_dir, basename, "test"),
+            cache_dir=dataset_cache_dir,
+            keep_sparse=keep_sparse
+        )
     ##### End creating training set and test set #####
 
     ## Get correct prediction shape
@@ -312,12 +338,15 @@ def ingestion_fn(
 
     ##### Begin creating model #####
     logger.info("Creating model...this process should not exceed 20min.")
-    from model import Model  # in participants' model.py
-
-    # The metadata of D_train and D_test only differ in sample_count
-    M = Model(
-        D_train.get_metadata(), model_config_name=model_config_name, model_config=model_config
-    )
+    with tracer.span("create_model"):
+        from model import Model  # in participants' model.py
+
+        # The metadata of D_train and D_test only differ in sample_count
+        M = Model(
+            D_train.get_metadata(),
+            model_config_name=model_config_name,
+            model_config=model_config
+        )
     ###### End creating model ######
 
     # except TimeoutException as e:
@@ -365,14 +394,17 @@ def ingestion_fn(
         # Start the CORE PART: train/predict process
         while not (use_done_training_api and M.done_training):
             remaining_time_budget = start + time_budget - time.time()
+            tracer.counter("remaining_time_budget", seconds=remaining_time_budget)
             # Train the model
             logger.info("Begin training the model...")
-            M.train(D_train.get_dataset(), remaining_time_budget=remaining_time_budget)
+            with tracer.span("train", cycle=prediction_order_number):
+                M.train(D_train.get_dataset(), remaining_time_budget=remaining_time_budget)
             logger.info("Finished training the model.")
             # Make predictions using the trained model
             logger.info("Begin testing the model by making predictions " + "on test set...")
             remaining_time_budget = start + time_budget - time.time()
-            Y_pred = M.test(D_test.get_dataset(), remaining_time_budget=remaining_time_budget)
+            with tracer.span("test", cycle=prediction_order_number):
+                Y_pred = M.test(D_test.get_dataset(), remaining_time_budget=remaining_time_budget)
             logger.info("Finished making predictions.")
             if Y_pred is None:  # Stop train/predict process if Y_pred is None
                 logger.info(
@@ -394,8 +426,11 @@ def ingestion_fn(
             write_timestamp(output_dir, predict_idx=prediction_order_number, timestamp=time.time())
             # Prediction files: adult.predict_0, adult.predict_1, ...
             filename_test = basename[:-5] + ".predict_" + str(prediction_order_number)
-            # Write predictions to output_dir
-            data_io.write(os.path.join(output_dir, filename_test), Y_pred)
+            # Write predictions to output_dir, as text or as a binary .npy array
+            with tracer.span("write_predictions", cycle=prediction_order_number):
+                data_io.write(
+                    os.path.join(output_dir, filename_test), Y_pred, binary=binary_predictions
+                )
             prediction_order_number += 1
             logger.info(
                 "[+] {0:d} predictions made, time spent so far {1:.2f} sec".format(
@@ -404,6 +439,7 @@ def ingestion_fn(
                 )
             )
             remaining_time_budget = start + time_budget_approx - time.time()
+            tracer.counter("remaining_time_budget", seconds=remaining_time_budget)
             logger.info("[+] Time left {0:.2f} sec".format(remaining_time_budget))
 
     except Exception as e:
@@ -421,6 +457,8 @@ def ingestion_fn(
         f.write("ingestion_duration: " + str(overall_time_spent) + "\n")
         f.write("ingestion_success: " + str(int(ingestion_success)) + "\n")
         f.write("end_time: " + str(end_time) + "\n")
+        for phase in INGESTION_PHASES:
+            f.write("{}_duration: {}\n".format(phase, tracer.durations.get(phase, 0.0)))
         logger.info("Wrote the file {} marking the end of ingestion.".format(end_filename))
         if ingestion_success:
             logger.info("[+] Done. Ingestion program successfully terminated.")
@@ -429,6 +467,12 @@ def ingestion_fn(
             logger.info("[-] Done, but encountered some errors during ingestion.")
             logger.info("[-] Overall time spent %5.2f sec " % overall_time_spent)
 
+    tracing.activate(None)
+    if trace_ingestion:
+        trace_path = os.path.join(output_dir, TRACE_FILENAME)
+        tracer.write(trace_path)
+        logger.info("Wrote the ingestion timeline to {}.".format(trace_path))
+
     # Copy all files in output_dir to score_dir
     os.system("cp -R {} {}".format(os.path.join(output_dir, "*"), score_dir))
     logger.debug("Copied all ingestion output to scoring output directory.")
@@ -0,0 +1,185 @@
+"""Record offset index over the TFRecord shards of an AutoDL dataset.
+
+A TFRecord file is a sequence of records, each stored as
+  uint64 length | uint32 masked crc32 of length | data | uint32 masked crc32 of data
+so the position of every record can be found by reading only the 12-byte
+headers. The index maps the n-th example of `AutoDLDataset.get_dataset()` to
+the shard, offset and length of its serialized SequenceExample, such that any
+example can be read in O(1) instead of iterating the dataset from the start.
+
+The index is persisted as `record_index.npz` next to the shards (or only kept
+in memory if the dataset directory is read-only) and rebuilt whenever a shard
+changes.
+"""
+import logging
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+INDEX_FILENAME = "record_index.npz"
+HEADER_SIZE = 12  # uint64 length + uint32 crc
+FOOTER_SIZE = 4  # uint32 crc
+
+logger = logging.getLogger(__name__)
+
+
+def scan_record_offsets(path):
+    """Return the offsets and lengths of the data of all records in a TFRecord file."""
+    offsets = []
+    lengths = []
+    position = 0
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                break
+            length = struct.unpack("<Q", header[:8])[0]
+            offsets.append(position + HEADER_SIZE)
+            lengths.append(length)
+            position += HEADER_SIZE + length + FOOTER_SIZE
+            f.seek(position)
+    return np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def interleave_order(counts, cycle_length):
+    """Order in which `tf.data.Dataset.interleave` (with `block_length=1`) yields
+  the records of shards having `counts` records each.
+
+  Returns:
+    A list of `(shard, record)` pairs.
+  """
+    order = []
+    slots = [None] * cycle_length  # [shard, next record] of each open shard
+    next_shard = 0
+    num_open = 0
+    cycle_index = 0
+    while next_shard < len(counts) or num_open > 0:
+        slot = slots[cycle_index]
+        if slot is not None:
+            if slot[1] < counts[slot[0]]:
+                order.append((slot[0], slot[1]))
+                slot[1] += 1
+            else:  # This shard is exhausted, the slot is refilled on next visit
+                slots[cycle_index] = None
+                num_open -= 1
+            cycle_index = (cycle_index + 1) % cycle_length
+        elif next_shard < len(counts):
+            slots[cycle_index] = [next_shard, 0]
+            next_shard += 1
+            num_open += 1
+        else:
+            cycle_index = (cycle_index + 1) % cycle_length
+    return order
+
+
+class RecordIndex(object):
+    """Random access to the serialized records of a dataset, in dataset order.
+
+  Args:
+    files: list of the TFRecord shards, in the order given to the dataset.
+    cycle_length: the `cycle_length` of the interleave over the shards, only
+      used if there are several shards.
+  """
+
+    def __init__(self, files, cycle_length=1):
+        self.files = list(files)
+        self.cycle_length = cycle_length
+        self.index_path = os.path.join(os.path.dirname(self.files[0]), INDEX_FILENAME)
+        self._file_handles = {}
+        if not self._load():
+            self._build()
+            self._save()
+
+    def __len__(self):
+        return len(self.shards)
+
+    def _file_signature(self):
+        basenames = [os.path.basename(path) for path in self.files]
+        stats = [os.stat(path) for path in self.files]
+        sizes = [stat.st_size for stat in stats]
+        mtimes = [stat.st_mtime for stat in stats]
+        return basenames, sizes, mtimes
+
+    def _load(self):
+        """Load a persisted index, unless it is missing or outdated."""
+        if not os.path.isfile(self.index_path):
+            return False
+        basenames, sizes, mtimes = self._file_signature()
+        with np.load(self.index_path) as index:
+            if (
+                list(index["files"]) != basenames or list(index["sizes"]) != sizes
+                or not np.allclose(index["mtimes"], mtimes)
+                or int(index["cycle_length"]) != self.cycle_length
+            ):
+                logger.info("Record index {} is outdated.".format(self.index_path))
+                return False
+            self.shards = index["shards"]
+            self.offsets = index["offsets"]
+            self.lengths = index["lengths"]
+        return True
+
+    def _build(self):
+        logger.info("Building record index of {} shard(s)...".format(len(self.files)))
+        shard_offsets = []
+        shard_lengths = []
+        for path in self.files:
+            offsets, lengths = scan_record_offsets(path)
+            shard_offsets.append(offsets)
+            shard_lengths.append(lengths)
+        if len(self.files) == 1:
+            order = [(0, record) for record in range(len(shard_offsets[0]))]
+        else:
+            counts = [len(offsets) for offsets in shard_offsets]
+            order = interleave_order(counts, self.cycle_length)
+        self.shards = np.array([shard for shard, _ in order], dtype=np.int32)
+        self.offsets = np.array(
+            [shard_offsets[shard][record] for shard, record in order], dtype=np.int64
+        )
+        self.lengths = np.array(
+            [shard_lengths[shard][record] for shard, record in order], dtype=np.int64
+        )
+
+    def _save(self):
+        """Persist the index next to the shards, if the directory is writable."""
+        basenames, sizes, mtimes = self._file_signature()
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.index_path), prefix=".tmp-", suffix=".npz"
+            )
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    files=np.array(basenames),
+                    sizes=np.array(sizes, dtype=np.int64),
+                    mtimes=np.array(mtimes, dtype=np.float64),
+                    cycle_length=np.array(self.cycle_length),
+                    shards=self.shards,
+                    offsets=self.offsets,
+                    lengths=self.lengths,
+                )
+            os.rename(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning("Could not persist record index, keeping it in memory: {}".format(e))
+
+    def read_records(self, indices):
+        """Return the serialized records at positions `indices`."""
+        records = []
+        for i in indices:
+            if not -len(self) <= i < len(self):
+                raise IndexError(
+                    "Index {} out of range for a dataset of {} examples.".format(i, len(self))
+                )
+            shard = self.shards[i]
+            if shard not in self._file_handles:
+                self._file_handles[shard] = open(self.files[shard], "rb")
+            f = self._file_handles[shard]
+            f.seek(self.offsets[i])
+            records.append(f.read(self.lengths[i]))
+        return records
+
+    def close(self):
+        for f in self._file_handles.values():
+            f.close()
+        self._file_handles = {}
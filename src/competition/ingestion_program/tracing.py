@@ -0,0 +1,84 @@
+"""Timeline of the ingestion phases, in the Chrome trace event format.
+
+A trace written by `Tracer.write` can be opened in chrome://tracing or
+https://ui.perfetto.dev to see where the time budget goes across the
+train/test cycles of ingestion.
+
+Code running during ingestion (e.g. the participant's model) can add spans to
+the trace of the current run with the module level `span`, which does nothing
+when no tracer is active.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+_active_tracer = None
+
+
+class Tracer(object):
+    """Record complete events ("X") and counters ("C") of one ingestion run."""
+
+    def __init__(self):
+        self.events = []
+        self.durations = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _timestamp(self, seconds):
+        return int(seconds * 1e6)  # Trace timestamps are in microseconds
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """Record the duration of the enclosed block as an event `name`. The total
+    duration of the events of each name is kept in `self.durations`.
+    """
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0.0) + end - start
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": self._timestamp(start),
+                        "dur": self._timestamp(end - start),
+                        "pid": self._pid,
+                        "tid": threading.current_thread().ident,
+                        "args": args,
+                    }
+                )
+
+    def counter(self, name, **values):
+        """Record the current `values` of the counter `name`, e.g. the remaining budget."""
+        with self._lock:
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "C",
+                    "ts": self._timestamp(time.time()),
+                    "pid": self._pid,
+                    "args": values,
+                }
+            )
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def activate(tracer):
+    """Make `tracer` the one used by the module level `span`, None to disable."""
+    global _active_tracer
+    _active_tracer = tracer
+
+
+def span(name, **args):
+    """Span of the active tracer, or a no-op context if there is none."""
+    if _active_tracer is None:
+        return contextlib.suppress()  # Empty context manager
+    return _active_tracer.span(name, **args)
@@ -43,12 +43,13 @@ import os
 import shutil  # for deleting a whole directory
 import time
 import webbrowser
-from multiprocessing import Process
+from multiprocessing import Process, Queue
 from pathlib import Path
+from queue import Empty
 
 import tensorflow as tf
 from src.competition.ingestion_program.ingestion import ingestion_fn
-from src.competition.scoring_program.score import score_fn
+from src.competition.scoring_program.score import ScoringError, score_fn
 
 logging.basicConfig(
     level=getattr(logging, verbosity_level),
@@ -88,6 +89,42 @@ def get_basename(path):
     return path.split(os.sep)[-1]
 
 
+def _score_in_process(result_queue, solution_dir, prediction_dir, score_dir, **score_kwargs):
+    """Run `score_fn` concurrently with ingestion and send the ALC (or the
+  exception raised) through `result_queue`.
+  """
+    try:
+        result_queue.put(
+            score_fn(
+                solution_dir, prediction_dir, score_dir, wait_for_ingestion=True, **score_kwargs
+            )
+        )
+    except Exception as e:
+        result_queue.put(e)
+        raise
+
+
+def _get_process_score(result_queue, scoring_process, poll_interval=1):
+    """Wait for the ALC sent by `_score_in_process`. Raise a `ScoringError` if the
+  scoring process exits without sending it, e.g. when it is killed.
+  """
+    while True:
+        try:
+            return result_queue.get(timeout=poll_interval)
+        except Empty:
+            if scoring_process.is_alive():
+                continue
+        # The process may have put its result just before exiting
+        try:
+            return result_queue.get(timeout=poll_interval)
+        except Empty:
+            raise ScoringError(
+                "[-] The scoring process exited with code {} without a score.".format(
+                    scoring_process.exitcode
+                )
+            )
+
+
 def run_baseline(
     dataset_dir,
     code_dir,
@@ -96,7 +133,15 @@ def run_baseline(
     time_budget_approx,
     overwrite,
     model_config_name=None,
-    model_config=None
+    model_config=None,
+    dataset_cache_dir=None,
+    keep_sparse=False,
+    binary_predictions=False,
+    concurrent_scoring=False,
+    trace_ingestion=False,
+    learning_curve_store=None,
+    run_info=None,
+    max_scoring_memory=None
 ):
     logging.info("#" * 50)
     logging.info("Begin running local test using")
@@ -116,17 +161,59 @@ def run_baseline(
     remove_dir(ingestion_output_dir)
     #remove_dir(score_dir)
 
-    ingestion_fn(
-        dataset_dir,
-        code_dir,
-        time_budget,
-        time_budget_approx,
-        ingestion_output_dir,
-        score_dir,
-        model_config_name=model_config_name,
-        model_config=model_config
-    )
-    return score_fn(dataset_dir, ingestion_output_dir, score_dir)
+    # Describes the run in the learning curve store, if any
+    store_run_info = {
+        "dataset": get_basename(dataset_dir),
+        "config_name": model_config_name,
+        "config": model_config,
+        "experiment_dir": os.path.abspath(experiment_dir),
+    }
+    store_run_info.update(run_info or {})
+    score_kwargs = {
+        "learning_curve_store": learning_curve_store,
+        "run_info": store_run_info,
+        "max_scoring_memory": max_scoring_memory,
+    }
+
+    if concurrent_scoring:
+        # Score each prediction as soon as ingestion writes it, in a separate process
+        # tailing the output directory, instead of scoring everything at the end
+        result_queue = Queue()
+        scoring_process = Process(
+            target=_score_in_process,
+            args=(result_queue, dataset_dir, ingestion_output_dir, score_dir),
+            kwargs=score_kwargs
+        )
+        scoring_process.start()
+
+    try:
+        ingestion_fn(
+            dataset_dir,
+            code_dir,
+            time_budget,
+            time_budget_approx,
+            ingestion_output_dir,
+            score_dir,
+            model_config_name=model_config_name,
+            model_config=model_config,
+            dataset_cache_dir=dataset_cache_dir,
+            keep_sparse=keep_sparse,
+            binary_predictions=binary_predictions,
+            trace_ingestion=trace_ingestion
+        )
+    except BaseException:
+        if concurrent_scoring:
+            scoring_process.terminate()
+        raise
+
+    if not concurrent_scoring:
+        return score_fn(dataset_dir, ingestion_output_dir, score_dir, **score_kwargs)
+
+    score = _get_process_score(result_queue, scoring_process)
+    scoring_process.join()
+    if isinstance(score, Exception):
+        raise score
+    return score
 
 
 if __name__ == "__main__":
@@ -145,6 +232,42 @@ if __name__ == "__main__":
     parser.add_argument("--time_budget", type=int, default=1200, help=" ")
     parser.add_argument("--time_budget_approx", type=int, default=1200, help=" ")
     parser.add_argument("--overwrite", action="store_true", help="Do not delete submission dir")
+    parser.add_argument(
+        "--dataset_cache_dir",
+        default=None,
+        help="Directory for memory-mapped caches of decoded datasets, reused across runs"
+    )
+    parser.add_argument(
+        "--keep_sparse",
+        action="store_true",
+        help="Give sparse datasets (text, tabular) to the model as tf.SparseTensor"
+    )
+    parser.add_argument(
+        "--binary_predictions",
+        action="store_true",
+        help="Write predictions as binary .npy arrays instead of text"
+    )
+    parser.add_argument(
+        "--concurrent_scoring",
+        action="store_true",
+        help="Score each prediction in a separate process as soon as it is written"
+    )
+    parser.add_argument(
+        "--trace_ingestion",
+        action="store_true",
+        help="Write a Chrome trace of the ingestion phases to the predictions directory"
+    )
+    parser.add_argument(
+        "--learning_curve_store",
+        default=None,
+        help="SQLite file to also store the learning curve in, shared across runs"
+    )
+    parser.add_argument(
+        "--max_scoring_memory_mb",
+        type=int,
+        default=None,
+        help="Score blocks of the solution and predictions using at most about this memory"
+    )
 
     args = parser.parse_args()
 
@@ -157,6 +280,18 @@ if __name__ == "__main__":
     experiment_dir = str(Path("experiments", args.experiment_group, args.experiment_name))
 
     run_baseline(
-        dataset_dir, code_dir, experiment_dir, time_budget, time_budget_approx, overwrite,
-        model_config_name
+        dataset_dir,
+        code_dir,
+        experiment_dir,
+        time_budget,
+        time_budget_approx,
+        overwrite,
+        model_config_name,
+        dataset_cache_dir=args.dataset_cache_dir,
+        keep_sparse=args.keep_sparse,
+        binary_predictions=args.binary_predictions,
+        concurrent_scoring=args.concurrent_scoring,
+        trace_ingestion=args.trace_ingestion,
+        learning_curve_store=args.learning_curve_store,
+        max_scoring_memory=args.max_scoring_memory_mb and args.max_scoring_memory_mb * 2**20
     )
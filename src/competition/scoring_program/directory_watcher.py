@@ -0,0 +1,153 @@
+"""Watch the prediction directory for files written by ingestion.
+
+A watcher has a method `wait(timeout)` blocking until files of the directory
+are written (or the timeout expires) and returning their names, and a method
+`close()`. Two implementations are provided:
+  - `InotifyWatcher`, notified by the Linux kernel (inotify, through ctypes) as
+    soon as a file is closed after writing or moved into the directory;
+  - `PollingWatcher`, a portable fallback comparing the modification times
+    and sizes of the files every `poll_interval` seconds.
+`get_watcher` returns the first one available. Any object with the same two
+methods can be given to the `Evaluator` instead.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+# Flags of <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class PollingWatcher(object):
+    """Detect written files by comparing directory listings every `poll_interval` seconds."""
+
+    def __init__(self, directory, poll_interval=1.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._state = self._scan()
+
+    def _scan(self):
+        state = {}
+        if not os.path.isdir(self.directory):
+            return state
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:  # Removed since listed, e.g. a temporary file
+                continue
+            state[entry.name] = (stat.st_mtime, stat.st_size)
+        return state
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            state = self._scan()
+            changed = [name for name in state if self._state.get(name) != state[name]]
+            self._state = state
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return []
+            remaining = self.poll_interval
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.time())
+            time.sleep(max(remaining, 0))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Get notified by the Linux kernel of the files written to the directory.
+
+  Raises:
+    OSError if inotify is not available.
+  """
+
+    def __init__(self, directory, poll_interval=1.0):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watching = False
+        try:
+            self._add_watch()
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self):
+        """Watch the directory if it exists, return the names of the files it already has."""
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOENT:  # Not created by ingestion yet
+                return []
+            raise OSError(error, "inotify_add_watch failed for {}".format(self.directory))
+        self._watching = True
+        # Files written before the watch was added are not notified
+        return os.listdir(self.directory)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._watching:
+            existing = self._add_watch()
+            if self._watching:
+                if existing:
+                    return existing
+                break
+            if deadline is not None and time.time() >= deadline:
+                return []
+            remaining = self.poll_interval
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.time())
+            time.sleep(max(remaining, 0))
+        remaining = None if deadline is None else max(deadline - time.time(), 0)
+        readable, _, _ = select.select([self._fd], [], [], remaining)
+        if not readable:
+            return []
+        return self._read_events()
+
+    def _read_events(self):
+        names = []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def get_watcher(directory, poll_interval=1.0):
+    """Return an `InotifyWatcher` if inotify is available, else a `PollingWatcher`."""
+    try:
+        return InotifyWatcher(directory, poll_interval=poll_interval)
+    except (OSError, AttributeError):  # AttributeError: libc without inotify functions
+        return PollingWatcher(directory, poll_interval=poll_interval)
@@ -0,0 +1,220 @@
+"""SQLite store of the learning curves written by the scoring program.
+
+Each scored run is a row of `runs` (task, dataset, configuration, time budget,
+ALC) and each of its predictions a row of `points` (timestamp relative to the
+start of ingestion, NAUC and, for multiclass tasks, accuracy). The scorer
+writes to the store as it scores (see `Evaluator`), so that learning curves of
+many runs can be queried without parsing the `scores.txt` of every experiment:
+
+  store = LearningCurveStore("experiments/my_group/learning_curves.sqlite")
+  for run in store.find_runs(dataset="Chucky"):
+    print(run["config_name"], run["alc"])
+  mean_curve = store.get_mean_learning_curve(dataset="Chucky", config_name="default")
+
+A store is a single file which can be shared by the runs of an experiment
+group, it should be on a local file system (SQLite locking is unreliable on
+network file systems).
+"""
+import json
+import sqlite3
+import time
+
+# Columns of `runs` which can be used to select runs in the queries
+RUN_FILTERS = [
+    "task_name", "dataset", "config_name", "experiment_dir", "participant_name", "algorithm_name",
+    "fingerprint"
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  run_id INTEGER PRIMARY KEY,
+  created REAL NOT NULL,
+  task_name TEXT,
+  dataset TEXT,
+  config_name TEXT,
+  config TEXT,
+  experiment_dir TEXT,
+  participant_name TEXT,
+  algorithm_name TEXT,
+  time_budget REAL,
+  alc REAL,
+  duration REAL,
+  fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS points (
+  run_id INTEGER NOT NULL REFERENCES runs(run_id),
+  prediction_index INTEGER NOT NULL,
+  timestamp REAL NOT NULL,
+  nauc REAL,
+  accuracy REAL,
+  PRIMARY KEY (run_id, prediction_index)
+);
+CREATE INDEX IF NOT EXISTS runs_by_dataset ON runs (dataset, config_name);
+CREATE INDEX IF NOT EXISTS runs_by_task ON runs (task_name);
+CREATE INDEX IF NOT EXISTS runs_by_experiment_dir ON runs (experiment_dir);
+"""
+
+
+def _learning_curve_class():
+    # score.py imports this module, import it lazily
+    try:
+        from src.competition.scoring_program.score import LearningCurve
+    except ImportError:
+        from score import LearningCurve
+    return LearningCurve
+
+
+class LearningCurveStore(object):
+    """Learning curves of scored runs, stored in the SQLite database at `path`."""
+
+    def __init__(self, path, timeout=60.0):
+        """
+    Args:
+      path: string, the database file, created if it does not exist
+      timeout: float, seconds to wait for a concurrent writer to commit
+    """
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Writing (by the scoring program)
+
+    def add_run(
+        self,
+        task_name=None,
+        dataset=None,
+        config_name=None,
+        config=None,
+        experiment_dir=None,
+        participant_name=None,
+        algorithm_name=None,
+        time_budget=None,
+        fingerprint=None,
+    ):
+        """Register a new run and return its `run_id`.
+
+    Args:
+      config: dict (serialized as JSON) or None, e.g. the model config
+      fingerprint: string identifying the scored files, set by batch scoring
+        (see batch_score.py) to skip runs which did not change
+    """
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (created, task_name, dataset, config_name, config, "
+                "experiment_dir, participant_name, algorithm_name, time_budget, fingerprint) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                    time.time(), task_name, dataset, config_name,
+                    None if config is None else json.dumps(config, sort_keys=True),
+                    experiment_dir, participant_name, algorithm_name, time_budget, fingerprint
+                )
+            )
+        return cursor.lastrowid
+
+    def delete_run(self, run_id):
+        with self._connection:
+            self._connection.execute("DELETE FROM points WHERE run_id = ?", (run_id, ))
+            self._connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id, ))
+
+    def add_points(self, run_id, points):
+        """Append the points (prediction_index, timestamp, nauc, accuracy) to a run."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO points "
+                "(run_id, prediction_index, timestamp, nauc, accuracy) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, ) + tuple(point) for point in points]
+            )
+
+    def set_final_score(self, run_id, alc, duration):
+        with self._connection:
+            self._connection.execute(
+                "UPDATE runs SET alc = ?, duration = ? WHERE run_id = ?", (alc, duration, run_id)
+            )
+
+    # Queries
+
+    def find_runs(self, **filters):
+        """Return the runs (dicts with the columns of `runs`, `config` decoded)
+    matching all `filters`, e.g. `find_runs(dataset="Chucky", config_name="default")`.
+    The keys of `filters` are in `RUN_FILTERS`.
+    """
+        unknown = set(filters) - set(RUN_FILTERS)
+        if unknown:
+            raise ValueError(
+                "Unknown filters {}, can be any of {}.".format(sorted(unknown), RUN_FILTERS)
+            )
+        names = sorted(filters)
+        query = "SELECT * FROM runs"
+        if names:
+            query += " WHERE " + " AND ".join("{} = ?".format(name) for name in names)
+        rows = self._connection.execute(query + " ORDER BY run_id", [filters[n] for n in names])
+        runs = []
+        for row in rows:
+            run = dict(row)
+            if run["config"] is not None:
+                run["config"] = json.loads(run["config"])
+            runs.append(run)
+        return runs
+
+    def get_learning_curve(self, run_id, score_name="nauc"):
+        """Return the `LearningCurve` of a run, `score_name` can be 'nauc' or 'accuracy'."""
+        if score_name not in ["nauc", "accuracy"]:
+            raise ValueError("Unknown score name {}.".format(score_name))
+        run = self._connection.execute("SELECT * FROM runs WHERE run_id = ?", (run_id, )).fetchone()
+        if run is None:
+            raise KeyError("No run with run_id {} in {}.".format(run_id, self.path))
+        points = self._connection.execute(
+            "SELECT timestamp, {} FROM points WHERE run_id = ? AND {} IS NOT NULL "
+            "ORDER BY prediction_index".format(score_name, score_name), (run_id, )
+        ).fetchall()
+        return _learning_curve_class()(
+            timestamps=[point[0] for point in points],
+            scores=[point[1] for point in points],
+            time_budget=run["time_budget"],
+            score_name=score_name,
+            task_name=run["task_name"],
+            participant_name=run["participant_name"],
+            algorithm_name=run["algorithm_name"],
+        )
+
+    def get_learning_curves(self, score_name="nauc", **filters):
+        """Return the learning curves of the runs matching `filters`, see `find_runs`."""
+        return [
+            self.get_learning_curve(run["run_id"], score_name=score_name)
+            for run in self.find_runs(**filters)
+        ]
+
+    def get_mean_learning_curve(self, score_name="nauc", **filters):
+        """Return the average of the learning curves of the runs matching `filters`
+    (built with `LearningCurve.__add__`, so the runs need the same time budget),
+    or None if no run matches.
+    """
+        learning_curves = self.get_learning_curves(score_name=score_name, **filters)
+        if not learning_curves:
+            return None
+        total = learning_curves[0]
+        for learning_curve in learning_curves[1:]:
+            total = total + learning_curve
+        return total / len(learning_curves)
+
+    def get_alcs(self, group_by="config_name", **filters):
+        """Return {value of `group_by`: [ALC of each run]} for the finished runs
+    matching `filters`, e.g. the scores of each configuration on a dataset.
+    """
+        if group_by not in RUN_FILTERS:
+            raise ValueError("Cannot group by {}, can be any of {}.".format(group_by, RUN_FILTERS))
+        alcs = {}
+        for run in self.find_runs(**filters):
+            if run["alc"] is not None:
+                alcs.setdefault(run[group_by], []).append(run["alc"])
+        return alcs
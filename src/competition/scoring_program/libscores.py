@@ -25,7 +25,6 @@ import os
 import platform
 import sys
 
-from functools import reduce
 from glob import glob
 from os import getcwd as pwd
 from sys import stderr
@@ -34,7 +33,6 @@ from sys import version
 import numpy as np
 import pandas as pd
 import psutil
-import scipy as sp
 
 from sklearn import metrics
 from sklearn.preprocessing import *
@@ -85,14 +83,73 @@ def get_logger(verbosity_level, use_error_log=False):
     return logger
 
 
+# Magic string at the beginning of every .npy file
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def is_npy_file(filename):
+    """ Check whether a file is in the binary .npy format, whatever its extension """
+    with open(filename, "rb") as f:
+        return f.read(len(NPY_MAGIC)) == NPY_MAGIC
+
+
 def read_array(filename):
-    """ Read array and convert to 2d np arrays """
-    array = np.loadtxt(filename)
+    """ Read array and convert to 2d np arrays. Binary .npy files (e.g. predictions
+    written by `data_io.write(..., binary=True)`) are memory-mapped (copy-on-write)
+    instead of being parsed as text. """
+    if is_npy_file(filename):
+        array = np.load(filename, mmap_mode="c")
+    else:
+        array = np.loadtxt(filename)
     if len(array.shape) == 1:
         array = array.reshape(-1, 1)
     return array
 
 
+class ArrayBlockReader(object):
+    """ Read blocks of columns or rows of a 2d array file (as read by read_array)
+    without loading the whole array. Binary .npy files are memory-mapped, text
+    files are parsed again for each block (only the requested columns or rows
+    are kept). """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._array = None
+        if is_npy_file(filename):
+            self._array = np.load(filename, mmap_mode="r")
+            if len(self._array.shape) == 1:
+                self._array = self._array.reshape(-1, 1)
+            self.shape = self._array.shape
+        else:
+            num_rows, num_columns = 0, 0
+            with open(filename) as f:
+                for line in f:
+                    if line.strip():
+                        num_columns = num_columns or len(line.split())
+                        num_rows += 1
+            self.shape = (num_rows, num_columns)
+
+    def columns(self, start, stop):
+        """ Return the columns start to stop (excluded) as a 2d array """
+        if self._array is not None:
+            return np.array(self._array[:, start:stop])
+        return np.loadtxt(self.filename, usecols=range(start, stop), ndmin=2)
+
+    def rows(self, start, stop):
+        """ Return the rows start to stop (excluded) as a 2d array """
+        if self._array is not None:
+            return np.array(self._array[start:stop])
+        return np.loadtxt(self.filename, skiprows=start, max_rows=stop - start, ndmin=2)
+
+
+def read_array_block(array, start, stop, axis=1):
+    """ Return the columns (axis=1) or rows (axis=0) start to stop (excluded) of an
+    array, or of an array file opened with ArrayBlockReader """
+    if isinstance(array, ArrayBlockReader):
+        return array.columns(start, stop) if axis == 1 else array.rows(start, stop)
+    return array[:, start:stop] if axis == 1 else array[start:stop]
+
+
 def list_files(startpath):
     """List a tree structure of directories and files from startpath"""
     for root, dirs, files in os.walk(startpath):
@@ -107,8 +164,9 @@ def list_files(startpath):
 def sanitize_array(array):
     """ Replace NaN and Inf (there should not be any!)"""
     a = np.ravel(array)
-    maxi = np.nanmax((list(map(lambda x: x != float("inf"), a))))  # Max except NaN and Inf
-    mini = np.nanmin((list(map(lambda x: x != float("-inf"), a))))  # Mini except NaN and Inf
+    # Max and min of the masks x != inf and x != -inf (i.e. any and all), as always done
+    maxi = np.any(a != float("inf"))  # Max except NaN and Inf
+    mini = np.all(a != float("-inf"))  # Mini except NaN and Inf
     array[array == float("inf")] = maxi
     array[array == float("-inf")] = mini
     mid = (maxi + mini) / 2
@@ -124,8 +182,9 @@ def normalize_array(solution, prediction):
     classification inputs and outputs."""
     # Binarize solution
     sol = np.ravel(solution)  # convert to 1-d array
-    maxi = np.nanmax((list(map(lambda x: x != float("inf"), sol))))  # Max except NaN and Inf
-    mini = np.nanmin((list(map(lambda x: x != float("-inf"), sol))))  # Mini except NaN and Inf
+    # Max and min of the masks x != inf and x != -inf (i.e. any and all), as always done
+    maxi = np.any(sol != float("inf"))  # Max except NaN and Inf
+    mini = np.all(sol != float("-inf"))  # Mini except NaN and Inf
     if maxi == mini:
         print("Warning, cannot normalize")
         return [solution, prediction]
@@ -156,9 +215,7 @@ def binarize_predictions(array, task="binary.classification"):
         bin_array[array >= 0.5] = 1
     else:
         sample_num = array.shape[0]
-        for i in range(sample_num):
-            j = np.argmax(array[i, :])
-            bin_array[i, j] = 1
+        bin_array[np.arange(sample_num), np.argmax(array, axis=1)] = 1
     return bin_array
 
 
@@ -166,10 +223,11 @@ def acc_stat(solution, prediction):
     """ Return accuracy statistics TN, FP, TP, FN
      Assumes that solution and prediction are binary 0/1 vectors."""
     # This uses floats so the results are floats
-    TN = sum(np.multiply((1 - solution), (1 - prediction)))
-    FN = sum(np.multiply(solution, (1 - prediction)))
-    TP = sum(np.multiply(solution, prediction))
-    FP = sum(np.multiply((1 - solution), prediction))
+    # Sums over the samples, added in order like the builtin sum
+    TN = np.sum(np.multiply((1 - solution), (1 - prediction)), axis=0)
+    FN = np.sum(np.multiply(solution, (1 - prediction)), axis=0)
+    TP = np.sum(np.multiply(solution, prediction), axis=0)
+    FP = np.sum(np.multiply((1 - solution), prediction), axis=0)
     # print "TN =",TN
     # print "FP =",FP
     # print "TP =",TP
@@ -207,22 +265,65 @@ def tiedrank(a):
     return S
 
 
+def tiedrank_columns(a):
+    """ Return the ranks (with base 1) of each column of the 2-D array a, resolving ties
+    like tiedrank: the ranks of a tie are averaged with the same moving average, so the
+    result is identical to applying tiedrank to every column, but all columns are
+    ranked at once."""
+    m, n = a.shape
+    # Work on rows (one per column of a) to have the values of a column contiguous
+    order = np.argsort(a.T, axis=1)
+    sa = np.take_along_axis(a.T, order, axis=1)
+    R = np.empty((n, m))
+    R[:] = np.arange(m, dtype=float) + 1  # Ranks with base 1
+    # Ties are runs of equal sorted values, they never span two rows
+    is_tied = np.zeros((n, m), dtype=np.int8)
+    is_tied[:, 1:] = sa[:, 1:] == sa[:, :-1]
+    edges = np.diff(np.concatenate([[0], is_tied.ravel(), [0]]))
+    begins = np.flatnonzero(edges == 1) - 1  # Flat index of the first value of each tie
+    sizes = np.flatnonzero(edges == -1) - begins
+    if len(begins):
+        # Replay the moving average of tiedrank, longest ties first, such that at
+        # step j the ties still being averaged are a prefix
+        by_size = np.argsort(-sizes, kind="mergesort")
+        begins, sizes = begins[by_size], sizes[by_size]
+        k0 = begins % m
+        tie_rank = k0 + 1.0
+        for j in range(2, sizes[0] + 1):
+            count = np.searchsorted(-sizes, -j, side="right")
+            k = k0[:count] + j - 1
+            tie_rank[:count] = tie_rank[:count] * (j - 1) / j + (k + 1.0) / j
+        # Flat indices of all the tied values
+        offsets = np.arange(np.sum(sizes)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        R.ravel()[np.repeat(begins, sizes) + offsets] = np.repeat(tie_rank, sizes)
+    # Invert the index
+    S = np.empty((n, m))
+    np.put_along_axis(S, order, R, axis=1)
+    return S.T
+
+
 def mvmean(R, axis=0):
     """ Moving average to avoid rounding errors. A bit slow, but...
     Computes the mean along the given axis, except if this is a vector, in which case the mean is returned.
-    Does NOT flatten."""
+    Does NOT flatten.
+    The average of step k is (k / (k + 1)) * previous + (1 / (k + 1)) * R[k], computed for
+    all the means at once (one step per element along the axis)."""
     if len(R.shape) == 0:
         return R
-    average = lambda x: reduce(
-        lambda i, j: (0, (j[0] / (j[0] + 1.0)) * i[1] + (1.0 / (j[0] + 1)) * j[1]), enumerate(x)
-    )[1]
     R = np.array(R)
     if len(R.shape) == 1:
-        return average(R)
+        # Python floats are faster than numpy scalars for a scalar loop
+        values = R.tolist()
+        average = values[0]
+        for k in range(1, len(values)):
+            average = (k / (k + 1.0)) * average + (1.0 / (k + 1)) * values[k]
+        return average
     if axis == 1:
-        return np.array(map(average, R))
-    else:
-        return np.array(map(average, R.transpose()))
+        R = R.transpose()
+    average = R[0]
+    for k in range(1, R.shape[0]):
+        average = (k / (k + 1.0)) * average + (1.0 / (k + 1)) * R[k]
+    return np.array(average, dtype=float)
 
 
 # ======= Default metrics ========
@@ -313,12 +414,12 @@ def bac_metric(solution, prediction, task="binary.classification"):
     [tn, fp, tp, fn] = acc_stat(solution, bin_prediction)
     # Bounding to avoid division by 0
     eps = 1e-15
-    tp = sp.maximum(eps, tp)
-    pos_num = sp.maximum(eps, tp + fn)
+    tp = np.maximum(eps, tp)
+    pos_num = np.maximum(eps, tp + fn)
     tpr = tp / pos_num  # true positive rate (sensitivity)
     if (task != "multiclass.classification") or (label_num == 1):
-        tn = sp.maximum(eps, tn)
-        neg_num = sp.maximum(eps, tn + fp)
+        tn = np.maximum(eps, tn)
+        neg_num = np.maximum(eps, tn + fp)
         tnr = tn / neg_num  # true negative rate (specificity)
         bac = 0.5 * (tpr + tnr)
         base_bac = 0.5  # random predictions for binary case
@@ -327,7 +428,7 @@ def bac_metric(solution, prediction, task="binary.classification"):
         base_bac = 1.0 / label_num  # random predictions for multiclass case
     bac = mvmean(bac)  # average over all classes
     # Normalize: 0 for random, 1 for perfect
-    score = (bac - base_bac) / sp.maximum(eps, (1 - base_bac))
+    score = (bac - base_bac) / np.maximum(eps, (1 - base_bac))
     return score
 
 
@@ -342,7 +443,7 @@ def pac_metric(solution, prediction, task="binary.classification"):
     eps = 1e-15
     the_log_loss = log_loss(solution, prediction, task)
     # Compute the base log loss (using the prior probabilities)
-    pos_num = 1.0 * sum(solution)  # float conversion!
+    pos_num = 1.0 * np.sum(solution, axis=0)  # float conversion!
     frac_pos = pos_num / sample_num  # prior proba of positive class
     the_base_log_loss = prior_log_loss(frac_pos, task)
     # Alternative computation of the same thing (slower)
@@ -350,8 +451,7 @@ def pac_metric(solution, prediction, task="binary.classification"):
     # For which the analytic solution makes more sense
     if debug_flag:
         base_prediction = np.empty(prediction.shape)
-        for k in range(sample_num):
-            base_prediction[k, :] = frac_pos
+        base_prediction[:] = frac_pos
         base_log_loss = log_loss(solution, base_prediction, task)
         diff = np.array(abs(the_base_log_loss - base_log_loss))
         if len(diff.shape) > 0:
@@ -364,7 +464,7 @@ def pac_metric(solution, prediction, task="binary.classification"):
     pac = mvmean(np.exp(-the_log_loss))
     base_pac = mvmean(np.exp(-the_base_log_loss))
     # Normalize: 0 for random, 1 for perfect
-    score = (pac - base_pac) / sp.maximum(eps, (1 - base_pac))
+    score = (pac - base_pac) / np.maximum(eps, (1 - base_pac))
     return score
 
 
@@ -379,12 +479,12 @@ def f1_metric(solution, prediction, task="binary.classification"):
     [tn, fp, tp, fn] = acc_stat(solution, bin_prediction)
     # Bounding to avoid division by 0
     eps = 1e-15
-    true_pos_num = sp.maximum(eps, tp + fn)
-    found_pos_num = sp.maximum(eps, tp + fp)
-    tp = sp.maximum(eps, tp)
+    true_pos_num = np.maximum(eps, tp + fn)
+    found_pos_num = np.maximum(eps, tp + fp)
+    tp = np.maximum(eps, tp)
     tpr = tp / true_pos_num  # true positive rate (recall)
     ppv = tp / found_pos_num  # positive predictive value (precision)
-    arithmetic_mean = 0.5 * sp.maximum(eps, tpr + ppv)
+    arithmetic_mean = 0.5 * np.maximum(eps, tpr + ppv)
     # Harmonic mean:
     f1 = tpr * ppv / arithmetic_mean
     # Average over all classes
@@ -409,7 +509,7 @@ def f1_metric(solution, prediction, task="binary.classification"):
     # tpr=ppv=frac_pos, where frac_pos=1/label_num
     else:
         base_f1 = 1.0 / label_num
-    score = (f1 - base_f1) / sp.maximum(eps, (1 - base_f1))
+    score = (f1 - base_f1) / np.maximum(eps, (1 - base_f1))
     return score
 
 
@@ -423,17 +523,16 @@ def auc_metric(solution, prediction, task="binary.classification"):
     binary and multilabel classification problems)."""
     # auc = metrics.roc_auc_score(solution, prediction, average=None)
     # There is a bug in metrics.roc_auc_score: auc([1,0,0],[1e-10,0,0]) incorrect
-    label_num = solution.shape[1]
-    auc = np.empty(label_num)
-    for k in range(label_num):
-        r_ = tiedrank(prediction[:, k])
-        s_ = solution[:, k]
-        if sum(s_) == 0:
-            print("WARNING: no positive class example in class {}".format(k + 1))
-        npos = sum(s_ == 1)
-        nneg = sum(s_ < 1)
-        auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
-        # print('AUC[%d]=' % k + '%5.2f' % auc[k])
+    # Rank all columns at once, the results are identical to ranking each column
+    # with `tiedrank` and summing with the builtin `sum` (cumsum also adds in order)
+    r_ = tiedrank_columns(prediction)
+    s_ = solution
+    for k in np.flatnonzero(np.sum(s_, axis=0) == 0):
+        print("WARNING: no positive class example in class {}".format(k + 1))
+    npos = np.sum(s_ == 1, axis=0)
+    nneg = np.sum(s_ < 1, axis=0)
+    sum_pos_ranks = np.cumsum(np.where(s_ == 1, r_, 0), axis=0)[-1]
+    auc = (sum_pos_ranks - npos * (npos + 1) / 2) / (nneg * npos)
     return 2 * mvmean(auc) - 1
 
 
@@ -483,14 +582,13 @@ def log_loss(solution, prediction, task="binary.classification"):
     if (task == "multiclass.classification") and (label_num > 1):
         # Make sure the lines add up to one for multi-class classification
         norma = np.sum(prediction, axis=1)
-        for k in range(sample_num):
-            pred[k, :] /= sp.maximum(norma[k], eps)
-            # Make sure there is a single label active per line for multi-class classification
+        pred /= np.maximum(norma, eps)[:, np.newaxis]
+        # Make sure there is a single label active per line for multi-class classification
         sol = binarize_predictions(solution, task="multiclass.classification")
         # For the base prediction, this solution is ridiculous in the multi-label case
 
     # Bounding of predictions to avoid log(0),1/0,...
-    pred = sp.minimum(1 - eps, sp.maximum(eps, pred))
+    pred = np.minimum(1 - eps, np.maximum(eps, pred))
     # Compute the log loss
     pos_class_log_loss = -mvmean(sol * np.log(pred), axis=0)
     if (task != "multiclass.classification") or (label_num == 1):
@@ -516,10 +614,10 @@ def log_loss(solution, prediction, task="binary.classification"):
 def prior_log_loss(frac_pos, task="binary.classification"):
     """ Baseline log loss. For multiplr classes ot labels return the volues for each column"""
     eps = 1e-15
-    frac_pos_ = sp.maximum(eps, frac_pos)
+    frac_pos_ = np.maximum(eps, frac_pos)
     if task != "multiclass.classification":  # binary case
         frac_neg = 1 - frac_pos
-        frac_neg_ = sp.maximum(eps, frac_neg)
+        frac_neg_ = np.maximum(eps, frac_neg)
         pos_class_log_loss_ = -frac_pos * np.log(frac_pos_)
         neg_class_log_loss_ = -frac_neg * np.log(frac_neg_)
         base_log_loss = pos_class_log_loss_ + neg_class_log_loss_
@@ -84,38 +84,49 @@ import datetime
 import os
 import sys
 import time
+from fnmatch import fnmatch
+from multiprocessing import Pool
 from os.path import join
 from random import randrange
 from sys import argv
 
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 import psutil
 import yaml
 from sklearn.metrics import auc
 
 try:
+    from src.competition.scoring_program.directory_watcher import get_watcher
+    from src.competition.scoring_program.learning_curve_store import LearningCurveStore
     from src.competition.scoring_program.libscores import _HERE
+    from src.competition.scoring_program.libscores import ArrayBlockReader
     from src.competition.scoring_program.libscores import get_logger
     from src.competition.scoring_program.libscores import ls
     from src.competition.scoring_program.libscores import mvmean
     from src.competition.scoring_program.libscores import read_array
-    from src.competition.scoring_program.libscores import sp
-    from src.competition.scoring_program.libscores import tiedrank
+    from src.competition.scoring_program.libscores import read_array_block
+    from src.competition.scoring_program.libscores import tiedrank_columns
 except ImportError:
+    from directory_watcher import get_watcher
+    from learning_curve_store import LearningCurveStore
     from libscores import _HERE
+    from libscores import ArrayBlockReader
     from libscores import get_logger
     from libscores import ls
     from libscores import mvmean
     from libscores import read_array
-    from libscores import sp
-    from libscores import tiedrank
+    from libscores import read_array_block
+    from libscores import tiedrank_columns
 
-matplotlib.use("Agg")  # Solve the Tkinter display issue
 
 logger = get_logger(verbosity_level)
 
+# Estimated peak bytes used per value of a block scored by `autodl_auc` (the
+# solution and prediction, their valid columns, the ranks and sorting buffers)
+AUC_BYTES_PER_VALUE = 128
+# Bytes per value of a block scored by `accuracy`
+ACCURACY_BYTES_PER_VALUE = 32
+
 ################################################################################
 # Functions
 ################################################################################
@@ -141,30 +152,104 @@ def autodl_auc(solution, prediction, valid_columns_only=True):
             )
         solution = solution[:, valid_columns].copy()
         prediction = prediction[:, valid_columns].copy()
-    label_num = solution.shape[1]
-    auc = np.empty(label_num)
-    for k in range(label_num):
-        r_ = tiedrank(prediction[:, k])
-        s_ = solution[:, k]
-        if sum(s_) == 0:
-            print("WARNING: no positive class example in class {}".format(k + 1))
-        npos = sum(s_ == 1)
-        nneg = sum(s_ < 1)
-        auc[k] = (sum(r_[s_ == 1]) - npos * (npos + 1) / 2) / (nneg * npos)
-    return 2 * mvmean(auc) - 1
+    return 2 * mvmean(get_column_aucs(solution, prediction)) - 1
+
+
+def get_column_aucs(solution, prediction, first_class=0):
+    """Return the AUC of each column, `first_class` is the index of the first
+  column in the warnings.
+  """
+    # Rank all columns at once, the results are identical to ranking each column
+    # with `tiedrank` and summing with the builtin `sum` (cumsum also adds in order)
+    r_ = tiedrank_columns(prediction)
+    s_ = solution
+    for k in np.flatnonzero(np.sum(s_, axis=0) == 0):
+        print("WARNING: no positive class example in class {}".format(first_class + k + 1))
+    npos = np.sum(s_ == 1, axis=0)
+    nneg = np.sum(s_ < 1, axis=0)
+    sum_pos_ranks = np.cumsum(np.where(s_ == 1, r_, 0), axis=0)[-1]
+    return (sum_pos_ranks - npos * (npos + 1) / 2) / (nneg * npos)
+
+
+def get_blocks(num_values, values_per_item, max_memory, bytes_per_value):
+    """Split `num_values` columns (or rows) of `values_per_item` values each in
+  blocks using at most `max_memory` bytes (at least one column or row per
+  block). Return a list of (start, stop).
+  """
+    block_size = max(1, int(max_memory // (values_per_item * bytes_per_value)))
+    return [
+        (start, min(start + block_size, num_values))
+        for start in range(0, num_values, block_size)
+    ]
+
+
+def autodl_auc_chunked(solution, prediction, max_memory, valid_columns_only=True):
+    """Same as `autodl_auc` (the result is identical) but computed on blocks of
+  columns, using about `max_memory` bytes at most. The AUC of a column only
+  depends on this column, and the AUCs are averaged in the same order.
+
+  Args:
+    solution, prediction: arrays, or array files opened with `ArrayBlockReader`,
+      in which case only one block of columns is read at a time
+  """
+    num_examples, num_classes = solution.shape
+    aucs = []
+    ignored_columns = False
+    blocks = get_blocks(num_classes, num_examples, max_memory, AUC_BYTES_PER_VALUE)
+    for start, stop in blocks:
+        solution_block = read_array_block(solution, start, stop)
+        prediction_block = read_array_block(prediction, start, stop)
+        if valid_columns_only:
+            valid_columns = get_valid_columns(solution_block)
+            ignored_columns |= len(valid_columns) < solution_block.shape[-1]
+            solution_block = solution_block[:, valid_columns]
+            prediction_block = prediction_block[:, valid_columns]
+        aucs.append(
+            get_column_aucs(solution_block, prediction_block, first_class=sum(map(len, aucs)))
+        )
+    if ignored_columns:
+        logger.info(
+            "Some columns in solution have only one class, "
+            "ignoring these columns for evaluation."
+        )
+    return 2 * mvmean(np.concatenate(aucs)) - 1
 
 
 def accuracy(solution, prediction):
     """Get accuracy of 'prediction' w.r.t true labels 'solution'."""
+    return accuracy_sum(solution, prediction) / solution.shape[0]
+
+
+def accuracy_sum(solution, prediction):
+    """Sum of the accuracies of the examples."""
     epsilon = 1e-15
     # normalize prediction
     prediction_normalized = prediction / (
         np.sum(np.abs(prediction), axis=1, keepdims=True) + epsilon
     )
-    return np.sum(solution * prediction_normalized) / solution.shape[0]
+    return np.sum(solution * prediction_normalized)
+
+
+def accuracy_chunked(solution, prediction, max_memory):
+    """Same as `accuracy` but computed on blocks of rows, using about `max_memory`
+  bytes at most, see `autodl_auc_chunked`. The sums of the blocks are added, so
+  the result only equals the one of `accuracy` up to rounding.
+  """
+    num_examples, num_classes = solution.shape
+    total = 0.0
+    for start, stop in get_blocks(
+        num_examples, num_classes, max_memory, ACCURACY_BYTES_PER_VALUE
+    ):
+        total += accuracy_sum(
+            read_array_block(solution, start, stop, axis=0),
+            read_array_block(prediction, start, stop, axis=0)
+        )
+    return total / num_examples
 
 
 scoring_functions = {"nauc": autodl_auc, "accuracy": accuracy}
+# Same scores, computed in blocks, taking the memory ceiling as third argument
+chunked_scoring_functions = {"nauc": autodl_auc_chunked, "accuracy": accuracy_chunked}
 
 
 def get_valid_columns(solution):
@@ -193,7 +278,7 @@ def is_one_hot_vector(x, axis=None, keepdims=False):
     return np.logical_and(norm_1 == 1, norm_inf == 1)
 
 
-def is_multiclass(solution):
+def is_multiclass(solution, max_memory=None):
     """Return if a task is a multi-class classification task, i.e.  each example
   only has one label and thus each binary vector in `solution` only has
   one '1' and all the rest components are '0'.
@@ -202,9 +287,18 @@ def is_multiclass(solution):
   are only applicable for multi-class task (and not for multi-label task).
 
   Args:
-    solution: a numpy.ndarray object of shape [num_examples, num_classes].
+    solution: a numpy.ndarray object of shape [num_examples, num_classes], or
+      an `ArrayBlockReader`
+    max_memory: if not None, check blocks of rows using about that many bytes
   """
-    return all(is_one_hot_vector(solution, axis=1))
+    if max_memory is None:
+        return all(is_one_hot_vector(solution, axis=1))
+    num_examples, num_classes = solution.shape
+    return all(
+        all(is_one_hot_vector(read_array_block(solution, start, stop, axis=0), axis=1))
+        for start, stop in
+        get_blocks(num_examples, num_classes, max_memory, ACCURACY_BYTES_PER_VALUE)
+    )
 
 
 def get_fig_name(task_name):
@@ -478,7 +572,91 @@ def get_scores(scoring_function, solution, predictions):
     return scores
 
 
-def compute_scores_bootstrap(scoring_function, solution, prediction, n=10):
+# Scoring function, solution and predictions shared by the bootstrap workers
+_bootstrap_data = {}
+
+
+def _init_bootstrap(scoring_function, solution, predictions):
+    """Set the data of the bootstrap, once per worker process."""
+    _bootstrap_data["scoring_function"] = scoring_function
+    _bootstrap_data["solution"] = solution
+    _bootstrap_data["predictions"] = predictions
+
+
+def _score_bootstrap_sample(idx):
+    """Score every prediction on the bootstrap sample `idx`."""
+    scoring_function = _bootstrap_data["scoring_function"]
+    solution = _bootstrap_data["solution"][idx]
+    predictions = _bootstrap_data["predictions"]
+    return [scoring_function(solution, prediction[idx]) for prediction in predictions]
+
+
+def draw_bootstrap_indices(size, n, seed=0):
+    """Draw the indices of `n` bootstrap samples of `size` examples at once, as an
+  array of shape (n, size). With the same seed, the samples are the same.
+  """
+    return np.random.RandomState(seed).randint(0, size, (n, size))
+
+
+def get_scores_bootstrap(scoring_function, solution, predictions, n=10, seed=0, num_workers=None):
+    """Score each of the `predictions` on `n` bootstrap samples of the examples,
+  the same samples for all predictions. The samples are scored in parallel by
+  `num_workers` processes (by default one per CPU, at most n), the results only
+  depend on `seed`.
+
+  Returns:
+    a list of n lists of scores, one score per prediction.
+  """
+    all_idx = draw_bootstrap_indices(solution.shape[0], n, seed=seed)
+    num_workers = num_workers or min(n, os.cpu_count() or 1)
+    if num_workers <= 1:
+        _init_bootstrap(scoring_function, solution, predictions)
+        try:
+            return [_score_bootstrap_sample(idx) for idx in all_idx]
+        finally:
+            _bootstrap_data.clear()
+    # The solution and predictions are given once to each worker, not with each sample
+    with Pool(
+        num_workers,
+        initializer=_init_bootstrap,
+        initargs=(scoring_function, solution, predictions)
+    ) as pool:
+        return pool.map(_score_bootstrap_sample, all_idx)
+
+
+def get_auc_scores_bootstrap_chunked(solution, predictions, max_memory, n=10, seed=0):
+    """Same as `get_scores_bootstrap` with `autodl_auc` (the results are identical)
+  but computed on blocks of columns, using about `max_memory` bytes at most, see
+  `autodl_auc_chunked`. The bootstrap samples are drawn from the rows of each block.
+
+  Args:
+    predictions: list of arrays, or of array files opened with `ArrayBlockReader`
+  Returns:
+    a list of n lists of scores, one score per prediction.
+  """
+    num_examples, num_classes = solution.shape
+    all_idx = draw_bootstrap_indices(num_examples, n, seed=seed)
+    aucs = [[[] for _ in predictions] for _ in all_idx]
+    for start, stop in get_blocks(num_classes, num_examples, max_memory, AUC_BYTES_PER_VALUE):
+        solution_block = read_array_block(solution, start, stop)
+        for j, prediction in enumerate(predictions):
+            prediction_block = read_array_block(prediction, start, stop)
+            for i, idx in enumerate(all_idx):
+                solution_sample = solution_block[idx]
+                valid_columns = get_valid_columns(solution_sample)
+                aucs[i][j].append(
+                    get_column_aucs(
+                        solution_sample[:, valid_columns],
+                        prediction_block[idx][:, valid_columns],
+                        first_class=sum(map(len, aucs[i][j]))
+                    )
+                )
+    return [[2 * mvmean(np.concatenate(a)) - 1 for a in sample_aucs] for sample_aucs in aucs]
+
+
+def compute_scores_bootstrap(
+    scoring_function, solution, prediction, n=10, seed=0, num_workers=None
+):
     """Compute a list of scores using bootstrap.
 
        Args:
@@ -486,14 +664,13 @@ def compute_scores_bootstrap(scoring_function, solution, prediction, n=10):
          solution: ground truth vector
          prediction: proposed solution
          n: number of scores to compute
+         seed: seed of the bootstrap samples
+         num_workers: number of processes computing the scores
     """
-    scores = []
-    l = len(solution)
-    for _ in range(n):  # number of scoring
-        size = solution.shape[0]
-        idx = np.random.randint(0, size, size)  # bootstrap index
-        scores.append(scoring_function(solution[idx], prediction[idx]))
-    return scores
+    scores = get_scores_bootstrap(
+        scoring_function, solution, [prediction], n=n, seed=seed, num_workers=num_workers
+    )
+    return [sample_scores[0] for sample_scores in scores]
 
 
 def end_file_generated(prediction_dir):
@@ -553,6 +730,8 @@ class LearningCurve(object):
         self.task_name = task_name
         self.participant_name = participant_name
         self.algorithm_name = algorithm_name
+        # Running area of the steps, see `get_alc`
+        self._step_area = None
 
     def __repr__(self):
         return "Learning curve for: participant={}, task={}".format(
@@ -701,18 +880,45 @@ class LearningCurve(object):
         )
         return alc, fig
 
+    def add_point(self, timestamp, score):
+        """Append a point to the learning curve, instead of building a new one."""
+        self.timestamps.append(timestamp)
+        self.scores.append(score)
+
+    def _update_step_area(self, t0):
+        """Add the steps of the points appended since the last call to the running
+    area (the area up to the last point), in the order of `auc_step`.
+    """
+        state = self._step_area
+        key = (t0, self.time_budget)
+        if state is None or state["key"] != key or state["num_points"] > len(self.timestamps):
+            state = {"key": key, "num_points": 0, "area": 0, "x": 0, "y": 0}
+            self._step_area = state
+        for i in range(state["num_points"], len(self.timestamps)):
+            x = transform_time(self.timestamps[i], T=self.time_budget, t0=t0)
+            state["area"] += (x - state["x"]) * state["y"]
+            state["x"], state["y"] = x, self.scores[i]
+        state["num_points"] = len(self.timestamps)
+        return state
+
     def get_alc(self, t0=60, method="step"):
+        """Return the area under the learning curve. With the 'step' method, the
+    area up to the last point is kept and only extended by the points added
+    since the last call, so calling it after each new point costs O(1). Points
+    are expected to be appended only (e.g. with `add_point`).
+    """
+        if method == "step":
+            state = self._update_step_area(t0)
+            # The last score holds until the end of the time budget
+            return state["area"] + (1 - state["x"]) * state["y"]
         X = [transform_time(t, T=self.time_budget, t0=t0) for t in self.timestamps]
         Y = list(self.scores.copy())
         X.insert(0, 0)
         Y.insert(0, 0)
         X.append(1)
         Y.append(Y[-1])
-        if method == "step":
-            auc_func = auc_step
-        elif method == "trapez":
-            auc_func = auc
-        alc = auc_func(X, Y)
+        if method == "trapez":
+            alc = auc(X, Y)
         return alc
 
     def get_time_used(self):
@@ -728,6 +934,11 @@ class LearningCurve(object):
             return 0
 
     def save_figure(self, output_dir):
+        # Only imported here, the scoring program renders learning curves as SVG
+        import matplotlib
+        matplotlib.use("Agg")  # Solve the Tkinter display issue
+        import matplotlib.pyplot as plt
+
         alc, ax = self.plot()
         fig_name = get_fig_name(self.task_name)
         path_to_fig = os.path.join(output_dir, fig_name)
@@ -746,10 +957,25 @@ class Evaluator(object):
         participant_name=None,
         algorithm_name=None,
         submission_id=None,
+        watcher=None,
+        learning_curve_store=None,
+        run_info=None,
+        max_scoring_memory=None,
     ):
         """
     Args:
       scoring_functions: a dict containing (string, scoring_function) pairs
+      watcher: object notifying the files written to `prediction_dir`, see
+        directory_watcher.py. By default, inotify is used if available, else
+        the directory is polled every second.
+      learning_curve_store: a `LearningCurveStore` the run and the score of
+        each prediction are written to, optional. Closed by `close`.
+      run_info: dict of the `LearningCurveStore.add_run` arguments describing
+        the run, e.g. dataset and config_name, optional
+      max_scoring_memory: if not None, the default scoring functions are
+        computed on blocks of the solution and predictions read from their
+        files, using about that many bytes at most (see `autodl_auc_chunked`).
+        The AUC is identical, the accuracy equal up to rounding.
     """
         self.start_time = time.time()
 
@@ -757,6 +983,7 @@ class Evaluator(object):
         self.prediction_dir = prediction_dir
         self.score_dir = score_dir
         self.scoring_functions = scoring_functions
+        self.max_scoring_memory = max_scoring_memory
 
         self.task_name = task_name or get_task_name(solution_dir)
         self.participant_name = participant_name
@@ -770,18 +997,44 @@ class Evaluator(object):
         self.new_prediction_files = []
         self.scores_so_far = {"nauc": []}
         self.relative_timestamps = []
+        # Scores of each prediction file, by score name
+        self.scores_per_file = {}
+        # Files written to prediction_dir notified by the watcher, not yet handled
+        self.written_files = set()
+        self.prediction_dir_scanned = False
+        # (lower, upper) NAUC of each prediction from the bootstrap, see `compute_alc_error_bars`
+        self.score_band = None
+        self.watcher = watcher or get_watcher(prediction_dir)
 
         # Resolve info from directories
         self.solution = self.get_solution()
         # Check if the task is multilabel (i.e. with one hot label)
-        self.is_multiclass_task = is_multiclass(self.solution)
+        self.is_multiclass_task = is_multiclass(self.solution, max_memory=max_scoring_memory)
 
         self.initialize_learning_curve_page()
         self.fetch_ingestion_info()
         self.learning_curve = self.get_learning_curve()
 
+        self.learning_curve_store = learning_curve_store
+        if learning_curve_store is not None:
+            run_info = dict(run_info or {})
+            run_info.setdefault("participant_name", participant_name)
+            run_info.setdefault("algorithm_name", algorithm_name)
+            self.run_id = learning_curve_store.add_run(
+                task_name=self.task_name, time_budget=self.time_budget, **run_info
+            )
+
     def get_solution(self):
-        """Get solution as NumPy array from `self.solution_dir`."""
+        """Get solution as NumPy array from `self.solution_dir`, or as an
+    `ArrayBlockReader` of the solution file when scoring in blocks.
+    """
+        if self.max_scoring_memory is not None:
+            solution_files = ls(os.path.join(self.solution_dir, "*.solution"))
+            if len(solution_files) != 1:
+                raise ScoringError(
+                    "{} solution files found: {}!".format(len(solution_files), solution_files)
+                )
+            return ArrayBlockReader(solution_files[0])
         solution = get_solution(self.solution_dir)
         logger.debug("Successfully loaded solution from solution_dir={}".format(self.solution_dir))
         return solution
@@ -816,21 +1069,23 @@ class Evaluator(object):
         # Wait 1800 seconds for ingestion to start and write 'start.txt',
         # Otherwise, raise an exception.
         wait_time = 1800
-        ingestion_info = None
-        for i in range(wait_time):
+        wait_start = time.time()
+        while True:
             ingestion_info = get_ingestion_info(prediction_dir)
             if not ingestion_info is None:
                 logger.info(
-                    "Detected the start of ingestion after {} ".format(i) +
-                    "seconds. Start scoring."
+                    "Detected the start of ingestion after "
+                    "{:.0f} seconds. Start scoring.".format(time.time() - wait_start)
                 )
                 break
-            time.sleep(1)
-        else:
-            raise IngestionError(
-                "[-] Failed: scoring didn't detected the start of " +
-                "ingestion after {} seconds.".format(wait_time)
-            )
+            remaining_time = wait_start + wait_time - time.time()
+            if remaining_time <= 0:
+                raise IngestionError(
+                    "[-] Failed: scoring didn't detected the start of "
+                    "ingestion after {} seconds.".format(wait_time)
+                )
+            # Returns as soon as ingestion writes a file, e.g. 'start.txt'
+            self.wait_for_written_files(timeout=remaining_time)
         # Get ingestion start time
         ingestion_start = ingestion_info["start_time"]
         # Get ingestion PID
@@ -850,6 +1105,19 @@ class Evaluator(object):
     def end_file_generated(self):
         return end_file_generated(self.prediction_dir)
 
+    def wait_for_written_files(self, timeout=None):
+        """Block until ingestion writes files to the prediction directory, at most
+    `timeout` seconds, and remember their names for `get_new_prediction_files`.
+    """
+        names = self.watcher.wait(timeout=timeout)
+        self.written_files.update(names)
+        return names
+
+    def close(self):
+        self.watcher.close()
+        if self.learning_curve_store is not None:
+            self.learning_curve_store.close()
+
     def prediction_filename_pattern(self):
         return "{}.predict_*".format(self.task_name)
 
@@ -862,13 +1130,22 @@ class Evaluator(object):
     Returns:
       List of new prediction files found.
     """
-        prediction_files = ls(os.path.join(self.prediction_dir, self.prediction_filename_pattern()))
+        pattern = self.prediction_filename_pattern()
+        if self.prediction_dir_scanned:
+            # Only look at the files notified by the watcher since the last call
+            prediction_files = [
+                os.path.join(self.prediction_dir, name)
+                for name in self.written_files
+                if fnmatch(name, pattern)
+            ]
+        else:
+            prediction_files = ls(os.path.join(self.prediction_dir, pattern))
+            self.prediction_dir_scanned = True
+        self.written_files.clear()
         logger.debug("Prediction files: {}".format(prediction_files))
-        new_prediction_files = [
-            p for p in prediction_files if p not in self.prediction_files_so_far
-        ]
+        new_prediction_files = [p for p in prediction_files if p not in self.scores_per_file]
         order_key = lambda filename: int(filename.split("_")[-1])
-        self.new_prediction_files = sorted(new_prediction_files, key=order_key)
+        self.new_prediction_files = sorted(set(new_prediction_files), key=order_key)
         return self.new_prediction_files
 
     def compute_score_per_prediction(self):
@@ -876,25 +1153,66 @@ class Evaluator(object):
     and scoring functions in `self.scoring_functions`. Then concatenate
     the list of new predictions to the list of resolved predictions so far.
     """
-        for score_name in self.scoring_functions:
-            scoring_function = self.scoring_functions[score_name]
-            if score_name != "accuracy" or self.is_multiclass_task:
-                new_scores = [
-                    scoring_function(self.solution, read_array(pred))
-                    for pred in self.new_prediction_files
-                ]
-                if score_name in self.scores_so_far:
-                    self.scores_so_far[score_name] += new_scores
-                else:
-                    self.scores_so_far[score_name] = new_scores
+        for pred in self.new_prediction_files:
+            prediction = self.read_prediction(pred)
+            scores = {}
+            for score_name in self.scoring_functions:
+                if score_name != "accuracy" or self.is_multiclass_task:
+                    scores[score_name] = self.score(score_name, prediction)
+                    self.scores_so_far.setdefault(score_name, []).append(scores[score_name])
+            self.scores_per_file[pred] = scores
         # If new predictions are found, update state variables
         if self.new_prediction_files:
+            num_preds_before = len(self.prediction_files_so_far)
             self.prediction_files_so_far += self.new_prediction_files
             num_preds = len(self.prediction_files_so_far)
             self.relative_timestamps = self.get_relative_timestamps()[:num_preds]
-            self.learning_curve = self.get_learning_curve()
+            # Only add the new points to the learning curve
+            for i in range(num_preds_before, num_preds):
+                self.learning_curve.add_point(
+                    self.relative_timestamps[i], self.scores_so_far["nauc"][i]
+                )
+            if self.learning_curve_store is not None:
+                accuracies = self.scores_so_far.get("accuracy")
+                self.learning_curve_store.add_points(
+                    self.run_id, [
+                        (
+                            i, self.relative_timestamps[i], self.scores_so_far["nauc"][i],
+                            accuracies[i] if accuracies else None
+                        ) for i in range(num_preds_before, num_preds)
+                    ]
+                )
             self.new_prediction_files = []
 
+    def is_chunked(self, score_name):
+        """Whether the score is computed in blocks, only for the default functions."""
+        return (
+            self.max_scoring_memory is not None
+            and self.scoring_functions[score_name] is scoring_functions.get(score_name)
+        )
+
+    def read_prediction(self, prediction_file):
+        """Read a prediction, or open it to be read in blocks when scoring in blocks."""
+        if self.max_scoring_memory is not None:
+            return ArrayBlockReader(prediction_file)
+        return read_array(prediction_file)
+
+    def score(self, score_name, prediction):
+        """Compute the score `score_name` of a prediction given by `read_prediction`."""
+        if self.is_chunked(score_name):
+            return chunked_scoring_functions[score_name](
+                self.solution, prediction, self.max_scoring_memory
+            )
+        if isinstance(prediction, ArrayBlockReader):  # Custom scoring function
+            prediction = read_array(prediction.filename)
+        return self.scoring_functions[score_name](self.get_solution_array(), prediction)
+
+    def get_solution_array(self):
+        """The whole solution, even when scoring in blocks."""
+        if isinstance(self.solution, ArrayBlockReader):
+            return read_array(self.solution.filename)
+        return self.solution
+
     def get_relative_timestamps(self):
         """Get a list of relative timestamps. The beginning has relative timestamp
     zero.
@@ -948,8 +1266,22 @@ class Evaluator(object):
         else:
             mode = "w"
         filepath = os.path.join(score_dir, filename)
+        # Imported here, svg_rendering uses `transform_time`
+        try:
+            from src.competition.scoring_program.svg_rendering import render_learning_curve_svg
+        except ImportError:
+            from svg_rendering import render_learning_curve_svg
+        svg = render_learning_curve_svg(
+            self.learning_curve.timestamps,
+            self.learning_curve.scores,
+            self.time_budget,
+            task_name=self.task_name,
+            alc=self.learning_curve.get_alc(),
+            score_band=self.score_band,
+        )
         with open(filepath, mode) as html_file:
             html_file.write(html_head)
+            html_file.write(svg + "<br>")
             for image_path in image_paths:
                 with open(image_path, "rb") as image_file:
                     encoded_string = base64.b64encode(image_file.read())
@@ -1000,52 +1332,91 @@ class Evaluator(object):
         return alc, time_used
 
     def update_score_and_learning_curve(self):
-        self.draw_learning_curve()
+        # Only add the new points, the ALC is updated incrementally
+        self.compute_score_per_prediction()
         # Update learning curve page (detailed_results.html)
         #self.write_scores_html()
         # Write score
-        score = self.write_score()["score"]
-        return score
+        score_info = self.write_score()
+        if self.learning_curve_store is not None:
+            self.learning_curve_store.set_final_score(
+                self.run_id, score_info["score"], score_info["Duration"]
+            )
+        return score_info["score"]
 
-    def compute_error_bars(self, n=10):
+    def compute_error_bars(self, n=10, seed=0, num_workers=None):
         """Compute error bars on evaluation with bootstrap.
 
     Args:
         n: number of times to compute the score (more means more precision)
+        seed: seed of the bootstrap samples
+        num_workers: number of processes computing the scores
     Returns:
         (mean, std, var)
     """
         try:
+            if self.is_chunked("nauc"):
+                scores = get_auc_scores_bootstrap_chunked(
+                    self.solution,
+                    [self.read_prediction(self.prediction_files_so_far[-1])],
+                    self.max_scoring_memory,
+                    n=n,
+                    seed=seed
+                )
+                scores = [sample_scores[0] for sample_scores in scores]
+                return np.mean(scores), np.std(scores), np.var(scores)
             scoring_function = self.scoring_functions["nauc"]
-            solution = self.solution
+            solution = self.get_solution_array()
             last_prediction = read_array(self.prediction_files_so_far[-1])
-            scores = compute_scores_bootstrap(scoring_function, solution, last_prediction, n=n)
+            scores = compute_scores_bootstrap(
+                scoring_function, solution, last_prediction, n=n, seed=seed, num_workers=num_workers
+            )
             return np.mean(scores), np.std(scores), np.var(scores)
         except:  # not able to compute error bars
             return -1, -1, -1
 
-    def compute_alc_error_bars(self, n=10):
+    def compute_alc_error_bars(self, n=10, seed=0, num_workers=None):
         """ Return mean, std and variance of ALC score with n runs.
           n curves are created:
               For each timestamp, the value of AUC is computed from boostraps of y_true and y_pred.
               During one curve building, we keep the same boostrap index for each prediction timestamp.
+          The predictions are read once, and the curves are computed in parallel
+          (see `get_scores_bootstrap`).
 
           Args:
               n: number of times to compute the score (more means more precision)
+              seed: seed of the bootstrap samples
+              num_workers: number of processes computing the curves
           Returns:
               (mean, std, var)
       """
         try:
-            scoring_function = self.scoring_functions["nauc"]
-            solution = self.solution
+            if self.is_chunked("nauc"):
+                all_scores = get_auc_scores_bootstrap_chunked(
+                    self.solution,
+                    [self.read_prediction(f) for f in self.prediction_files_so_far],
+                    self.max_scoring_memory,
+                    n=n,
+                    seed=seed
+                )
+            else:
+                scoring_function = self.scoring_functions["nauc"]
+                solution = self.get_solution_array()
+                predictions = [read_array(f) for f in self.prediction_files_so_far]
+                all_scores = get_scores_bootstrap(
+                    scoring_function,
+                    solution,
+                    predictions,
+                    n=n,
+                    seed=seed,
+                    num_workers=num_workers
+                )
             alc_scores = []
-            for _ in range(n):  # n learning curves to compute
-                scores = []
-                size = solution.shape[0]
-                idx = np.random.randint(0, size, size)  # bootstrap index
-                for prediction_file in self.prediction_files_so_far:
-                    prediction = read_array(prediction_file)
-                    scores.append(scoring_function(solution[idx], prediction[idx]))
+            # Band of one standard deviation around the mean score of each prediction
+            mean_scores = np.mean(all_scores, axis=0)
+            std_scores = np.std(all_scores, axis=0)
+            self.score_band = (list(mean_scores - std_scores), list(mean_scores + std_scores))
+            for scores in all_scores:  # n learning curves to compute
                 # create new learning curve
                 learning_curve = LearningCurve(
                     timestamps=self.relative_timestamps,  # self.learning_curve.timestamps,
@@ -1058,32 +1429,67 @@ class Evaluator(object):
             return -1, -1, -1
 
     def score_new_predictions(self):
-        new_prediction_files = evaluator.get_new_prediction_files()
+        new_prediction_files = self.get_new_prediction_files()
         if len(new_prediction_files) > 0:
-            score = evaluator.update_score_and_learning_curve()
+            score = self.update_score_and_learning_curve()
             logger.info(
                 "[+] New prediction found. Now number of predictions " +
-                "made = {}".format(len(evaluator.prediction_files_so_far))
+                "made = {}".format(len(self.prediction_files_so_far))
             )
             logger.info(
                 "Current area under learning curve for {}: {:.4f}".format(
-                    evaluator.task_name, score
+                    self.task_name, score
                 )
             )
             logger.info(
                 "(2 * AUC - 1) of the latest prediction is {:.4f}.".format(
-                    evaluator.scores_so_far["nauc"][-1]
+                    self.scores_so_far["nauc"][-1]
                 )
             )
-            if evaluator.is_multiclass_task:
+            if self.is_multiclass_task:
                 logger.info(
                     "Accuracy of the latest prediction is {:.4f}.".format(
-                        evaluator.scores_so_far["accuracy"][-1]
+                        self.scores_so_far["accuracy"][-1]
                     )
                 )
 
+    def score_predictions_until_ingestion_ends(self, poll_interval=1):
+        """Score each new prediction as soon as it is written to the prediction
+    directory, until ingestion writes 'end.txt'. The score and the learning
+    curve are thus updated while ingestion is still running. The watcher wakes
+    the evaluator up on each written file, `poll_interval` is only the longest
+    wait between two checks of 'end.txt'.
+    """
+        while not self.end_file_generated():
+            self.score_new_predictions()
+            self.wait_for_written_files(timeout=poll_interval)
+        # Predictions written after the last wait, before 'end.txt': the watcher
+        # may not have notified them yet, so scan the whole directory
+        self.prediction_dir_scanned = False
+        self.score_new_predictions()
+
+
+def score_fn(
+    solution_dir,
+    prediction_dir,
+    score_dir,
+    wait_for_ingestion=False,
+    learning_curve_store=None,
+    run_info=None,
+    max_scoring_memory=None
+):
+    """Score the predictions of ingestion and return the ALC.
 
-def score_fn(solution_dir, prediction_dir, score_dir):
+  Args:
+    wait_for_ingestion: if True, run concurrently with ingestion: each prediction
+      is scored as soon as it is written, until ingestion writes 'end.txt'.
+      Otherwise, ingestion is assumed to be finished.
+    learning_curve_store: path of a SQLite `LearningCurveStore` to also write
+      the learning curve to, optional
+    run_info: dict describing the run in the store, see `Evaluator`
+    max_scoring_memory: if not None, score blocks of the solution and predictions
+      using about that many bytes at most, see `Evaluator`
+  """
     logger.info("=" * 5 + " Start scoring program. " + "Version: {} ".format(VERSION) + "=" * 5)
 
     logger.debug("Version: {}. Description: {}".format(VERSION, DESCRIPTION))
@@ -1094,15 +1500,27 @@ def score_fn(solution_dir, prediction_dir, score_dir):
     #################################################################
     # Initialize an evaluator (scoring program) object
     global evaluator
+    if learning_curve_store is not None:
+        learning_curve_store = LearningCurveStore(learning_curve_store)
     evaluator = Evaluator(
-        solution_dir, prediction_dir, score_dir, scoring_functions=scoring_functions
+        solution_dir,
+        prediction_dir,
+        score_dir,
+        scoring_functions=scoring_functions,
+        learning_curve_store=learning_curve_store,
+        run_info=run_info,
+        max_scoring_memory=max_scoring_memory
     )
     #################################################################
 
     ingestion_start = evaluator.ingestion_start
     time_budget = evaluator.time_budget
 
-    evaluator.score_new_predictions()
+    if wait_for_ingestion:
+        evaluator.score_predictions_until_ingestion_ends()
+    else:
+        evaluator.score_new_predictions()
+    evaluator.close()
 
     logger.info(
         "Final area under learning curve for {}: {:.4f}".format(
@@ -1110,9 +1528,6 @@ def score_fn(solution_dir, prediction_dir, score_dir):
         )
     )
 
-    # Write one last time the detailed results page without auto-refreshing
-    evaluator.write_scores_html(auto_refresh=False)
-
     # Compute scoring error bars of last prediction
     n = 10
     logger.info("Computing error bars with {} scorings...".format(n))
@@ -1133,6 +1548,10 @@ def score_fn(solution_dir, prediction_dir, score_dir):
         )
     )
 
+    # Write one last time the detailed results page without auto-refreshing,
+    # with the band of the bootstrap scores
+    evaluator.write_scores_html(auto_refresh=False)
+
     scoring_start = evaluator.start_time
     # Use 'end.txt' file to detect if ingestion program ends
     end_filepath = os.path.join(prediction_dir, "end.txt")
@@ -0,0 +1,212 @@
+"""Render learning curves as SVG images, without matplotlib.
+
+The SVG is text, so it can be written directly in the detailed results page
+(detailed_results.html) by the scoring program.
+Rendering a curve only formats its points, which takes well below a
+millisecond. Importing and rasterising with matplotlib takes far longer.
+
+The figure follows the former matplotlib figure of `plot_learning_curve`:
+step curve in transformed time (`score.transform_time`), filled area,
+dashed line from the last prediction to the end of the time budget, real
+time ticks on the top axis and the final score. An optional band, e.g. the
+standard deviation of the bootstrap scores, is drawn around the curve.
+"""
+import math
+from xml.sax.saxutils import escape
+
+try:
+    from src.competition.scoring_program.score import transform_time
+except ImportError:
+    from score import transform_time
+
+WIDTH = 640
+HEIGHT = 440
+MARGIN_LEFT = 60
+MARGIN_RIGHT = 30
+MARGIN_TOP = 70
+MARGIN_BOTTOM = 50
+AREA_COLOR = "#00ffff"
+CURVE_COLOR = "#1f77b4"
+BAND_COLOR = "#ff7f0e"
+
+
+def _steps(X, Y):
+    """Points of the step ('post') curve through (X, Y), Y[i] holds until X[i + 1]."""
+    points = []
+    for i in range(len(X)):
+        if i > 0:
+            points.append((X[i], Y[i - 1]))
+        points.append((X[i], Y[i]))
+    return points
+
+
+def _format_points(points):
+    return " ".join("{:.1f},{:.1f}".format(x, y) for x, y in points)
+
+
+def render_learning_curve_svg(
+    timestamps,
+    scores,
+    time_budget,
+    t0=60,
+    task_name=None,
+    alc=None,
+    score_band=None,
+    score_label="score (2 * AUC - 1)",
+    width=WIDTH,
+    height=HEIGHT,
+):
+    """Return an SVG image (a string) of the learning curve.
+
+  Args:
+    timestamps: list of float, increasing times of the scores relative to the
+      start of ingestion
+    scores: list of float, the score of each prediction
+    time_budget: float, the time budget of ingestion
+    t0: float, parameter of the time transformation
+    task_name: string, shown in the title, optional
+    alc: float, the area under the learning curve shown in the title, optional
+    score_band: tuple (lower, upper) of lists of float with the same length as
+      `scores`, drawn as a band around the curve, optional
+  """
+    plot_width = width - MARGIN_LEFT - MARGIN_RIGHT
+    plot_height = height - MARGIN_TOP - MARGIN_BOTTOM
+    # Failed scores (NaN) do not set the range of the axis
+    values = list(scores) + (list(score_band[0]) if score_band else [])
+    lowest = min([0] + [y for y in values if math.isfinite(y)])
+    y_min = math.floor(lowest * 5) / 5  # Multiple of the 0.2 grid step
+
+    def to_pixels(x, y):
+        return (
+            MARGIN_LEFT + x * plot_width,
+            MARGIN_TOP + (1 - (y - y_min) / (1 - y_min)) * plot_height,
+        )
+
+    X = [0] + [transform_time(t, time_budget, t0) for t in timestamps] + [1]
+    Y = [0] + list(scores)
+    Y.append(Y[-1])  # The last score holds until the end of the time budget
+    curve = [to_pixels(x, y) for x, y in _steps(X, Y)]
+
+    svg = [
+        '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+        'font-family="sans-serif" font-size="12">'.format(width, height),
+        '<rect width="100%" height="100%" fill="white"/>',
+    ]
+    title = "Learning curve for task: {}".format(task_name)
+    if alc is not None:
+        title += " (ALC={:.4f})".format(alc)
+    svg.append(
+        '<text x="{:.1f}" y="20" text-anchor="middle" font-size="14">{}</text>'.format(
+            width / 2, escape(title)
+        )
+    )
+    # Grid and score axis
+    num_y_ticks = int(round((1 - y_min) * 5))
+    for k in range(num_y_ticks + 1):
+        y = y_min + k * 0.2
+        left, pixel_y = to_pixels(0, y)
+        svg.append(
+            '<line x1="{:.1f}" y1="{:.1f}" x2="{:.1f}" y2="{:.1f}" stroke="#dddddd"/>'.format(
+                left, pixel_y, left + plot_width, pixel_y
+            )
+        )
+        svg.append(
+            '<text x="{:.1f}" y="{:.1f}" text-anchor="end">{:.1f}</text>'.format(
+                left - 6, pixel_y + 4, y
+            )
+        )
+    # Transformed time axis (bottom) and real time axis (top)
+    for k in range(6):
+        x = k * 0.2
+        pixel_x, bottom = to_pixels(x, y_min)
+        svg.append(
+            '<text x="{:.1f}" y="{:.1f}" text-anchor="middle">{:.1f}</text>'.format(
+                pixel_x, bottom + 16, x
+            )
+        )
+    real_ticks = [10, 60, 300, 600, 1200] + list(range(1800, int(time_budget) + 1, 1800))
+    for tick in real_ticks:
+        if tick > time_budget:
+            continue
+        pixel_x, _ = to_pixels(transform_time(tick, time_budget, t0), 1)
+        svg.append(
+            '<line x1="{0:.1f}" y1="{1}" x2="{0:.1f}" y2="{2}" stroke="black"/>'.format(
+                pixel_x, MARGIN_TOP - 4, MARGIN_TOP
+            ) + '<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(
+                pixel_x, MARGIN_TOP - 8, tick
+            )
+        )
+    svg.append(
+        '<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(
+            MARGIN_LEFT + plot_width / 2, height - 12,
+            escape(
+                "Transformed time: log(1 + t / t0) / log(1 + T / t0) (T = {}, t0 = {})".format(
+                    int(time_budget), int(t0)
+                )
+            )
+        )
+    )
+    svg.append(
+        '<text x="{:.1f}" y="{:.1f}" text-anchor="middle">Time (s)</text>'.format(
+            MARGIN_LEFT + plot_width / 2, MARGIN_TOP - 26
+        )
+    )
+    svg.append(
+        '<text transform="translate(14,{:.1f}) rotate(-90)" text-anchor="middle">{}</text>'.format(
+            MARGIN_TOP + plot_height / 2, escape(score_label)
+        )
+    )
+    # Area under the curve
+    origin = to_pixels(0, 0)
+    end = to_pixels(1, 0)
+    svg.append(
+        '<polygon points="{} {} {}" fill="{}" fill-opacity="0.6"/>'.format(
+            _format_points([origin]), _format_points(curve), _format_points([end]), AREA_COLOR
+        )
+    )
+    # Band around the curve
+    if score_band and len(scores) > 0:
+        lower, upper = score_band
+        X_band = X[1:]
+        upper_steps = _steps(X_band, list(upper) + [upper[-1]])
+        lower_steps = _steps(X_band, list(lower) + [lower[-1]])
+        band = [to_pixels(x, y) for x, y in upper_steps + lower_steps[::-1]]
+        svg.append(
+            '<polygon points="{}" fill="{}" fill-opacity="0.35"/>'.format(
+                _format_points(band), BAND_COLOR
+            )
+        )
+    # Curve up to the last prediction, then dashed until the end of the budget. The
+    # curve ends with (x_n, y_n), (1, y_n) and (1, y_n) as the last score holds
+    svg.append(
+        '<polyline points="{}" fill="none" stroke="{}" stroke-width="1.5"/>'.format(
+            _format_points(curve[:-2]), CURVE_COLOR
+        )
+    )
+    svg.append(
+        '<polyline points="{}" fill="none" stroke="{}" stroke-dasharray="4,3"/>'.format(
+            _format_points(curve[-3:-1]), CURVE_COLOR
+        )
+    )
+    for x, y in zip(X[1:-1], Y[1:-1]):
+        pixel_x, pixel_y = to_pixels(x, y)
+        svg.append(
+            '<circle cx="{:.1f}" cy="{:.1f}" r="2.5" fill="{}"/>'.format(
+                pixel_x, pixel_y, CURVE_COLOR
+            )
+        )
+    if len(scores) > 0:
+        pixel_x, pixel_y = to_pixels(1, Y[-1])
+        svg.append(
+            '<text x="{:.1f}" y="{:.1f}" text-anchor="end">{:.4f}</text>'.format(
+                pixel_x - 2, pixel_y - 6, Y[-1]
+            )
+        )
+    # Frame
+    svg.append(
+        '<rect x="{}" y="{}" width="{}" height="{}" fill="none" stroke="black"/>'.format(
+            MARGIN_LEFT, MARGIN_TOP, plot_width, plot_height
+        )
+    )
+    svg.append("</svg>")
+    return "\n".join(svg)
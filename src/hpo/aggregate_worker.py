@@ -15,8 +15,17 @@ from src.hpo.utils import construct_model_config
 
 
 def _run_on_dataset(
-    dataset, config_experiment_path, model_config, dataset_dir, n_repeat, time_budget,
-    time_budget_approx
+    dataset,
+    config_experiment_path,
+    model_config,
+    dataset_dir,
+    n_repeat,
+    time_budget,
+    time_budget_approx,
+    dataset_cache_dir=None,
+    concurrent_scoring=False,
+    learning_curve_store=None,
+    config_name=None
 ):
     experiment_path = config_experiment_path
     dataset_path = Path(dataset_dir, dataset)
@@ -31,7 +40,11 @@ def _run_on_dataset(
             time_budget_approx=time_budget_approx,
             overwrite=True,
             model_config_name=None,
-            model_config=model_config
+            model_config=model_config,
+            dataset_cache_dir=dataset_cache_dir,
+            concurrent_scoring=concurrent_scoring,
+            learning_curve_store=learning_curve_store,
+            run_info={"config_name": config_name}
         )
         repetition_scores.append(score)
 
@@ -140,6 +153,9 @@ class SingleWorker(Worker):
             self._default_config = yaml.safe_load(in_stream)
 
         self._dataset_dir = self._default_config["cluster_datasets_dir"]
+        self._dataset_cache_dir = self._default_config.get("dataset_cache_dir")
+        self._concurrent_scoring = self._default_config.get("concurrent_scoring", False)
+        self._learning_curve_store = self._default_config.get("learning_curve_store")
         self._working_directory = working_directory
         self.n_repeat = n_repeat
         self.dataset = dataset
@@ -158,7 +174,11 @@ class SingleWorker(Worker):
             dataset_dir=self._dataset_dir,
             n_repeat=self.n_repeat,
             time_budget=self.time_budget,
-            time_budget_approx=self.time_budget_approx
+            time_budget_approx=self.time_budget_approx,
+            dataset_cache_dir=self._dataset_cache_dir,
+            concurrent_scoring=self._concurrent_scoring,
+            learning_curve_store=self._learning_curve_store,
+            config_name=config_id_formated
         )
 
         info = {
@@ -201,6 +221,9 @@ class AggregateWorker(Worker):
             self.dataset_to_std = None
 
         self._dataset_dir = self._default_config["cluster_datasets_dir"]
+        self._dataset_cache_dir = self._default_config.get("dataset_cache_dir")
+        self._concurrent_scoring = self._default_config.get("concurrent_scoring", False)
+        self._learning_curve_store = self._default_config.get("learning_curve_store")
         self._working_directory = working_directory
         self.n_repeat = n_repeat
         self.has_repeats_as_budget = has_repeats_as_budget
@@ -228,7 +251,11 @@ class AggregateWorker(Worker):
                     dataset_dir=self._dataset_dir,
                     n_repeat=n_repeat,
                     time_budget=self.time_budget,
-                    time_budget_approx=self.time_budget_approx
+                    time_budget_approx=self.time_budget_approx,
+                    dataset_cache_dir=self._dataset_cache_dir,
+                    concurrent_scoring=self._concurrent_scoring,
+                    learning_curve_store=self._learning_curve_store,
+                    config_name=config_id_formated
                 )
             except RuntimeError:
                 repetition_scores = n_repeat * [0]
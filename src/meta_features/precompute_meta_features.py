@@ -219,17 +219,14 @@ def get_meta_features_from_dataset(dataset_path, compute_mean_histogram=True, se
 
     if compute_mean_histogram:
         try:
-            sample_count = meta_data_train.size()
-            # shuffle the first 2000 (or sample_count) elements and get 100 samples from this buffer
-            buffer = 500 if 500 < sample_count else sample_count
-            iterator = train_dataset.get_dataset().shuffle(buffer).make_one_shot_iterator()
-            next_element = iterator.get_next()
+            # Read 100 random samples directly through the record offset index
+            num_records = len(train_dataset.get_record_index())
+            indices = random.sample(range(num_records), min(100, num_records))
 
             #meta_sample = sess.run(next_element[0])
             #min, max = meta_sample.min(), meta_sample.max()
             histograms = []
-            for _ in range(100):
-                sample = sess.run(next_element[0])
+            for sample, _ in train_dataset.get_elements(indices):
                 hist = np.histogram(sample, bins=100)[0]
                 #hist = sess.run(tf.compat.v1.histogram_fixed_width(next_element[0], [min, max]))
                 histograms.append(hist)
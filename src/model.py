@@ -2,7 +2,10 @@
 AutoNLP and AutoSpeech).
 """
 
+import contextlib
+import importlib
 import logging
+from collections.abc import Mapping
 
 import numpy as np
 import tensorflow as tf
@@ -24,20 +27,50 @@ model_dirs = [
 for model_dir in model_dirs:
     sys.path.append(os.path.join(here, model_dir))
 
-from winner_cv.model import Model as AutoCVModel  # isort:skip
-from winner_nlp.model import Model as AutoNLPModel  # isort:skip
-from winner_speech.model import Model as AutoSpeechModel  # isort:skip
-from winner_tabular.model import Model as TabularModel  # isort:skip
+from numpy_converter import NumpyConverter  # isort:skip
+
+try:
+    # Spans of the ingestion timeline, only importable during ingestion
+    import tracing  # isort:skip
+except ImportError:
+    tracing = None
 
 # fmt: on
 
-DOMAIN_TO_MODEL = {
-    'image': AutoCVModel,
-    'video': AutoCVModel,
-    'text': AutoNLPModel,
-    'speech': AutoSpeechModel,
-    'tabular': TabularModel
-}
+
+class LazyModelRegistry(Mapping):
+    """Map each domain to its winner `Model` class, importing the winner's
+    package only when the domain is first looked up. The winners pull in heavy
+    dependencies (torch, Keras, librosa, jieba, sklearn) and create TF sessions
+    and threads at import time, which is charged against the time budget.
+    """
+
+    def __init__(self, domain_to_module):
+        self._domain_to_module = domain_to_module
+        self._models = {}
+
+    def __getitem__(self, domain):
+        if domain not in self._models:
+            module = importlib.import_module(self._domain_to_module[domain])
+            self._models[domain] = module.Model
+        return self._models[domain]
+
+    def __iter__(self):
+        return iter(self._domain_to_module)
+
+    def __len__(self):
+        return len(self._domain_to_module)
+
+
+DOMAIN_TO_MODEL = LazyModelRegistry(
+    {
+        'image': 'winner_cv.model',  # AutoCV/AutoCV2 winner model
+        'video': 'winner_cv.model',
+        'text': 'winner_nlp.model',  # AutoNLP 2nd place winner
+        'speech': 'winner_speech.model',  # AutoSpeech winner
+        'tabular': 'winner_tabular.model'  # simple NN model
+    }
+)
 
 
 class Model():
@@ -107,16 +140,18 @@ class Model():
 
     def to_numpy(self, dataset, is_training):
         """Given the TF dataset received by `train` or `test` method, compute two
-        lists of NumPy arrays: `X_train`, `Y_train` for `train` and `X_test`,
+        sequences of NumPy arrays: `X_train`, `Y_train` for `train` and `X_test`,
         `Y_test` for `test`. Although `Y_test` will always be an
         all-zero matrix, since the test labels are not revealed in `dataset`.
-        The computed two lists will by memorized as object attribute:
+        The computed two sequences will by memorized as object attribute:
           self.X_train
           self.Y_train
         or
           self.X_test
           self.Y_test
         according to `is_training`.
+        The examples are fetched by batches with `NumpyConverter` and, when they
+        all have the same shape, written into one preallocated array.
         WARNING: since this method will load all data in memory, it's possible to
           cause Out Of Memory (OOM) error, especially for large datasets (e.g.
           video/image datasets).
@@ -125,12 +160,10 @@ class Model():
             or `self.test`.
           is_training: boolean, indicates whether it concerns the training set.
         Returns:
-          two lists of NumPy arrays, for features and labels respectively. If the
-            examples all have the same shape, they can be further converted to
-            NumPy arrays by:
-              X = np.array(X)
-              Y = np.array(Y)
-            And in this case, `X` will be of shape
+          two sequences of NumPy arrays, for features and labels respectively.
+            `Y` is an array. `X` is an array if the examples all have the same
+            shape, else a list of arrays. `np.array(X)` and `np.array(Y)` can be
+            used in both cases. When the examples have the same shape, `X` will be of shape
               [num_examples, sequence_size, row_count, col_count, num_channels]
             and `Y` will be of shape
               [num_examples, num_classes]
@@ -143,19 +176,23 @@ class Model():
         attr_Y = 'Y_{}'.format(subset)
 
         # Only iterate the TF dataset when it's not done yet
+        # Datasets read from a dataset cache (see dataset_cache.py) are already
+        # decoded on disk: use memory-mapped views instead of one sess.run per example
+        cache = getattr(dataset, 'autodl_cache', None)
         if not (hasattr(self, attr_X) and hasattr(self, attr_Y)):
-            iterator = dataset.make_one_shot_iterator()
-            next_element = iterator.get_next()
-            X = []
-            Y = []
-            with tf.Session(config=tf.ConfigProto(log_device_placement=False)) as sess:
-                while True:
-                    try:
-                        example, labels = sess.run(next_element)
-                        X.append(example)
-                        Y.append(labels)
-                    except tf.errors.OutOfRangeError:
-                        break
+            if tracing is not None:
+                span = tracing.span('dataset_iteration', subset=subset)
+            else:
+                span = contextlib.suppress()  # Empty context manager
+            with span:
+                if cache is not None:
+                    X, Y = cache.to_numpy()
+                else:
+                    # Batched conversion, sharing one session between train and test
+                    if not hasattr(self, 'numpy_converter'):
+                        self.numpy_converter = NumpyConverter()
+                    num_examples = self.metadata.size() if is_training else None
+                    X, Y = self.numpy_converter.convert(dataset, num_examples=num_examples)
             setattr(self, attr_X, X)
             setattr(self, attr_Y, Y)
         X = getattr(self, attr_X)
@@ -201,6 +238,8 @@ class Model():
                 # Construct the corpus
                 corpus = []
                 for x in X:  # each x in X is a list of indices (but as float)
+                    if isinstance(x, tf.SparseTensorValue):  # AutoDLDataset(keep_sparse=True)
+                        x = sparse_to_token_indices(x)
                     tokens = [index_to_token[int(i)] for i in x]
                     document = sep.join(tokens)
                     corpus.append(document)
@@ -264,6 +303,15 @@ def infer_domain(metadata):
     return domain
 
 
+def sparse_to_token_indices(sparse_value):
+    """Return the token indices of a text example kept sparse, i.e. a
+    SparseTensorValue of dense shape [sequence_size, 1, 1, vocabulary_size]
+    with one token per time step, in the order of the sequence.
+    """
+    order = np.argsort(sparse_value.indices[:, 0], kind='stable')
+    return sparse_value.indices[order, 3]
+
+
 def is_chinese(metadata):
     """Judge if the dataset is a Chinese NLP dataset. The current criterion is if
     each word in the vocabulary contains one single character, because when the
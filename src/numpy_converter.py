@@ -0,0 +1,153 @@
+"""Bulk conversion of AutoDL `tf.data` datasets to NumPy.
+
+Examples are fetched by large batches (one `sess.run` per batch instead of per
+example) and written into arrays that grow geometrically, so the data is
+copied once instead of being held in lists of small arrays. Datasets whose
+example shape is not fully defined (e.g. speech or text, where the sequence
+size varies) are padded per batch, trimmed back to their true shape, and kept
+in one flat ragged buffer from which each example is a view.
+"""
+import numpy as np
+import tensorflow as tf
+
+
+class GrowableArray(object):
+    """Preallocated array along the first axis, doubling when full."""
+
+    def __init__(self, item_shape, dtype, capacity=1024):
+        self._data = np.empty((max(capacity, 1), ) + tuple(item_shape), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values):
+        end = self._size + len(values)
+        if end > len(self._data):
+            new_capacity = max(end, 2 * len(self._data))
+            data = np.empty((new_capacity, ) + self._data.shape[1:], dtype=self._data.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        self._data[self._size:end] = values
+        self._size = end
+
+    def finish(self):
+        """Return the filled part, releasing the unused capacity."""
+        if self._size < len(self._data):
+            self._data = self._data[:self._size].copy()
+        return self._data
+
+
+class RaggedBuffer(object):
+    """Examples of different shapes stored in one flat buffer."""
+
+    def __init__(self, dtype, capacity=1024):
+        self._values = GrowableArray((), dtype, capacity)
+        self._shapes = []
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def append(self, value):
+        self._values.extend(value.ravel())
+        self._shapes.append(value.shape)
+
+    def finish(self):
+        """Return the list of examples, as views on the flat buffer."""
+        values = self._values.finish()
+        examples = []
+        start = 0
+        for shape in self._shapes:
+            end = start + int(np.prod(shape))
+            examples.append(values[start:end].reshape(shape))
+            start = end
+        return examples
+
+
+class NumpyConverter(object):
+    """Convert datasets of `(example, labels)` pairs to NumPy, reusing one
+  session for all the datasets of a graph (e.g. train and test).
+
+  Args:
+    batch_size: number of examples fetched per `sess.run`.
+  """
+
+    def __init__(self, batch_size=128):
+        self.batch_size = batch_size
+        self._session = None
+
+    def _get_session(self):
+        graph = tf.get_default_graph()
+        if self._session is None or self._session.graph is not graph:
+            self.close()
+            self._session = tf.Session(
+                graph=graph, config=tf.ConfigProto(log_device_placement=False)
+            )
+        return self._session
+
+    def convert(self, dataset, num_examples=None):
+        """Read the whole dataset.
+
+    Args:
+      dataset: a `tf.data.Dataset` of `(example, labels)` pairs.
+      num_examples: expected number of examples, used to preallocate the arrays.
+    Returns:
+      `X, Y` in the format of `Model.to_numpy`. `Y` is an array of shape
+        [num_examples, num_classes]. `X` is an array of shape
+        [num_examples] + example shape if the example shape is fully defined,
+        else a list of arrays.
+    """
+        if dataset.output_classes[0] is tf.SparseTensor:
+            return self._convert_per_example(dataset)
+        example_shape, labels_shape = dataset.output_shapes
+        example_type, labels_type = dataset.output_types
+        capacity = num_examples or 8 * self.batch_size
+        labels = GrowableArray(labels_shape.as_list(), labels_type.as_numpy_dtype, capacity)
+        ragged = not example_shape.is_fully_defined()
+        if ragged:
+            # Keep the true shape of each example to trim the padding of the batch
+            dataset = dataset.map(lambda example, label: (example, label, tf.shape(example)))
+            dataset = dataset.padded_batch(
+                self.batch_size, dataset.output_shapes, drop_remainder=False
+            )
+            # Rough capacity: the flat buffer holds at least one value per example
+            examples = RaggedBuffer(example_type.as_numpy_dtype, capacity)
+        else:
+            dataset = dataset.batch(self.batch_size)
+            examples = GrowableArray(
+                example_shape.as_list(), example_type.as_numpy_dtype, capacity
+            )
+        next_batch = dataset.make_one_shot_iterator().get_next()
+        sess = self._get_session()
+        while True:
+            try:
+                batch = sess.run(next_batch)
+            except tf.errors.OutOfRangeError:
+                break
+            labels.extend(batch[1])
+            if ragged:
+                for padded, shape in zip(batch[0], batch[2]):
+                    examples.append(padded[tuple(slice(0, size) for size in shape)])
+            else:
+                examples.extend(batch[0])
+        return examples.finish(), labels.finish()
+
+    def _convert_per_example(self, dataset):
+        """Fallback for sparse examples, which can not be padded into batches."""
+        next_element = dataset.make_one_shot_iterator().get_next()
+        sess = self._get_session()
+        X = []
+        Y = []
+        while True:
+            try:
+                example, labels = sess.run(next_element)
+            except tf.errors.OutOfRangeError:
+                break
+            X.append(example)
+            Y.append(labels)
+        return X, np.array(Y)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
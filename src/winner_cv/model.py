@@ -21,11 +21,37 @@ from sklearn.svm import SVC, NuSVC
 from sklearn.ensemble import RandomForestClassifier as RF
 from sklearn.linear_model import LogisticRegression as LR
 
-torch.backends.cudnn.benchmark = True
-threads = [
-    threading.Thread(target=lambda: torch.cuda.synchronize()),
-    threading.Thread(target=lambda: tf.Session())
-]
+# 'cuda' or 'cpu', e.g. to run, profile and test the AutoCV loop on machines without GPU.
+# On CPU, torch and TF run each op with AUTOCV_INTRA_OP_THREADS threads (all CPUs by
+# default) and up to AUTOCV_INTER_OP_THREADS ops in parallel, for a predictable throughput.
+DEVICE = os.environ.get('AUTOCV_DEVICE', 'cuda' if torch.cuda.is_available() else 'cpu')
+INTRA_OP_THREADS = int(os.environ.get('AUTOCV_INTRA_OP_THREADS', os.cpu_count() or 1))
+INTER_OP_THREADS = int(os.environ.get('AUTOCV_INTER_OP_THREADS', 1))
+
+
+def get_session_config():
+    if DEVICE == 'cuda':
+        return None
+    return tf.ConfigProto(
+        intra_op_parallelism_threads=INTRA_OP_THREADS,
+        inter_op_parallelism_threads=INTER_OP_THREADS,
+        device_count={'GPU': 0}
+    )
+
+
+if DEVICE == 'cuda':
+    torch.backends.cudnn.benchmark = True
+    threads = [
+        threading.Thread(target=lambda: torch.cuda.synchronize()),
+        threading.Thread(target=lambda: tf.Session())
+    ]
+else:
+    torch.set_num_threads(INTRA_OP_THREADS)
+    try:
+        torch.set_num_interop_threads(INTER_OP_THREADS)
+    except RuntimeError:  # Only possible before the first parallel work
+        pass
+    threads = [threading.Thread(target=lambda: tf.Session(config=get_session_config()))]
 [t.start() for t in threads]
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
@@ -61,8 +87,9 @@ class Model(LogicModel):
         LOGGER.info('[init] session')
         [t.join() for t in threads]
 
-        self.device = torch.device('cuda', 0)
-        self.session = tf.Session()
+        self.device = torch.device('cuda', 0) if DEVICE == 'cuda' else torch.device('cpu')
+        self.session = tf.Session(config=get_session_config())
+        LOGGER.info('[init] device: %s', self.device)
 
         LOGGER.info('[init] Model')
         Network = eval(
@@ -87,7 +114,8 @@ class Model(LogicModel):
         LOGGER.info('[init] copy to device')
         self.model = self.model.to(device=self.device, non_blocking=True)  #.half()
         self.model_pred = self.model_pred.to(device=self.device, non_blocking=True)  #.half()
-        self.is_half = self.model._half
+        # Half precision kernels are CUDA only
+        self.is_half = self.model._half and self.device.type == 'cuda'
         # torch.cuda.synchronize()
 
         LOGGER.info('[init] done.')
@@ -236,47 +264,73 @@ class Model(LogicModel):
             self.update_transforms = True
             self.info['terminate'] = True
 
-            original_valid_policy = self.dataloaders['valid'].dataset.transform.transforms
             policy = skeleton.data.augmentations.autoaug_policy()
 
             num_policy_search = 100
             num_sub_policy = 3
             num_select_policy = 5
-            searched_policy = []
+            selected_policies = []
             for policy_search in range(num_policy_search):
                 selected_idx = np.random.choice(list(range(len(policy))), num_sub_policy)
-                selected_policy = [policy[i] for i in selected_idx]
-
-                self.dataloaders['valid'].dataset.transform.transforms = original_valid_policy + [
-                    lambda t: t.cpu().float() if isinstance(t, torch.Tensor) else torch.Tensor(t),
-                    tv.transforms.ToPILImage(),
-                    skeleton.data.augmentations.Augmentation(selected_policy),
-                    tv.transforms.ToTensor(),
-                    lambda t: t.to(device=self.device)  #.half()
-                ]
-
-                metrics = []
-                for policy_eval in range(num_sub_policy * 2):
-                    valid_dataloader = self.build_or_get_dataloader(
-                        'valid', self.datasets['valid'], self.datasets['num_valids']
-                    )
-                    # original_valid_batch_size = valid_dataloader.batch_sampler.batch_size
-                    # valid_dataloader.batch_sampler.batch_size = batch_size
+                selected_policies.append([policy[i] for i in selected_idx])
+
+            # Each policy is evaluated on num_sub_policy * 2 valid passes. With
+            # fast_auto_aug_budget (in valid passes), successive halving evaluates all
+            # of them on fewer batches and only the best ones on more.
+            budget = self.hyper_params['conditions'].get('fast_auto_aug_budget')
+            valid_dataloader = self.build_or_get_dataloader(
+                'valid', self.datasets['valid'], self.datasets['num_valids']
+            )
+            num_valid_steps = len(valid_dataloader)
+            search = skeleton.data.SuccessiveHalving(
+                num_policy_search,
+                max_steps=num_sub_policy * 2 * num_valid_steps,
+                eta=self.hyper_params['conditions'].get('fast_auto_aug_eta', 3),
+                num_select=num_select_policy,
+                budget=None if budget is None else budget * num_valid_steps
+            )
+            LOGGER.info(
+                '[adapt] [FAA] rungs (policies, valid steps): %s, %.1f valid passes',
+                search.rungs, search.cost / float(num_valid_steps)
+            )
 
-                    valid_metrics = self.epoch_valid(
-                        self.info['loop']['epoch'], valid_dataloader, reduction='max'
+            dataloaders, searched_metrics = {}, {}
+
+            def evaluate(index, steps):
+                if index not in dataloaders:
+                    # The valid set is on the device already, augment whole batches there
+                    # (same images as the PIL operations, see batch_augmentations.py)
+                    dataloaders[index] = skeleton.data.TransformDataLoader(
+                        valid_dataloader,
+                        skeleton.data.batch_augmentations.BatchAugmentation(
+                            selected_policies[index]
+                        )
                     )
+                dataloaders[index].steps = steps
+                valid_metrics = self.epoch_valid(
+                    self.info['loop']['epoch'], dataloaders[index], reduction='max'
+                )
+                metrics = searched_metrics.setdefault(index, [])
+                metrics.append(valid_metrics)
+                return {
+                    'loss': np.max([m['loss'] for m in metrics]),
+                    'score': np.max([m['score'] for m in metrics]),
+                }
 
-                    # valid_dataloader.batch_sampler.batch_size = original_valid_batch_size
-                    metrics.append(valid_metrics)
-                loss = np.max([m['loss'] for m in metrics])
-                score = np.max([m['score'] for m in metrics])
+            searched_policy = []
+            for index, metrics in search.run(evaluate):
                 LOGGER.info(
-                    '[adapt] [FAA] [%02d/%02d] score: %f, loss: %f, selected_policy: %s',
-                    policy_search, num_policy_search, score, loss, selected_policy
+                    '[adapt] [FAA] [%02d/%02d] score: %f, loss: %f, selected_policy: %s', index,
+                    num_policy_search, metrics['score'], metrics['loss'], selected_policies[index]
                 )
-
-                searched_policy.append({'loss': loss, 'score': score, 'policy': selected_policy})
+                searched_policy.append(
+                    {
+                        'loss': metrics['loss'],
+                        'score': metrics['score'],
+                        'policy': selected_policies[index]
+                    }
+                )
+            dataloaders.clear()
 
             flatten = lambda l: [item for sublist in l for item in sublist]
 
@@ -295,16 +349,20 @@ class Model(LogicModel):
                     [searched_policy[idx]['score'] for idx in policy_sorted_index]
                 )
 
-                original_train_policy = self.dataloaders['train'].dataset.transform.transforms
-                self.dataloaders['train'].dataset.transform.transforms = original_train_policy + [
+                train_dataloader = self.dataloaders['train']
+                original_train_policy = train_dataloader.dataset.transform.transforms
+                train_policy = original_train_policy + [
                     lambda t: t.cpu().float() if isinstance(t, torch.Tensor) else torch.Tensor(t),
                     tv.transforms.ToPILImage(),
                     skeleton.data.augmentations.Augmentation(policy),
                     tv.transforms.ToTensor(),
-                    lambda t: t.to(device=self.device)  #.half()
                 ]
-
-            self.dataloaders['valid'].dataset.transform.transforms = original_valid_policy
+                # Worker processes cannot use CUDA, epoch_train moves their batches
+                if train_dataloader.num_workers == 0:
+                    train_policy.append(lambda t: t.to(device=self.device))  #.half()
+                train_dataloader.dataset.transform.transforms = train_policy
+                # Restart the workers with the new transforms
+                train_dataloader.reset()
 
             # reset optimizer pararms
             # self.model.init()
@@ -510,12 +568,13 @@ class Model(LogicModel):
                 best_loss = self.checkpoints[best_idx]['valid']['loss']
                 best_score = self.checkpoints[best_idx]['valid']['score']
 
-                states = self.checkpoints[best_idx]['model']
+                states = self.checkpoint_pool.state_dict(self.checkpoints[best_idx]['model'])
                 model.load_state_dict(states)
                 LOGGER.info(
                     'best checkpoints at %d/%d (valid loss:%f score:%f) tau:%f', best_idx + 1,
                     len(self.checkpoints), best_loss, best_score, tau
                 )
+                LOGGER.info('[checkpoints] %s', self.checkpoint_pool.summary())
 
         num_step = len(dataloader) if num_step is None else num_step
 
@@ -2,8 +2,11 @@
 # pylint: disable=wildcard-import
 from __future__ import absolute_import
 
-from . import augmentations
-from .dataloader import FixedSizeDataLoader, InfiniteSampler, PrefetchDataLoader
-from .dataset import TFDataset, TransformDataset, prefetch_dataset
+from . import augmentations, batch_augmentations
+from .dataloader import (
+    FixedSizeDataLoader, InfiniteSampler, PrefetchDataLoader, TransformDataLoader, seed_worker
+)
+from .dataset import TFDataset, TransformDataset, prefetch_dataset, share_dataset
+from .policy_search import SuccessiveHalving
 from .stratified_sampler import StratifiedSampler
 from .transforms import *
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""Batched tensor versions of the Fast AutoAugment operations of `augmentations.py`.
+
+`augmentations.Augmentation` converts each example to a PIL image, applies the
+policy and converts it back to a tensor. `BatchAugmentation` applies the same
+policies to a whole batch of images (N, C, H, W), C being 1 or 3, with values in
+[0, 1], on the device of the batch. The images are the ones of the PIL
+operations: the batch is quantized to 8 bits like `ToPILImage`, each operation
+reproduces the arithmetic of PIL (nearest neighbour affine transforms in 16.16
+fixed point, lookup tables, blending in single precision) and the levels are
+scaled back like `ToTensor`. See src/benchmarks/batch_augmentations.py for the
+parity checks.
+
+The operations take a batch of levels (floats 0, 1, ..., 255) and the value of
+the operation, and draw their random parameters (mirroring, cutout position) for
+each example with the torch random number generator.
+"""
+from __future__ import absolute_import
+
+import math
+
+import PIL.Image
+import PIL.ImageOps
+import torch
+
+from . import augmentations
+
+CUTOUT_COLOR = (125, 123, 114)
+
+
+def _equalize_divisor():
+    """`ImageOps.equalize` divides the number of pixels by 256, and by 255 since Pillow 9."""
+    image = PIL.Image.frombytes('L', (256, 2), bytes(bytearray(range(256))) * 2)
+    return 255 if PIL.ImageOps.equalize(image).getpixel((1, 0)) == 1 else 256
+
+
+EQUALIZE_DIVISOR = _equalize_divisor()
+
+
+def to_levels(tensor):
+    """Quantize images with values in [0, 1] to 8 bits, as `ToPILImage`."""
+    return tensor.float().mul(255).clamp(0, 255).trunc()
+
+
+def to_tensor(levels):
+    """Scale levels back to [0, 1], as `ToTensor`."""
+    return levels.div(255)
+
+
+def blend(levels1, levels2, alpha):
+    """`Image.blend`, levels1 + alpha * (levels2 - levels1) in single precision."""
+    alpha = torch.tensor(alpha, dtype=torch.float32, device=levels2.device)
+    return (levels1 + alpha * (levels2 - levels1)).trunc().clamp(0, 255)
+
+
+def grayscale(levels):
+    """`Image.convert('L')`, as levels of shape (N, 1, H, W)."""
+    if levels.size(1) == 1:
+        return levels
+    rgb = levels.double()
+    luminance = rgb[:, 0:1] * 19595 + rgb[:, 1:2] * 38470 + rgb[:, 2:3] * 7471 + 32768
+    return torch.floor(luminance / 65536).float()
+
+
+def _random_signs(num_examples, mirror=True):
+    """The sign of the value of each example, negative with probability 0.5."""
+    if not mirror:
+        return [1.0] * num_examples
+    return [-1.0 if flip else 1.0 for flip in (torch.rand(num_examples) > 0.5).tolist()]
+
+
+def affine(levels, coefficients):
+    """`Image.transform(size, Image.AFFINE, data)` of each image with nearest neighbour
+  sampling, the pixels from outside the images are black.
+
+  Args:
+    coefficients: list of the 6 coefficients (a, b, c, d, e, f) of each image, the
+      pixel (x, y) is taken from (a * x + b * y + c, d * x + e * y + f).
+  """
+    num_examples, channels, height, width = levels.shape
+    parameters = []
+    for a in coefficients:
+        if a[1] == 0 and a[3] == 0:
+            # PIL scales and translates with doubles (ImagingScaleAffine)
+            parameters.append(
+                (a[2] + a[0] * 0.5, a[0], 0.0, a[5] + a[4] * 0.5, 0.0, a[4], 1.0)
+            )
+        else:
+            # and uses 16.16 fixed point otherwise (affine_fixed)
+            def fix(v):
+                return math.floor(v * 65536.0 + 0.5)
+
+            parameters.append(
+                (
+                    fix(a[2] + a[0] * 0.5 + a[1] * 0.5), fix(a[0]), fix(a[1]),
+                    fix(a[5] + a[3] * 0.5 + a[4] * 0.5), fix(a[3]), fix(a[4]), 65536.0
+                )
+            )
+    p = torch.tensor(parameters, dtype=torch.float64, device=levels.device)
+    p = p.view(num_examples, 7, 1, 1)
+    xs = torch.arange(width, dtype=torch.float64, device=levels.device).view(1, 1, width)
+    ys = torch.arange(height, dtype=torch.float64, device=levels.device).view(1, height, 1)
+    x_in = torch.floor((p[:, 0] + xs * p[:, 1] + ys * p[:, 2]) / p[:, 6])
+    y_in = torch.floor((p[:, 3] + xs * p[:, 4] + ys * p[:, 5]) / p[:, 6])
+    inside = (x_in >= 0) & (x_in < width) & (y_in >= 0) & (y_in < height)
+    index = y_in.clamp(0, height - 1) * width + x_in.clamp(0, width - 1)
+    index = index.long().view(num_examples, 1, height * width).expand(-1, channels, -1)
+    transformed = levels.reshape(num_examples, channels, height * width).gather(2, index)
+    transformed = transformed.view(num_examples, channels, height, width)
+    return transformed * inside.unsqueeze(1).to(dtype=levels.dtype)
+
+
+def rotation(angle, width, height):
+    """The affine coefficients of `Image.rotate(angle)`, None for no rotation."""
+    angle = angle % 360.0
+    if angle == 0:
+        return None
+    center = [width / 2, height / 2]
+    angle = -math.radians(angle)
+    matrix = [
+        round(math.cos(angle), 15),
+        round(math.sin(angle), 15), 0.0,
+        round(-math.sin(angle), 15),
+        round(math.cos(angle), 15), 0.0
+    ]
+    a, b, c, d, e, f = matrix
+    x, y = -center[0] - 0, -center[1] - 0
+    matrix[2], matrix[5] = a * x + b * y + c, d * x + e * y + f
+    matrix[2] += center[0]
+    matrix[5] += center[1]
+    return matrix
+
+
+def cutout(levels, boxes, color=CUTOUT_COLOR):
+    """`ImageDraw.rectangle(box, color)` on each image.
+
+  Args:
+    boxes: list of the (x0, y0, x1, y1) rectangle of each image, inclusive
+  """
+    num_examples, channels, height, width = levels.shape
+    boxes = torch.tensor(boxes, dtype=torch.float64, device=levels.device).trunc()
+    boxes = boxes.view(num_examples, 4, 1, 1)
+    xs = torch.arange(width, dtype=torch.float64, device=levels.device).view(1, 1, width)
+    ys = torch.arange(height, dtype=torch.float64, device=levels.device).view(1, height, 1)
+    inside = (xs >= boxes[:, 0]) & (xs <= boxes[:, 2]) & (ys >= boxes[:, 1]) & \
+        (ys <= boxes[:, 3])
+    # Images of 1 channel are filled with the first component
+    color = torch.tensor(color[:channels], dtype=levels.dtype, device=levels.device)
+    return torch.where(inside.unsqueeze(1), color.view(1, channels, 1, 1), levels)
+
+
+def _lookup(levels, table):
+    """Map the levels of each image and channel with its table of 256 levels."""
+    num_examples, channels, height, width = levels.shape
+    index = levels.long().view(num_examples * channels, height * width)
+    table = table.view(-1, 256).expand(num_examples * channels, 256).to(dtype=levels.dtype)
+    return table.gather(1, index).view(num_examples, channels, height, width)
+
+
+def _histograms(levels):
+    """The histogram of each image and channel, shape (N * C, 256)."""
+    num_examples, channels, height, width = levels.shape
+    index = levels.long().view(num_examples * channels, height * width)
+    histograms = torch.zeros(
+        num_examples * channels, 256, dtype=torch.float64, device=levels.device
+    )
+    return histograms.scatter_add_(1, index, torch.ones_like(index, dtype=torch.float64))
+
+
+def ShearX(levels, v):  # [-0.3, 0.3]
+    assert -0.3 <= v <= 0.3
+    signs = _random_signs(len(levels), augmentations.random_mirror)
+    return affine(levels, [(1, s * v, 0, 0, 1, 0) for s in signs])
+
+
+def ShearY(levels, v):  # [-0.3, 0.3]
+    assert -0.3 <= v <= 0.3
+    signs = _random_signs(len(levels), augmentations.random_mirror)
+    return affine(levels, [(1, 0, 0, s * v, 1, 0) for s in signs])
+
+
+def TranslateX(levels, v):  # [-150, 150] => percentage: [-0.45, 0.45]
+    assert -0.45 <= v <= 0.45
+    signs = _random_signs(len(levels), augmentations.random_mirror)
+    return affine(levels, [(1, 0, s * v * levels.size(3), 0, 1, 0) for s in signs])
+
+
+def TranslateY(levels, v):  # [-150, 150] => percentage: [-0.45, 0.45]
+    assert -0.45 <= v <= 0.45
+    signs = _random_signs(len(levels), augmentations.random_mirror)
+    return affine(levels, [(1, 0, 0, 0, 1, s * v * levels.size(2)) for s in signs])
+
+
+def TranslateXAbs(levels, v):  # [-150, 150] => percentage: [-0.45, 0.45]
+    assert 0 <= v <= 10
+    signs = _random_signs(len(levels))
+    return affine(levels, [(1, 0, s * v, 0, 1, 0) for s in signs])
+
+
+def TranslateYAbs(levels, v):  # [-150, 150] => percentage: [-0.45, 0.45]
+    assert 0 <= v <= 10
+    signs = _random_signs(len(levels))
+    return affine(levels, [(1, 0, 0, 0, 1, s * v) for s in signs])
+
+
+def Rotate(levels, v):  # [-30, 30]
+    assert -30 <= v <= 30
+    signs = _random_signs(len(levels), augmentations.random_mirror)
+    height, width = levels.shape[2:]
+    coefficients = [rotation(s * v, width, height) for s in signs]
+    return affine(levels, [(1, 0, 0, 0, 1, 0) if c is None else c for c in coefficients])
+
+
+def AutoContrast(levels, _):
+    num_examples, channels, height, width = levels.shape
+    values = levels.double().view(num_examples * channels, height * width)
+    lo = values.min(1, keepdim=True)[0]
+    hi = values.max(1, keepdim=True)[0]
+    scale = 255.0 / (hi - lo).clamp(min=1)
+    offset = -lo * scale
+    contrasted = torch.where(hi > lo, (values * scale + offset).trunc().clamp(0, 255), values)
+    return contrasted.to(dtype=levels.dtype).view(levels.shape)
+
+
+def Invert(levels, _):
+    return 255 - levels
+
+
+def Equalize(levels, _):
+    histograms = _histograms(levels)
+    num_levels = (histograms > 0).sum(1, keepdim=True)
+    highest = levels.reshape(histograms.size(0), -1).max(1, keepdim=True)[0].long()
+    step = histograms.sum(1, keepdim=True) - histograms.gather(1, highest)
+    step = torch.floor(step / EQUALIZE_DIVISOR)
+    # Number of pixels below each level, n starts at step // 2
+    below = torch.cumsum(histograms, 1) - histograms + torch.floor(step / 2)
+    table = torch.floor(below / step.clamp(min=1)).clamp(max=255)
+    identity = torch.arange(256, dtype=torch.float64, device=levels.device).view(1, 256)
+    table = torch.where((num_levels <= 1) | (step == 0), identity.expand_as(table), table)
+    return _lookup(levels, table)
+
+
+def Solarize(levels, v):  # [0, 256]
+    assert 0 <= v <= 256
+    return torch.where(levels < v, levels, 255 - levels)
+
+
+def Posterize(levels, v):  # [4, 8]
+    assert 4 <= v <= 8
+    shift = 2**(8 - int(v))
+    return torch.floor(levels / shift) * shift
+
+
+def Posterize2(levels, v):  # [0, 4]
+    assert 0 <= v <= 4
+    shift = 2**(8 - int(v))
+    return torch.floor(levels / shift) * shift
+
+
+def Contrast(levels, v):  # [0.1,1.9]
+    assert 0.1 <= v <= 1.9
+    gray = grayscale(levels).double()
+    mean = gray.view(len(levels), -1).sum(1) / gray[0].numel()
+    degenerate = torch.floor(mean + 0.5).float().view(-1, 1, 1, 1)
+    return blend(degenerate, levels, v)
+
+
+def Color(levels, v):  # [0.1,1.9]
+    assert 0.1 <= v <= 1.9
+    return blend(grayscale(levels), levels, v)
+
+
+def Brightness(levels, v):  # [0.1,1.9]
+    assert 0.1 <= v <= 1.9
+    return blend(torch.zeros_like(levels), levels, v)
+
+
+def Sharpness(levels, v):  # [0.1,1.9]
+    assert 0.1 <= v <= 1.9
+    # ImageFilter.SMOOTH: kernel 1 1 1, 1 5 1, 1 1 1 normalized in single precision,
+    # rounded, the borders are kept
+    one = torch.tensor(1.0, dtype=torch.float32) / torch.tensor(13.0, dtype=torch.float32)
+    five = torch.tensor(5.0, dtype=torch.float32) / torch.tensor(13.0, dtype=torch.float32)
+    one, five = one.to(device=levels.device), five.to(device=levels.device)
+
+    def row(r, center):
+        return r[..., :-2] * one + r[..., 1:-1] * center + r[..., 2:] * one
+
+    smooth = 0.5 + row(levels[:, :, 2:], one)
+    smooth = smooth + row(levels[:, :, 1:-1], five)
+    smooth = smooth + row(levels[:, :, :-2], one)
+    degenerate = levels.clone()
+    degenerate[:, :, 1:-1, 1:-1] = smooth.trunc().clamp(0, 255)
+    return blend(degenerate, levels, v)
+
+
+def Cutout(levels, v):  # [0, 60] => percentage: [0, 0.2]
+    assert 0.0 <= v <= 0.2
+    if v <= 0.:
+        return levels
+    v = v * levels.size(3)
+    return CutoutAbs(levels, v)
+
+
+def CutoutAbs(levels, v):  # [0, 60] => percentage: [0, 0.2]
+    if v < 0:
+        return levels
+    height, width = levels.shape[2:]
+    # As np.random.uniform(w) of the PIL operation, i.e. between 1 and w
+    x0s = (width + (1 - width) * torch.rand(len(levels), dtype=torch.float64)).tolist()
+    y0s = (height + (1 - height) * torch.rand(len(levels), dtype=torch.float64)).tolist()
+    boxes = []
+    for x0, y0 in zip(x0s, y0s):
+        x0 = int(max(0, x0 - v / 2.))
+        y0 = int(max(0, y0 - v / 2.))
+        boxes.append((x0, y0, min(width, x0 + v), min(height, y0 + v)))
+    return cutout(levels, boxes)
+
+
+def SamplePairing(levels, v):  # [0, 0.4]
+    """Blend each image with another image of the batch, drawn at random."""
+    others = torch.randint(len(levels), (len(levels), ), device=levels.device)
+    return blend(levels, levels[others], v)
+
+
+def augment_list(for_autoaug=True):
+    """The operations of `augmentations.augment_list`, with their ranges."""
+    operations = {fn.__name__: fn for fn in BATCH_OPERATIONS}
+    return [
+        (operations[fn.__name__], low, high)
+        for fn, low, high in augmentations.augment_list(for_autoaug=for_autoaug)
+    ]
+
+
+BATCH_OPERATIONS = [
+    ShearX, ShearY, TranslateX, TranslateY, Rotate, AutoContrast, Invert, Equalize, Solarize,
+    Posterize, Contrast, Color, Brightness, Sharpness, Cutout, CutoutAbs, Posterize2,
+    TranslateXAbs, TranslateYAbs
+]
+
+augment_dict = {fn.__name__: (fn, v1, v2) for fn, v1, v2 in augment_list()}
+augment_dict[SamplePairing.__name__] = (SamplePairing, 0, 0.4)
+
+
+def apply_augment(levels, name, level):
+    augment_fn, low, high = augment_dict[name]
+    return augment_fn(levels, level * (high - low) + low)
+
+
+class BatchAugmentation(object):
+    """`augmentations.Augmentation` of each image of a batch: one of the `policies` is
+  drawn for each image and each of its operations is applied with its probability.
+  """
+
+    def __init__(self, policies):
+        self.policies = policies
+
+    def __call__(self, batch):
+        levels = to_levels(batch)
+        num_examples = len(levels)
+        chosen = torch.randint(len(self.policies), (num_examples, ))
+        for i, policy in enumerate(self.policies):
+            selected = chosen == i
+            for name, pr, level in policy:
+                # The PIL operation is skipped if random.random() > pr
+                applied = (selected & (torch.rand(num_examples) <= pr)).nonzero().view(-1)
+                if len(applied) == 0:
+                    continue
+                applied = applied.to(device=levels.device)
+                levels[applied] = apply_augment(levels[applied], name, level)
+        return to_tensor(levels)
@@ -2,7 +2,9 @@
 from __future__ import absolute_import
 
 import logging
+import random
 
+import numpy as np
 import torch
 
 LOGGER = logging.getLogger(__name__)
@@ -26,27 +28,89 @@ class FixedSizeDataLoader:
 
         self.steps = steps
         self.dataset = dataset
+        self.num_workers = num_workers
+        # With num_workers > 0, the items are read and transformed by worker processes,
+        # which send the batches through shared memory
         self.dataloader = torch.utils.data.DataLoader(
             self.dataset,
             batch_size=batch_size,
             sampler=sampler,
             num_workers=num_workers,
             pin_memory=pin_memory,
-            drop_last=drop_last
+            drop_last=drop_last,
+            worker_init_fn=seed_worker if num_workers > 0 else None
         )
+        self.iterator = None
 
     def __len__(self):
         return self.steps
 
+    def reset(self):
+        """Restart the sampler and the workers, e.g. after changing the transforms of
+        the dataset, which the running workers would not see."""
+        self.iterator = None
+
     def __iter__(self):
         if self.steps is not None:
-            for _, data in zip(range(self.steps), self.dataloader):
+            # The sampler is infinite, each epoch continues where the former one stopped
+            # and the workers keep running between epochs
+            if self.iterator is None:
+                self.iterator = iter(self.dataloader)
+            for _ in range(self.steps):
+                data = next(self.iterator)
                 yield ([t[0] for t in data] if self.batch_size is None else data)
         else:
             for data in self.dataloader:
                 yield ([t[0] for t in data] if self.batch_size is None else data)
 
 
+class TransformDataLoader:
+    """Apply `transform` to a whole batch of `dataloader` at a time, e.g. a
+    `batch_augmentations.BatchAugmentation` on the device of the batches.
+
+    With `steps`, each epoch is `steps` batches and continues where the former one
+    stopped, restarting `dataloader` when it is exhausted."""
+
+    def __init__(self, dataloader, transform, index=0, steps=None):
+        self.dataloader = dataloader
+        self.transform = transform
+        self.index = index
+        self.steps = steps
+        self.iterator = None
+
+    def __len__(self):
+        return len(self.dataloader) if self.steps is None else self.steps
+
+    def _batches(self):
+        if self.steps is None:
+            for data in self.dataloader:
+                yield data
+            return
+        if self.iterator is None:
+            self.iterator = iter(self.dataloader)
+        for _ in range(self.steps):
+            try:
+                data = next(self.iterator)
+            except StopIteration:
+                self.iterator = iter(self.dataloader)
+                data = next(self.iterator)
+            yield data
+
+    def __iter__(self):
+        for data in self._batches():
+            data = list(data)
+            data[self.index] = self.transform(data[self.index])
+            yield data
+
+
+def seed_worker(worker_id):
+    """Seed `random` and NumPy, used by the augmentations, differently in each worker.
+    The DataLoader only seeds torch (with a new seed for each iterator)."""
+    seed = torch.initial_seed() % 2**32
+    random.seed(seed)
+    np.random.seed(seed)
+
+
 class InfiniteSampler(torch.utils.data.sampler.Sampler):
     def __init__(self, data_source, shuffle=False):
         self.data_source = data_source
@@ -64,17 +128,34 @@ class InfiniteSampler(torch.utils.data.sampler.Sampler):
 
 
 class PrefetchDataLoader:
+    """Move the next batch to `device` while the current one is used: on a CUDA stream
+    for a GPU, and on CPU (half precision being CUDA only) simply one batch ahead,
+    without pinned memory."""
+
     def __init__(self, dataloader, device, half=False):
         self.loader = dataloader
         self.iter = None
-        self.device = device
-        self.dtype = torch.float16 if half else torch.float32
-        self.stream = torch.cuda.Stream()
+        self.device = torch.device(device)
+        self.is_cuda = self.device.type == 'cuda'
+        self.dtype = torch.float16 if half and self.is_cuda else torch.float32
+        self.stream = torch.cuda.Stream() if self.is_cuda else None
         self.next_data = None
 
     def __len__(self):
         return len(self.loader)
 
+    def move(self, data):
+        non_blocking = self.is_cuda
+        if isinstance(data, torch.Tensor):
+            return data.to(dtype=self.dtype, device=self.device, non_blocking=non_blocking)
+        elif isinstance(data, (list, tuple)):
+            return [
+                t.to(dtype=self.dtype, device=self.device, non_blocking=non_blocking)
+                if t.is_floating_point() else t.to(device=self.device, non_blocking=non_blocking)
+                for t in data
+            ]
+        return data
+
     def async_prefech(self):
         try:
             self.next_data = next(self.iter)
@@ -82,23 +163,18 @@ class PrefetchDataLoader:
             self.next_data = None
             return
 
-        with torch.cuda.stream(self.stream):
-            if isinstance(self.next_data, torch.Tensor):
-                self.next_data = self.next_data.to(
-                    dtype=self.dtype, device=self.device, non_blocking=True
-                )
-            elif isinstance(self.next_data, (list, tuple)):
-                self.next_data = [
-                    t.to(dtype=self.dtype, device=self.device, non_blocking=True)
-                    if t.is_floating_point() else t.to(device=self.device, non_blocking=True)
-                    for t in self.next_data
-                ]
+        if self.is_cuda:
+            with torch.cuda.stream(self.stream):
+                self.next_data = self.move(self.next_data)
+        else:
+            self.next_data = self.move(self.next_data)
 
     def __iter__(self):
         self.iter = iter(self.loader)
         self.async_prefech()
         while self.next_data is not None:
-            torch.cuda.current_stream().wait_stream(self.stream)
+            if self.is_cuda:
+                torch.cuda.current_stream().wait_stream(self.stream)
             data = self.next_data
             self.async_prefech()
             yield data
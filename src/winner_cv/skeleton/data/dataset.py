@@ -143,6 +143,15 @@ class TransformDataset(Dataset):
         return len(self.dataset)
 
 
+def share_dataset(dataset):
+    """Read all the batches of a batched `TFDataset` (one session.run per batch) into
+    a TensorDataset in shared memory, which DataLoader workers index without copying it.
+    Returns the dataset and the info of `TFDataset.scan`."""
+    info, tensors = dataset.scan(with_tensors=True, is_batch=True)
+    tensors = [torch.cat(t, dim=0).share_memory_() for t in zip(*tensors)]
+    return torch.utils.data.TensorDataset(*tensors), info
+
+
 def prefetch_dataset(dataset, num_workers=4, batch_size=32, device=None, half=False):
     if isinstance(dataset, list) and isinstance(dataset[0], torch.Tensor):
         tensors = dataset
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Successive halving (Jamieson & Talwalkar, 2016) of augmentation policies.
+
+All the candidate policies are evaluated on a few valid batches, the best
+1 / eta of them are evaluated on eta times more batches, and so on until the
+last rung, where the remaining candidates have seen `max_steps` batches like
+in the exhaustive search. The evaluations of a rung extend the ones of the
+former rungs: only the additional batches are evaluated.
+"""
+from __future__ import absolute_import
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_rungs(num_candidates, max_steps, eta, num_select, num_rungs):
+    """The (number of candidates, total valid steps) of each rung."""
+    rungs = []
+    for rung in range(num_rungs):
+        num_kept = min(num_candidates, max(num_select, int(num_candidates / eta**rung)))
+        steps = max(1, int(round(max_steps / float(eta**(num_rungs - 1 - rung)))))
+        if rungs and steps <= rungs[-1][1]:
+            rungs[-1] = (rungs[-1][0], steps)
+            continue
+        rungs.append((num_kept, steps))
+    return rungs
+
+
+def get_cost(rungs):
+    """The valid steps evaluated over all the rungs."""
+    cost, previous_steps = 0, 0
+    for num_kept, steps in rungs:
+        cost += num_kept * (steps - previous_steps)
+        previous_steps = steps
+    return cost
+
+
+def rank_key(metrics):
+    """Higher score first, then lower loss."""
+    return metrics['score'], -metrics['loss']
+
+
+class SuccessiveHalving:
+    """Successive halving of `num_candidates` candidates.
+
+    Args:
+      max_steps: the valid steps of each candidate of the last rung
+      eta: 1 / eta of the candidates are kept at each rung
+      num_select: the candidates of the last rung, at least
+      budget: the valid steps of the whole search. The fewest rungs within the
+        budget are used, or the most rungs if none is. Without it, a single rung
+        evaluates every candidate on `max_steps` steps.
+    """
+
+    def __init__(self, num_candidates, max_steps, eta=3, num_select=1, budget=None):
+        self.num_candidates = num_candidates
+        self.max_steps = max_steps
+        self.eta = eta
+        self.num_select = num_select
+
+        num_rungs = 1
+        self.rungs = get_rungs(num_candidates, max_steps, eta, num_select, num_rungs)
+        while budget is not None and get_cost(self.rungs) > budget:
+            rungs = get_rungs(num_candidates, max_steps, eta, num_select, num_rungs + 1)
+            if len(rungs) == len(self.rungs) or rungs[-1][0] == rungs[-2][0]:
+                break
+            num_rungs += 1
+            self.rungs = rungs
+        self.cost = get_cost(self.rungs)
+
+    def run(self, evaluate):
+        """Return the (index, metrics) of the candidates of the last rung, best first.
+
+        Args:
+          evaluate: function (index, steps), evaluating the candidate `index` on
+            `steps` more valid steps and returning the metrics ('score' and 'loss')
+            of the candidate over all its evaluated steps
+        """
+        candidates = list(range(self.num_candidates))
+        metrics = {}
+        previous_steps = 0
+        for rung, (num_kept, steps) in enumerate(self.rungs):
+            if rung > 0:
+                candidates = sorted(
+                    candidates, key=lambda i: rank_key(metrics[i]), reverse=True
+                )[:num_kept]
+            for index in candidates:
+                metrics[index] = evaluate(index, steps - previous_steps)
+            previous_steps = steps
+            LOGGER.info(
+                '[successive halving] [%d/%d] candidates:%d steps:%d best:%s', rung + 1,
+                len(self.rungs), len(candidates), steps,
+                max(rank_key(metrics[i]) for i in candidates)
+            )
+        candidates = sorted(candidates, key=lambda i: rank_key(metrics[i]), reverse=True)
+        return [(index, metrics[index]) for index in candidates]
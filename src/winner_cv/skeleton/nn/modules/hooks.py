@@ -13,13 +13,15 @@ LOGGER = logging.getLogger(__name__)
 class MoveToHook(nn.Module):
     @staticmethod
     def to(tensors, device, half=False):
+        device = torch.device(device)
         for t in tensors:
             if isinstance(t, (tuple, list)):
                 MoveToHook.to(t, device, half)
             if not isinstance(t, torch.Tensor):
                 continue
             t.data = t.data.to(device=device)
-            if half:
+            # Half precision kernels are CUDA only
+            if half and device.type == 'cuda':
                 if t.is_floating_point():
                     t.data = t.data.half()
 
@@ -215,7 +215,7 @@ class DropPath(torch.nn.Module):
             # shape = list(x.shape[:2]) + [1 for _ in x.shape[2:]]
             shape = list(x.shape[:1]) + [1 for _ in x.shape[1:]]
             keep_prob = 1. - self.drop_prob
-            mask = torch.cuda.FloatTensor(*shape).bernoulli_(keep_prob)
+            mask = torch.empty(shape, device=x.device).bernoulli_(keep_prob)
             if self._half:
                 mask = mask.half()
             x.div_(keep_prob)
@@ -93,6 +93,10 @@ class LogicModel(Model):
         self.hyper_params["conditions"]["skip_valid_after_test"] = skip_valid_after_test
 
         self.checkpoints = []
+        # The weights of the checkpoints, copied to host memory (or to memory-mapped files)
+        self.checkpoint_pool = skeleton.utils.CheckpointPool(
+            directory=self.hyper_params['checkpoints'].get('directory')
+        )
         LOGGER.info('[init] build')
 
         self.build()
@@ -300,28 +304,54 @@ class LogicModel(Model):
             batch_size = self.hyper_params['dataset']['batch_size']
             LOGGER.info('################################### batch size: {}'.format(batch_size))
 
-            # input_shape = self.hyper_params['dataset']['input']
-            preprocessor = get_tf_to_tensor(is_random_flip=True)
-            # dataset = dataset.prefetch(buffer_size=batch_size * 3)
+            num_workers = self.hyper_params['dataset'].get('num_workers', 0)
+            transforms = []
+            if num_workers > 0 and num_items < enough_count:
+                # Small enough to be cached: decode it once, in batches, to shared memory.
+                # The workers then index it (following the sampler) and flip/augment the
+                # examples in parallel instead of one session.run per example.
+                preprocessor = get_tf_to_tensor(is_random_flip=False)
+                tf_dataset = dataset.apply(
+                    tf.data.experimental.map_and_batch(
+                        map_func=lambda *x: (preprocessor(x[0]), x[1]),
+                        batch_size=self.hyper_params['dataset']['batch_size_test'],
+                        drop_remainder=False,
+                        num_parallel_calls=tf.data.experimental.AUTOTUNE
+                    )
+                ).prefetch(buffer_size=8)
+
+                LOGGER.info('[%s] scan before', mode)
+                dataset, self.info['dataset'][mode] = skeleton.data.share_dataset(
+                    skeleton.data.TFDataset(self.session, tf_dataset, num_items)
+                )
+                LOGGER.info('[%s] scan after', mode)
+                del tf_dataset
+                transforms.append(skeleton.data.RandomFlip(p=0.5, dims=[-1]))
+            else:
+                num_workers = 0
 
-            if num_items < enough_count:
-                dataset = dataset.cache()
+                # input_shape = self.hyper_params['dataset']['input']
+                preprocessor = get_tf_to_tensor(is_random_flip=True)
+                # dataset = dataset.prefetch(buffer_size=batch_size * 3)
 
-            # dataset = dataset.apply(
-            #     tf.data.experimental.shuffle_and_repeat(buffer_size=min(enough_count, num_items))
-            # )
-            dataset = dataset.repeat()
-            dataset = dataset.map(
-                lambda *x: (preprocessor(x[0]), x[1]),
-                num_parallel_calls=tf.data.experimental.AUTOTUNE
-            )
-            dataset = dataset.prefetch(buffer_size=batch_size * 8)
+                if num_items < enough_count:
+                    dataset = dataset.cache()
 
-            dataset = skeleton.data.TFDataset(self.session, dataset, num_items)
+                # dataset = dataset.apply(tf.data.experimental.shuffle_and_repeat(
+                #     buffer_size=min(enough_count, num_items)
+                # ))
+                dataset = dataset.repeat()
+                dataset = dataset.map(
+                    lambda *x: (preprocessor(x[0]), x[1]),
+                    num_parallel_calls=tf.data.experimental.AUTOTUNE
+                )
+                dataset = dataset.prefetch(buffer_size=batch_size * 8)
+
+                dataset = skeleton.data.TFDataset(self.session, dataset, num_items)
 
             transform = tv.transforms.Compose(
-                [  # skeleton.data.Cutout(int(input_shape[1] // 4), int(input_shape[2] // 4))
-                ]
+                transforms
+                # skeleton.data.Cutout(int(input_shape[1] // 4), int(input_shape[2] // 4))
             )
             dataset = skeleton.data.TransformDataset(dataset, transform, index=0)
 
@@ -333,7 +363,7 @@ class LogicModel(Model):
                 batch_size=batch_size,
                 shuffle=False,
                 drop_last=True,
-                num_workers=0,
+                num_workers=num_workers,
                 pin_memory=False
             )
         elif mode in ['valid', 'test']:
@@ -408,8 +438,25 @@ class LogicModel(Model):
             )
         )
         indices = sorted(indices[::-1][:self.hyper_params['checkpoints']['keep']])
+        for i in set(range(len(self.checkpoints))) - set(indices):
+            if self.checkpoints[i]['model'] is not None:
+                self.checkpoint_pool.release(self.checkpoints[i]['model'])
         self.checkpoints = [self.checkpoints[i] for i in indices]
 
+        # Over max_megabytes, release the weights of the worst checkpoints (but the best)
+        # and keep their metrics
+        max_megabytes = self.hyper_params['checkpoints'].get('max_megabytes')
+        if max_megabytes is not None:
+            scores = [c['valid']['score'] for c in self.checkpoints]
+            best_idx = np.argmax(scores)
+            for i in np.argsort(scores):
+                if self.checkpoint_pool.nbytes() <= max_megabytes * 2**20:
+                    break
+                if i != best_idx and self.checkpoints[i]['model'] is not None:
+                    self.checkpoint_pool.release(self.checkpoints[i]['model'])
+                    self.checkpoints[i]['model'] = None
+        LOGGER.debug('[checkpoints] %s', self.checkpoint_pool.summary())
+
     def break_train_loop_condition(self, remaining_time_budget=None, inner_epoch=1):
         consume = inner_epoch * self.timers['train'].step_time
 
@@ -599,7 +646,7 @@ class LogicModel(Model):
 
             metrics = {
                 'epoch': self.info['loop']['epoch'],
-                'model': self.model.state_dict().copy(),
+                'model': self.checkpoint_pool.snapshot(self.model.state_dict()),
                 'train': train_metrics,
                 'valid': valid_metrics,
             }
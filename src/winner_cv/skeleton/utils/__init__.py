@@ -2,4 +2,5 @@
 # pylint: disable=wildcard-import
 from __future__ import absolute_import
 
+from .checkpoint_pool import CheckpointPool
 from .timer import Timer
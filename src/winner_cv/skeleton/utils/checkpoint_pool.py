@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Snapshot:
+    def __init__(self, tensors, event=None):
+        self.tensors = tensors  # name -> (host tensor, shape)
+        self.event = event
+        self.pending = True  # Not deduplicated yet
+
+
+class CheckpointPool:
+    """Snapshots of state dicts in host memory, or in memory-mapped files in `directory`.
+
+    `snapshot` enqueues non-blocking copies to pinned memory on the current CUDA stream and
+    returns, `state_dict` waits for them. Once its copies are done (at the next snapshot), a
+    tensor equal to its copy in the former snapshot, e.g. of frozen layers, shares that copy.
+    Version counters cannot tell: optimizers update `p.data` and batch norm its running
+    statistics without them. The copies of released snapshots are reused by the next ones.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.pending = []  # Snapshots not deduplicated yet, oldest first
+        self.latest = {}  # name -> host tensor of the former deduplicated snapshot
+        self.references = {}  # id(host tensor) -> number of snapshots (and latest)
+        self.free = {}  # (dtype, numel) -> released host tensors
+        self.files = {}  # id(host tensor) -> memory-mapped file
+        self.live_bytes = 0
+        self.free_bytes = 0
+        self.max_free_bytes = 0
+
+        self.num_snapshots = 0
+        self.num_files = 0
+        self.copied_bytes = 0
+        self.deduplicated_bytes = 0
+        self.snapshot_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _allocate(self, tensor):
+        free = self.free.get((tensor.dtype, tensor.numel()))
+        if free:
+            host = free.pop()
+            self.free_bytes -= host.numel() * host.element_size()
+            return host
+
+        if self.directory is not None:
+            self.num_files += 1
+            dtype = torch.empty(0, dtype=tensor.dtype).numpy().dtype
+            array = np.memmap(
+                os.path.join(self.directory, 'tensor{:06d}.bin'.format(self.num_files)),
+                dtype=dtype,
+                mode='w+',
+                shape=(max(1, tensor.numel()), )
+            )
+            host = torch.from_numpy(array)[:tensor.numel()]
+            self.files[id(host)] = array.filename
+            return host
+        return torch.empty(tensor.numel(), dtype=tensor.dtype, pin_memory=tensor.is_cuda)
+
+    def _reference(self, host):
+        count = self.references.get(id(host), 0)
+        if count == 0:
+            self.live_bytes += host.numel() * host.element_size()
+        self.references[id(host)] = count + 1
+
+    def _dereference(self, host):
+        self.references[id(host)] -= 1
+        if self.references[id(host)] > 0:
+            return
+        del self.references[id(host)]
+        nbytes = host.numel() * host.element_size()
+        self.live_bytes -= nbytes
+        if self.free_bytes + nbytes <= self.max_free_bytes:
+            self.free.setdefault((host.dtype, host.numel()), []).append(host)
+            self.free_bytes += nbytes
+        elif id(host) in self.files:
+            os.remove(self.files.pop(id(host)))
+
+    def _wait(self, snapshot):
+        if snapshot.event is not None:
+            start = time.time()
+            snapshot.event.synchronize()
+            self.wait_seconds += time.time() - start
+            snapshot.event = None
+
+    def _deduplicate(self):
+        """Share the copies of the pending snapshots equal to the ones of the former."""
+        for snapshot in self.pending:
+            self._wait(snapshot)
+            for name, (host, shape) in snapshot.tensors.items():
+                former = self.latest.get(name)
+                if former is not None and former.dtype == host.dtype and \
+                        former.shape == host.shape and torch.equal(former, host):
+                    self._reference(former)
+                    self._dereference(host)
+                    snapshot.tensors[name] = (former, shape)
+                    self.deduplicated_bytes += host.numel() * host.element_size()
+                    continue
+                self._reference(host)
+                if former is not None:
+                    self._dereference(former)
+                self.latest[name] = host
+            snapshot.pending = False
+        self.pending = []
+
+    def snapshot(self, state_dict):
+        """Return a `Snapshot` of the tensors of `state_dict`, copied asynchronously."""
+        start = time.time()
+        self._deduplicate()
+
+        tensors = OrderedDict()
+        is_cuda = False
+        snapshot_bytes = 0
+        for name, tensor in state_dict.items():
+            host = self._allocate(tensor)
+            host.copy_(tensor.detach().reshape(-1), non_blocking=True)
+            self._reference(host)
+            tensors[name] = (host, tensor.shape)
+            is_cuda = is_cuda or tensor.is_cuda
+            snapshot_bytes += tensor.numel() * tensor.element_size()
+
+        event = None
+        if is_cuda:
+            event = torch.cuda.Event()
+            event.record()
+        snapshot = Snapshot(tensors, event)
+        self.pending.append(snapshot)
+
+        self.max_free_bytes = max(self.max_free_bytes, snapshot_bytes)
+        self.num_snapshots += 1
+        self.copied_bytes += snapshot_bytes
+        self.snapshot_seconds += time.time() - start
+        return snapshot
+
+    def state_dict(self, snapshot):
+        """Wait for the copies of `snapshot` and return its state dict, in host memory."""
+        if snapshot.pending:
+            self._deduplicate()
+        return OrderedDict(
+            (name, host.view(shape)) for name, (host, shape) in snapshot.tensors.items()
+        )
+
+    def release(self, snapshot):
+        """Free the copies of `snapshot` not shared with other snapshots."""
+        if snapshot.pending:
+            # The copies must be done before they are reused
+            self._deduplicate()
+        for host, _ in snapshot.tensors.values():
+            self._dereference(host)
+        snapshot.tensors = OrderedDict()
+
+    def nbytes(self):
+        """The host memory of the snapshots, without the copies kept for reuse."""
+        return self.live_bytes
+
+    def summary(self):
+        """The memory footprint, the deduplicated fraction and the mean latencies."""
+        num_snapshots = max(1, self.num_snapshots)
+        return {
+            'snapshots': self.num_snapshots,
+            'megabytes': self.live_bytes / 2.0**20,
+            'free_megabytes': self.free_bytes / 2.0**20,
+            'deduplicated': self.deduplicated_bytes / float(max(1, self.copied_bytes)),
+            'snapshot_ms': 1000.0 * self.snapshot_seconds / num_snapshots,
+            'wait_ms': 1000.0 * self.wait_seconds / num_snapshots,
+        }
@@ -256,25 +256,35 @@ class Model(object):
             is_training = True
             keep_prob = 0.8
 
-        input_layer = features
+        is_sparse = isinstance(features, tf.SparseTensor)
+        if is_sparse:
+            # Sparse examples of shape [batch_size, f]: the first layer is a sparse
+            # matmul, so its cost only depends on the number of non-zero entries
+            f = self.num_sparse_features
+            kernel = tf.get_variable("sparse_input_kernel", shape=[f, 256])
+            x = tf.sparse.sparse_dense_matmul(features, kernel)
+            x = tf.layers.batch_normalization(x, training=is_training)
+            x_skip = tf.nn.relu(x)
+        else:
+            input_layer = features
 
-        # Replace missing values by 0
-        mask = tf.is_nan(input_layer)
-        input_layer = tf.where(mask, tf.zeros_like(input_layer), input_layer)
+            # Replace missing values by 0
+            mask = tf.is_nan(input_layer)
+            input_layer = tf.where(mask, tf.zeros_like(input_layer), input_layer)
 
-        # Sum over time axis
-        input_layer = tf.reduce_sum(input_layer, axis=1)
-        mask = tf.reduce_sum(1 - tf.cast(mask, tf.float32), axis=1)
+            # Sum over time axis
+            input_layer = tf.reduce_sum(input_layer, axis=1)
+            mask = tf.reduce_sum(1 - tf.cast(mask, tf.float32), axis=1)
 
-        # Flatten
-        input_layer = tf.layers.flatten(input_layer)
-        mask = tf.layers.flatten(mask)
-        f = input_layer.get_shape().as_list()[1]  #tf.shape(input_layer)[1]
+            # Flatten
+            input_layer = tf.layers.flatten(input_layer)
+            mask = tf.layers.flatten(mask)
+            f = input_layer.get_shape().as_list()[1]  #tf.shape(input_layer)[1]
 
-        # Build network
-        x = tf.layers.batch_normalization(input_layer, training=is_training)
-        x = tf.nn.dropout(x, keep_prob)
-        x_skip = self.fc(x, 256, is_training)
+            # Build network
+            x = tf.layers.batch_normalization(input_layer, training=is_training)
+            x = tf.nn.dropout(x, keep_prob)
+            x_skip = self.fc(x, 256, is_training)
         x = self.fc(x_skip, 256, is_training)
         x = tf.nn.dropout(x, keep_prob)
         x = self.fc(x, 256, is_training) + x_skip
@@ -305,7 +315,12 @@ class Model(object):
         #w = tf.ones(s) * tf.reduce_sum(labels) / tf.cast(tf.reduce_prod(s), tf.float32)
         #w = tf.where(labels>0, 1-w, w)
         loss_labels = tf.reduce_sum(sigmoid_cross_entropy_with_logits(labels=labels, logits=logits))
-        loss_reconst = tf.reduce_sum(mask * tf.abs(tf.subtract(input_layer, x_mid)))
+        if is_sparse:
+            # Only reconstruct the non-zero entries
+            reconst = tf.gather_nd(x_mid, features.indices)
+            loss_reconst = tf.reduce_sum(tf.abs(tf.subtract(features.values, reconst)))
+        else:
+            loss_reconst = tf.reduce_sum(mask * tf.abs(tf.subtract(input_layer, x_mid)))
         loss = loss_labels + loss_reconst
 
         # Configure the Training Op (for TRAIN mode)
@@ -336,7 +351,23 @@ class Model(object):
     For more information on how to write an input function, see:
       https://www.tensorflow.org/guide/custom_estimators#write_an_input_function
     """
-        dataset = dataset.map(lambda *x: (self.preprocess_tensor_4d(x[0]), x[1]))
+        if dataset.output_classes[0] is tf.SparseTensor:
+            # Examples kept sparse by AutoDLDataset(keep_sparse=True): sum them over
+            # time like dense examples, flatten them and batch them as SparseTensor,
+            # model_fn never densifies them
+            _, row_count, col_count, num_channels = self.metadata.get_sparse_tensor_shape(0)
+            self.num_sparse_features = row_count * col_count * num_channels
+            dataset = dataset.map(
+                lambda *x: (
+                    tf.sparse.reduce_sum(
+                        tf.sparse.reshape(x[0], [-1, self.num_sparse_features]),
+                        axis=0,
+                        output_is_sparse=True
+                    ), x[1]
+                )
+            )
+        else:
+            dataset = dataset.map(lambda *x: (self.preprocess_tensor_4d(x[0]), x[1]))
 
         if is_training:
             # Shuffle input examples